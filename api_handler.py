@@ -1,98 +1,195 @@
+import copy
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+import metrics
+from estimate_cache import canonical_key
+from request_scheduler import CircuitOpenError
+from single_flight import SingleFlight, split_duplicates
+
+
+API_ROOT = "https://www.carboninterface.com/api/v1"
+DEFAULT_TIMEOUT = 30  # seconds per request
+# Network errors worth retrying; anything else (e.g. an invalid URL) fails at once
+RETRY_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+
+def record_request(operation, started, status, size=0):
+    """Records one request attempt's latency, status code and response size, if metrics are enabled."""
+    metrics.observe("carbon_api_request_seconds", time.perf_counter() - started, operation=operation)
+    metrics.inc("carbon_api_responses_total", operation=operation, status=status)
+    if size:
+        metrics.inc("carbon_api_response_bytes_total", size, operation=operation)
+
+
+# Request bodies shared by the sync and async clients
+
+def electricity_params(electricity_value, country, state=None, electricity_unit='kwh'):
+    return {
+        "electricity_value": electricity_value,
+        "country": country,
+        "state": state if state else "",
+        "electricity_unit": electricity_unit
+    }
+
+
+def flight_params(passengers, legs, distance_unit="km"):
+    return {
+        "passengers": passengers,
+        "legs": legs,
+        "distance_unit": distance_unit
+    }
+
+
+def shipping_params(weight_value, weight_unit, distance_value, distance_unit, transport_method):
+    return {
+        "weight_value": weight_value,
+        "weight_unit": weight_unit,
+        "distance_value": distance_value,
+        "distance_unit": distance_unit,
+        "transport_method": transport_method
+    }
+
+
+def fuel_combustion_params(selected_fuel_key, selected_unit, fuel_value):
+    return {
+        "fuel_source_type": selected_fuel_key,
+        "fuel_source_unit": selected_unit,
+        "fuel_source_value": fuel_value
+    }
+
+
+def vehicle_params(distance_value, distance_unit, vehicle_model_id):
+    return {
+        "type": "vehicle",
+        "distance_value": distance_value,
+        "distance_unit": distance_unit,
+        "vehicle_model_id": vehicle_model_id
+    }
 
 
 class CarbonInterfaceAPI:
-    def __init__(self, api_key):
-        self.base_url = "https://www.carboninterface.com/api/v1/estimates"
+    def __init__(self, api_key, max_workers=8, api_root=API_ROOT, timeout=DEFAULT_TIMEOUT, cache=None,
+                 local_engine=None, scheduler=None):
+        self.api_root = api_root
+        self.base_url = f"{api_root}/estimates"
         self.api_key = api_key
+        self.timeout = timeout
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
-    
-    def create_estimate(self, estimate_type, params):
+        # One pooled session so requests reuse their TCP/TLS connections
+        self.max_workers = max_workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.cache = cache  # Optional EstimateCache for repeated identical estimates
+        self.local_engine = local_engine  # Optional LocalEstimateEngine, tried before the API
+        self.scheduler = scheduler  # Optional RequestScheduler for rate limiting and retries
+        self.single_flight = SingleFlight()  # Concurrent identical estimates share one request
+
+    def close(self):
+        """ Close the pooled connections """
+        self.session.close()
+
+    def _request(self, method, url, error_message, json=None, operation="estimate"):
+        """ Send one request and return the decoded body or an {"error": ...} dict """
+        def send():
+            if not metrics.is_enabled():
+                return self.session.request(method, url, headers=self.headers, json=json, timeout=self.timeout)
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, headers=self.headers, json=json, timeout=self.timeout)
+            except requests.exceptions.RequestException:
+                record_request(operation, started, "error")
+                raise
+            record_request(operation, started, response.status_code, len(response.content))
+            return response
+
         try:
-            data = {"type": estimate_type, **params}
-            response = requests.post(self.base_url, headers=self.headers, json=data)
-            if response.status_code in [200,201]:
+            response = self.scheduler.run(send, RETRY_EXCEPTIONS) if self.scheduler is not None else send()
+            if response.status_code in [200, 201]:
                 return response.json()
             else:
-                return {"error": f"Failed to create estimate: {response.text}"}
-        except requests.exceptions.RequestException as e:
+                return {"error": f"{error_message}: {response.text}"}
+        except (requests.exceptions.RequestException, CircuitOpenError) as e:
             return {"error": str(e)}
 
+    def create_estimate(self, estimate_type, params):
+        if self.local_engine is not None and self.local_engine.supports(estimate_type):
+            local_result = self.local_engine.estimate(estimate_type, params)
+            if local_result is not None:
+                return local_result
+        if self.cache is not None:
+            cached = self.cache.get(estimate_type, params)
+            if cached is not None:
+                return cached
+        return self.single_flight.do(canonical_key(estimate_type, params),
+                                     lambda: self._post_estimate(estimate_type, params))
+
+    def _post_estimate(self, estimate_type, params):
+        data = {"type": estimate_type, **params}
+        result = self._request("POST", self.base_url, "Failed to create estimate", json=data, operation=estimate_type)
+        if self.cache is not None and "error" not in result:
+            self.cache.put(estimate_type, params, result)
+        return result
+
+    def create_estimates_batch(self, estimates, max_workers=None):
+        """ Create many estimates concurrently from a list of (estimate_type, params) pairs.
+
+        Results are returned in input order; failed items use the same {"error": ...} shape as create_estimate.
+        Identical requests in the batch are sent once. max_workers is capped at the connection pool size
+        given to the constructor, since threads beyond it would open connections the pool then discards.
+        """
+        estimates = list(estimates)
+        results = self.local_engine.estimate_batch(estimates) if self.local_engine is not None else [None] * len(estimates)
+        remote, duplicates = split_duplicates(estimates, [i for i, result in enumerate(results) if result is None])
+
+        workers = min(max_workers, self.max_workers) if max_workers else self.max_workers
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for i, result in zip(remote, executor.map(lambda i: self.create_estimate(*estimates[i]), remote)):
+                results[i] = result
+        for i, first in duplicates:
+            results[i] = copy.deepcopy(results[first])
+        self.single_flight.record_deduplicated(len(duplicates))
+        return results
+
     def get_estimate(self, estimate_id):
         """ Retrieve a specific estimate by its ID """
-        try:
-            url = f"{self.base_url}/{estimate_id}"
-            response = requests.get(url, headers=self.headers)
-            if response.status_code in [200,201]:
-                return response.json()
-            else:
-                return {"error": f"Failed to retrieve estimate: {response.text}"}
-        except requests.exceptions.RequestException as e:
-            return {"error": str(e)}
+        url = f"{self.base_url}/{estimate_id}"
+        return self._request("GET", url, "Failed to retrieve estimate", operation="get_estimate")
 
     def estimate_electricity(self, electricity_value, country, state=None, electricity_unit='kwh'):
-        params = {
-            "electricity_value": electricity_value,
-            "country": country,
-            "state": state if state else "",
-            "electricity_unit": electricity_unit
-        }
+        params = electricity_params(electricity_value, country, state, electricity_unit)
         return self.create_estimate('electricity', params)
 
     def estimate_flight(self, passengers, legs, distance_unit="km"):
-        params = {
-            "passengers": passengers,
-            "legs": legs,
-            "distance_unit": distance_unit
-        }
+        params = flight_params(passengers, legs, distance_unit)
         return self.create_estimate('flight', params)
 
     def estimate_shipping(self, weight_value, weight_unit, distance_value, distance_unit, transport_method):
-        params = {
-            "weight_value": weight_value,
-            "weight_unit": weight_unit,
-            "distance_value": distance_value,
-            "distance_unit": distance_unit,
-            "transport_method": transport_method
-        }
+        params = shipping_params(weight_value, weight_unit, distance_value, distance_unit, transport_method)
         return self.create_estimate('shipping', params)
 
     def estimate_fuel_combustion(self, selected_fuel_key, selected_unit, fuel_value):
-        params = {
-            "fuel_source_type": selected_fuel_key,
-            "fuel_source_unit": selected_unit,
-            "fuel_source_value": fuel_value
-        }
+        params = fuel_combustion_params(selected_fuel_key, selected_unit, fuel_value)
         return self.create_estimate('fuel_combustion', params)
-    
+
 
     def get_vehicle_makes(self):
         """ Fetch the list of vehicle makes """
-        url = "https://www.carboninterface.com/api/v1/vehicle_makes"
-        response = requests.get(url, headers=self.headers)
-        if response.status_code in [200, 201]:
-            return response.json()
-        else:
-            return {"error": f"Failed to fetch vehicle makes: {response.text}"}
+        url = f"{self.api_root}/vehicle_makes"
+        return self._request("GET", url, "Failed to fetch vehicle makes", operation="vehicle_makes")
 
     def get_vehicle_models(self, vehicle_make_id):
         """ Fetch vehicle models based on the vehicle make ID """
-        url = f"https://www.carboninterface.com/api/v1/vehicle_makes/{vehicle_make_id}/vehicle_models"
-        response = requests.get(url, headers=self.headers)
-        if response.status_code in [200, 201]:
-            return response.json()
-        else:
-            return {"error": f"Failed to fetch vehicle models: {response.text}"}
+        url = f"{self.api_root}/vehicle_makes/{vehicle_make_id}/vehicle_models"
+        return self._request("GET", url, "Failed to fetch vehicle models", operation="vehicle_models")
 
     def estimate_vehicle(self, distance_value, distance_unit, vehicle_model_id):
         """ Estimate the vehicle emissions based on the trip and vehicle model """
-        params = {
-            "type": "vehicle",
-            "distance_value": distance_value,
-            "distance_unit": distance_unit,
-            "vehicle_model_id": vehicle_model_id
-        }
-        return self.create_estimate('vehicle', params)
\ No newline at end of file
+        params = vehicle_params(distance_value, distance_unit, vehicle_model_id)
+        return self.create_estimate('vehicle', params)
@@ -0,0 +1,168 @@
+import asyncio
+import copy
+import time
+import aiohttp
+import metrics
+from api_handler import (API_ROOT, DEFAULT_TIMEOUT, electricity_params, flight_params, shipping_params,
+                         fuel_combustion_params, vehicle_params, record_request)
+from estimate_cache import canonical_key
+from request_scheduler import CircuitOpenError
+from single_flight import AsyncSingleFlight, split_duplicates
+
+# Network errors worth retrying
+RETRY_EXCEPTIONS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+
+class AsyncCarbonInterfaceAPI:
+    """asyncio counterpart of CarbonInterfaceAPI with the same methods and return shapes.
+
+    Use it as an async context manager (or call close()) so the connection pool is released.
+    Cancelling a task cancels its in-flight request; timeouts apply to each request.
+    """
+
+    def __init__(self, api_key, max_concurrency=100, api_root=API_ROOT, timeout=DEFAULT_TIMEOUT, cache=None,
+                 local_engine=None, scheduler=None):
+        self.api_root = api_root
+        self.base_url = f"{api_root}/estimates"
+        self.api_key = api_key
+        self.timeout = timeout
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        self.max_concurrency = max_concurrency
+        self.cache = cache  # Optional EstimateCache for repeated identical estimates
+        self.local_engine = local_engine  # Optional LocalEstimateEngine, tried before the API
+        self.scheduler = scheduler  # Optional RequestScheduler for rate limiting and retries
+        self.single_flight = AsyncSingleFlight()  # Concurrent identical estimates share one request
+        self.session = None  # Created on first use, inside the running event loop
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """ Close the pooled connections """
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _get_session(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self.session = aiohttp.ClientSession(headers=self.headers, connector=connector)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.session
+
+    async def _request(self, method, url, error_message, json=None, timeout=None, operation="estimate"):
+        """ Send one request and return the decoded body or an {"error": ...} dict """
+        session = self._get_session()
+        request_timeout = aiohttp.ClientTimeout(total=timeout if timeout is not None else self.timeout)
+
+        async def send():
+            # Hold a concurrency slot per attempt only, not while waiting to retry
+            async with self._semaphore:
+                started = time.perf_counter()
+                try:
+                    async with session.request(method, url, json=json, timeout=request_timeout) as response:
+                        body = await response.read()
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    if metrics.is_enabled():
+                        record_request(operation, started, "error")
+                    raise
+                if metrics.is_enabled():
+                    record_request(operation, started, response.status, len(body))
+                return response
+
+        try:
+            if self.scheduler is not None:
+                response = await self.scheduler.run_async(send, RETRY_EXCEPTIONS)
+            else:
+                response = await send()
+            if response.status in [200, 201]:
+                return await response.json()
+            else:
+                return {"error": f"{error_message}: {await response.text()}"}
+        except asyncio.TimeoutError:
+            return {"error": f"{error_message}: request timed out"}
+        except (aiohttp.ClientError, CircuitOpenError) as e:
+            return {"error": str(e)}
+
+    async def create_estimate(self, estimate_type, params, timeout=None):
+        if self.local_engine is not None and self.local_engine.supports(estimate_type):
+            local_result = self.local_engine.estimate(estimate_type, params)
+            if local_result is not None:
+                return local_result
+        if self.cache is not None:
+            cached = self.cache.get(estimate_type, params)
+            if cached is not None:
+                return cached
+        # Callers that join an in-flight request share it, along with its timeout
+        return await self.single_flight.do(canonical_key(estimate_type, params),
+                                           lambda: self._post_estimate(estimate_type, params, timeout))
+
+    async def _post_estimate(self, estimate_type, params, timeout=None):
+        data = {"type": estimate_type, **params}
+        result = await self._request("POST", self.base_url, "Failed to create estimate", json=data, timeout=timeout,
+                                     operation=estimate_type)
+        if self.cache is not None and "error" not in result:
+            self.cache.put(estimate_type, params, result)
+        return result
+
+    async def create_estimates_batch(self, estimates, timeout=None):
+        """ Create many estimates concurrently from a list of (estimate_type, params) pairs, in input order.
+
+        Identical requests in the batch are sent once.
+        """
+        estimates = list(estimates)
+        results = self.local_engine.estimate_batch(estimates) if self.local_engine is not None else [None] * len(estimates)
+        remote, duplicates = split_duplicates(estimates, [i for i, result in enumerate(results) if result is None])
+        remote_results = await asyncio.gather(*(self.create_estimate(*estimates[i], timeout=timeout) for i in remote))
+        for i, result in zip(remote, remote_results):
+            results[i] = result
+        for i, first in duplicates:
+            results[i] = copy.deepcopy(results[first])
+        self.single_flight.record_deduplicated(len(duplicates))
+        return results
+
+    async def get_estimate(self, estimate_id, timeout=None):
+        """ Retrieve a specific estimate by its ID """
+        url = f"{self.base_url}/{estimate_id}"
+        return await self._request("GET", url, "Failed to retrieve estimate", timeout=timeout, operation="get_estimate")
+
+    async def estimate_electricity(self, electricity_value, country, state=None, electricity_unit='kwh', timeout=None):
+        params = electricity_params(electricity_value, country, state, electricity_unit)
+        return await self.create_estimate('electricity', params, timeout=timeout)
+
+    async def estimate_flight(self, passengers, legs, distance_unit="km", timeout=None):
+        params = flight_params(passengers, legs, distance_unit)
+        return await self.create_estimate('flight', params, timeout=timeout)
+
+    async def estimate_shipping(self, weight_value, weight_unit, distance_value, distance_unit, transport_method,
+                                timeout=None):
+        params = shipping_params(weight_value, weight_unit, distance_value, distance_unit, transport_method)
+        return await self.create_estimate('shipping', params, timeout=timeout)
+
+    async def estimate_fuel_combustion(self, selected_fuel_key, selected_unit, fuel_value, timeout=None):
+        params = fuel_combustion_params(selected_fuel_key, selected_unit, fuel_value)
+        return await self.create_estimate('fuel_combustion', params, timeout=timeout)
+
+    async def get_vehicle_makes(self, timeout=None):
+        """ Fetch the list of vehicle makes """
+        url = f"{self.api_root}/vehicle_makes"
+        return await self._request("GET", url, "Failed to fetch vehicle makes", timeout=timeout,
+                                   operation="vehicle_makes")
+
+    async def get_vehicle_models(self, vehicle_make_id, timeout=None):
+        """ Fetch vehicle models based on the vehicle make ID """
+        url = f"{self.api_root}/vehicle_makes/{vehicle_make_id}/vehicle_models"
+        return await self._request("GET", url, "Failed to fetch vehicle models", timeout=timeout,
+                                   operation="vehicle_models")
+
+    async def estimate_vehicle(self, distance_value, distance_unit, vehicle_model_id, timeout=None):
+        """ Estimate the vehicle emissions based on the trip and vehicle model """
+        params = vehicle_params(distance_value, distance_unit, vehicle_model_id)
+        return await self.create_estimate('vehicle', params, timeout=timeout)
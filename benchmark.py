@@ -0,0 +1,216 @@
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from data_analysis import DataAnalysis
+from storage import storage_for_path
+
+
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+
+
+def generate_dataset(rows, users=1000, categories=5, seed=0):
+    """Builds a reproducible synthetic emissions frame; the same arguments always give the same rows."""
+    rng = np.random.default_rng(seed)
+    category_names = np.array(["Electricity", "Flight", "Shipping", "Fuel Combustion", "Vehicle"]
+                              + [f"Category {i}" for i in range(5, categories)])[:categories]
+    start = np.datetime64("2024-01-01T00:00:00")
+    return pd.DataFrame({
+        "Category": category_names[rng.integers(0, categories, rows)],
+        "Emission (kg)": rng.gamma(2.0, 50.0, rows).round(3),
+        "User ID": np.char.add("user", rng.integers(0, users, rows).astype(str)),
+        "Timestamp": start + rng.integers(0, 2 * 365 * 24 * 3600, rows).astype("timedelta64[s]"),
+    })
+
+
+def _measure(fn, repeat, setup=None):
+    """Runs fn `repeat` times and returns its median and best wall time in seconds.
+
+    setup, if given, runs untimed before each repetition and its result is passed to fn.
+    """
+    timings = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        gc.collect()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn(state) if setup else fn()
+        timings.append(time.perf_counter() - started)
+    return {"seconds": statistics.median(timings), "best": min(timings), "repeat": repeat}
+
+
+def _per_operation(result, operations):
+    """Turns the timing of a loop of `operations` calls into per-call seconds and calls per second."""
+    seconds = result["seconds"] / operations
+    return dict(result, seconds=seconds, best=result["best"] / operations, ops_per_sec=1 / seconds if seconds else 0.0)
+
+
+def bench_data_analysis(rows, users, categories, fmt, repeat, workdir, seed=0, adds=1000, save_adds=5):
+    """Times the DataAnalysis operations on a synthetic dataset stored in the given format."""
+    path = os.path.join(workdir, f"emissions_{rows}{FORMATS[fmt]}")
+    with open(path, "wb") as f:
+        f.write(storage_for_path(path).serialize(generate_dataset(rows, users, categories, seed)))
+
+    def fresh_copy(append_log=False):
+        copy_path = os.path.join(workdir, f"copy{FORMATS[fmt]}")
+        for leftover in (f"{copy_path}.log", f"{copy_path}.tmp"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        shutil.copyfile(path, copy_path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return DataAnalysis(copy_path, append_log=append_log, compact_threshold=10 ** 9)
+
+    analysis = DataAnalysis(path)
+    user = "user0"
+    results = {
+        "load_data": _measure(lambda: DataAnalysis(path), repeat),
+        "get_total_emissions": _per_operation(_measure(lambda: [analysis.get_total_emissions() for _ in range(1000)],
+                                                       repeat), 1000),
+        "get_total_emissions_user": _per_operation(
+            _measure(lambda: [analysis.get_total_emissions(user) for _ in range(1000)], repeat), 1000),
+        "leaderboard": _measure(analysis.leaderboard, repeat),
+        "sorting_emission_data": _measure(analysis.sorting_emission_data, repeat),
+        "sorting_emission_data_top10": _measure(lambda: analysis.sorting_emission_data(limit=10), repeat),
+        "add_emission_log": _per_operation(_measure(
+            lambda target: [target.add_emission("Electricity", 1.5, user) for _ in range(adds)],
+            repeat, setup=lambda: fresh_copy(append_log=True)), adds),
+        "add_emission_save": _per_operation(_measure(
+            lambda target: [target.add_emission("Electricity", 1.5, user) for _ in range(save_adds)],
+            repeat, setup=fresh_copy), save_adds),
+        "remove_emission_user": _measure(lambda target: target.remove_emission(user), repeat, setup=fresh_copy),
+    }
+    return {f"{fmt}/{rows}/{name}": result for name, result in results.items()}
+
+
+def bench_api(requests=500, concurrency=32, latency=0.0, repeat=3):
+    """Measures estimate throughput of the sync and async clients against the local mock server."""
+    from api_handler import CarbonInterfaceAPI
+    from async_api_handler import AsyncCarbonInterfaceAPI
+    from mock_server import MockCarbonInterfaceServer
+
+    # Distinct requests, so neither caching nor coalescing hides the network work
+    estimates = [("electricity", {"electricity_value": i + 1, "country": "US", "state": "", "electricity_unit": "kwh"})
+                 for i in range(requests)]
+
+    async def run_async(api_root):
+        async with AsyncCarbonInterfaceAPI("benchmark", max_concurrency=concurrency, api_root=api_root) as api:
+            return await api.create_estimates_batch(estimates)
+
+    with MockCarbonInterfaceServer(latency=latency) as server:
+        api = CarbonInterfaceAPI("benchmark", max_workers=concurrency, api_root=server.api_root)
+        try:
+            sync = _measure(lambda: api.create_estimates_batch(estimates), repeat)
+        finally:
+            api.close()
+        asynchronous = _measure(lambda: asyncio.run(run_async(server.api_root)), repeat)
+    return {
+        f"api/{requests}/sync_batch": dict(sync, requests_per_sec=requests / sync["seconds"]),
+        f"api/{requests}/async_batch": dict(asynchronous, requests_per_sec=requests / asynchronous["seconds"]),
+    }
+
+
+def bench_startup(rows, repeat=3, seed=0):
+    """Times `main.py --startup-time` in a fresh process, with a data file of `rows` records present."""
+    main_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    workdir = tempfile.mkdtemp(prefix="carbon_startup_")
+    try:
+        generate_dataset(rows, seed=seed).to_csv(os.path.join(workdir, "emissions_data.csv"), index=False)
+        run = lambda: subprocess.run([sys.executable, main_script, "--startup-time"], cwd=workdir, check=True,
+                                     stdout=subprocess.DEVNULL)
+        return {f"startup/{rows}/main": _measure(run, repeat)}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(results, baseline, threshold=0.2):
+    """Returns (name, baseline seconds, current seconds, ratio) for every benchmark slower than the
+    baseline by more than threshold (0.2 = 20%)."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous and previous["seconds"] > 0:
+            ratio = result["seconds"] / previous["seconds"]
+            if ratio > 1 + threshold:
+                regressions.append((name, previous["seconds"], result["seconds"], ratio))
+    return regressions
+
+
+def environment():
+    return {
+        "python": sys.version.split()[0],
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark storage, analytics and the API client on synthetic data.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 100000], help="Dataset sizes, e.g. 1000 10000000")
+    parser.add_argument("--users", type=int, default=1000, help="Distinct users in each dataset")
+    parser.add_argument("--categories", type=int, default=5, help="Distinct categories in each dataset")
+    parser.add_argument("--formats", nargs="+", choices=sorted(FORMATS), default=["csv"], help="Storage formats")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions per benchmark; the median is reported")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic data")
+    parser.add_argument("--adds", type=int, default=1000, help="add_emission calls timed in append-log mode")
+    parser.add_argument("--save-adds", type=int, default=5, help="add_emission calls timed with a save after each")
+    parser.add_argument("--api-requests", type=int, default=500, help="Estimates per API run; 0 skips the API")
+    parser.add_argument("--api-concurrency", type=int, default=32, help="Requests in flight during API runs")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="Seconds the mock server waits per request")
+    parser.add_argument("--no-startup", dest="startup", action="store_false",
+                        help="Skip timing the CLI's startup with the largest dataset present")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Earlier results to compare against; regressions exit with status 1")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Slowdown flagged as a regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="carbon_benchmark_")
+    try:
+        for fmt in args.formats:
+            for rows in args.rows:
+                print(f"Benchmarking {fmt} with {rows} rows...")
+                results.update(bench_data_analysis(rows, args.users, args.categories, fmt, args.repeat, workdir,
+                                                   args.seed, args.adds, args.save_adds))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.startup:
+        print("Benchmarking CLI startup...")
+        results.update(bench_startup(max(args.rows), args.repeat, args.seed))
+    if args.api_requests:
+        print(f"Benchmarking the API clients with {args.api_requests} requests...")
+        results.update(bench_api(args.api_requests, args.api_concurrency, args.api_latency, args.repeat))
+
+    for name, result in results.items():
+        rate = result.get("ops_per_sec") or result.get("requests_per_sec")
+        print(f"{name:<50} {result['seconds'] * 1000:12.4f} ms" + (f" {rate:14.1f} /s" if rate else ""))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "arguments": vars(args), "results": results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n\033[1m{len(regressions)} regression(s) over {args.threshold:.0%}:\033[0m")
+            for name, before, after, ratio in regressions:
+                print(f"  {name}: {before * 1000:.3f} ms -> {after * 1000:.3f} ms ({ratio:.2f}x)")
+            sys.exit(1)
+        print(f"No regressions over {args.threshold:.0%} against {args.baseline}.")
@@ -0,0 +1,279 @@
+import csv
+import json
+import os
+import uuid
+from itertools import islice
+import pandas as pd
+from api_handler import (electricity_params, flight_params, shipping_params, fuel_combustion_params,
+                         vehicle_params)
+from data import FUEL_SOURCES, COUNTRY_CODES
+from storage import atomic_write
+
+
+CATEGORIES = {
+    "electricity": "Electricity",
+    "flight": "Flight",
+    "shipping": "Shipping",
+    "fuel_combustion": "Fuel Combustion",
+    "vehicle": "Vehicle",
+}
+WEIGHT_UNITS = ("g", "lb", "kg", "mt")
+DISTANCE_UNITS = ("km", "mi")
+TRANSPORT_METHODS = ("ship", "train", "truck", "plane")
+
+
+def read_activities(path):
+    """Streams activity rows from a CSV or JSONL file as dicts, one at a time."""
+    if os.path.splitext(path)[1].lower() in (".jsonl", ".ndjson"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        row = None
+                    yield row if isinstance(row, dict) else {"_error": "Line is not a JSON object."}
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+
+
+def _number(row, field, integer=False):
+    value = row.get(field)
+    try:
+        number = int(value) if integer else float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{field}' must be a number, got {value!r}.")
+    if number < 0 or (integer and number == 0):
+        raise ValueError(f"'{field}' must be positive, got {value!r}.")
+    return number
+
+
+def _choice(row, field, choices, default=None):
+    value = row.get(field) or default
+    value = value.strip().lower() if isinstance(value, str) else value
+    if value not in choices:
+        raise ValueError(f"'{field}' must be one of {', '.join(choices)}, got {row.get(field)!r}.")
+    return value
+
+
+def _legs(value):
+    """Flight legs as a JSON list of airport pairs, or as text like 'JFK-LHR;LHR-CDG'."""
+    if isinstance(value, str) and value.strip().startswith("["):
+        value = json.loads(value)
+    if isinstance(value, str):
+        value = [leg.split("-") for leg in value.split(";") if leg.strip()]
+        value = [{"departure_airport": leg[0].strip().upper(), "destination_airport": leg[-1].strip().upper()}
+                 for leg in value if len(leg) == 2]
+    if not isinstance(value, list) or not value:
+        raise ValueError("'legs' must list at least one departure-destination airport pair.")
+    for leg in value:
+        if not isinstance(leg, dict) or not leg.get("departure_airport") or not leg.get("destination_airport"):
+            raise ValueError("Each flight leg needs a departure_airport and a destination_airport.")
+    return value
+
+
+def parse_timestamp(value):
+    """An activity's timestamp as a pd.Timestamp, now if it has none; ValueError if unreadable."""
+    if value is None:
+        return pd.Timestamp.now()
+    try:
+        timestamp = pd.Timestamp(value)
+    except (TypeError, ValueError):
+        timestamp = pd.NaT
+    if pd.isna(timestamp):
+        raise ValueError(f"Invalid timestamp {value!r}.")
+    return timestamp
+
+
+def validate_activity(row):
+    """Turns an activity row into (category, estimate_type, params, user_id, timestamp).
+
+    Raises ValueError with a readable reason when the row cannot be estimated or its
+    timestamp cannot be read. Rows without a timestamp are dated now.
+    """
+    if "_error" in row:
+        raise ValueError(row["_error"])
+    user_id = str(row.get("user_id") or "").strip()
+    if not user_id:
+        raise ValueError("'user_id' is missing.")
+    estimate_type = str(row.get("type") or "").strip().lower()
+    if estimate_type not in CATEGORIES:
+        raise ValueError(f"'type' must be one of {', '.join(CATEGORIES)}, got {row.get('type')!r}.")
+
+    if estimate_type == "electricity":
+        country = str(row.get("country") or "").strip().upper()
+        if country not in COUNTRY_CODES:
+            raise ValueError(f"Unknown country code {row.get('country')!r}.")
+        params = electricity_params(_number(row, "electricity_value"), country, row.get("state") or None,
+                                    _choice(row, "electricity_unit", ("kwh", "mwh"), default="kwh"))
+    elif estimate_type == "flight":
+        params = flight_params(_number(row, "passengers", integer=True), _legs(row.get("legs")),
+                               _choice(row, "distance_unit", DISTANCE_UNITS, default="km"))
+    elif estimate_type == "shipping":
+        params = shipping_params(_number(row, "weight_value"), _choice(row, "weight_unit", WEIGHT_UNITS),
+                                 _number(row, "distance_value"), _choice(row, "distance_unit", DISTANCE_UNITS),
+                                 _choice(row, "transport_method", TRANSPORT_METHODS))
+    elif estimate_type == "fuel_combustion":
+        fuel = str(row.get("fuel_source_type") or "").strip().lower()
+        if fuel not in FUEL_SOURCES:
+            raise ValueError(f"Unknown fuel source type {row.get('fuel_source_type')!r}.")
+        unit = _choice(row, "fuel_source_unit", FUEL_SOURCES[fuel]["units"])
+        params = fuel_combustion_params(fuel, unit, _number(row, "fuel_source_value"))
+    else:
+        model_id = str(row.get("vehicle_model_id") or "").strip()
+        if not model_id:
+            raise ValueError("'vehicle_model_id' is missing.")
+        params = vehicle_params(_number(row, "distance_value"),
+                                _choice(row, "distance_unit", DISTANCE_UNITS), model_id)
+
+    return CATEGORIES[estimate_type], estimate_type, params, user_id, parse_timestamp(row.get("timestamp") or None)
+
+
+def estimate_carbon_kg(response):
+    """The carbon_kg of an estimate response, or None if it has none (e.g. an {"error": ...} result)."""
+    carbon_kg = response.get("data", {}).get("attributes", {}).get("carbon_kg") if "data" in response else None
+    return carbon_kg if isinstance(carbon_kg, (int, float)) else None
+
+
+class BulkImporter:
+    """Estimates activity files in bulk and stores the results through a DataAnalysis.
+
+    Rows are read in batches of batch_size. Each batch is estimated concurrently with at
+    most max_workers requests in flight and stored with one write. Progress is saved to
+    "<source>.checkpoint" after every batch, so an interrupted import resumes at the first
+    unfinished batch. Rows that fail validation or estimation go to "<source>.rejects.jsonl".
+    """
+
+    def __init__(self, api, data_analysis, batch_size=500, max_workers=8):
+        self.api = api
+        self.data_analysis = data_analysis
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+
+    def import_file(self, source, checkpoint_file=None, rejects_file=None):
+        """Imports a CSV or JSONL activity file and returns counts of rows imported, rejected and skipped."""
+        checkpoint_file = checkpoint_file if checkpoint_file else f"{source}.checkpoint"
+        rejects_file = rejects_file if rejects_file else f"{source}.rejects.jsonl"
+        checkpoint = self._resume(checkpoint_file, rejects_file)
+        import_id = checkpoint["import_id"]
+        rows_done = checkpoint["rows_done"]
+        stats = {"imported": checkpoint["imported"], "rejected": checkpoint["rejected"], "skipped": rows_done}
+        if rows_done:
+            print(f"Resuming {source} after {rows_done} rows.")
+
+        rows = islice(read_activities(source), rows_done, None)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            records, rejects = self._process_batch(batch, rows_done)
+            # Written before the batch is stored: if the import stops after storing it but before
+            # the next checkpoint, the store's record of the batch ID tells the resumed run it landed,
+            # and the batch's rejects are written again from here.
+            batch_id = f"{import_id}:{rows_done}"
+            self._write_checkpoint(checkpoint_file, dict(stats, import_id=import_id, rows_done=rows_done, batch={
+                "id": batch_id, "rows_done": rows_done + len(batch),
+                "imported": stats["imported"] + len(records), "rejected": stats["rejected"] + len(rejects),
+                "rejects": rejects, "rejects_size": self._rejects_size(rejects_file)}))
+            self.data_analysis.add_emissions(records, batch_id=batch_id)
+            self._write_rejects(rejects_file, rejects)
+
+            rows_done += len(batch)
+            stats["imported"] += len(records)
+            stats["rejected"] += len(rejects)
+            self._write_checkpoint(checkpoint_file, dict(stats, import_id=import_id, rows_done=rows_done))
+            print(f"Processed {rows_done} rows ({stats['imported']} imported, {stats['rejected']} rejected).")
+
+        if os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
+        return stats
+
+    def _process_batch(self, batch, first_row):
+        """Validates and estimates one batch; returns records to store and rejected rows."""
+        valid, rejects = [], []
+        for row_number, row in enumerate(batch, start=first_row + 1):
+            try:
+                valid.append((row_number, validate_activity(row)))
+            except ValueError as e:
+                rejects.append({"row": row_number, "error": str(e), "activity": row})
+
+        responses = self.api.create_estimates_batch(
+            [(estimate_type, params) for _, (_, estimate_type, params, _, _) in valid], max_workers=self.max_workers)
+
+        records = []
+        for (row_number, (category, _, _, user_id, timestamp)), response in zip(valid, responses):
+            carbon_kg = estimate_carbon_kg(response)
+            if carbon_kg is not None:
+                records.append((category, carbon_kg, user_id, timestamp))
+            else:
+                rejects.append({"row": row_number, "error": response.get("error", "No carbon_kg in the response."),
+                                "activity": batch[row_number - first_row - 1]})
+        return records, rejects
+
+    def _resume(self, checkpoint_file, rejects_file):
+        """The checkpoint to continue from; a fresh one with a new import ID if there is none.
+
+        Rejects of a batch the import stopped in are cut from rejects_file, and written again
+        if the batch was stored, so each rejected row is listed once.
+        """
+        fresh = {"import_id": uuid.uuid4().hex, "rows_done": 0, "imported": 0, "rejected": 0}
+        if not os.path.exists(checkpoint_file):
+            return fresh
+        try:
+            with open(checkpoint_file, encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            print(f"Ignoring unreadable checkpoint {checkpoint_file}. Starting over.")
+            return fresh
+        batch = checkpoint.pop("batch", None)
+        if batch and "id" in batch:
+            if self._rejects_size(rejects_file) > batch["rejects_size"]:
+                with open(rejects_file, "r+b") as f:
+                    f.truncate(batch["rejects_size"])
+            if self.data_analysis.has_batch(batch["id"]):
+                # The last batch was stored before the import stopped
+                self._write_rejects(rejects_file, batch.pop("rejects"))
+                checkpoint.update(batch)
+        return {key: checkpoint.get(key, fresh[key]) for key in fresh}
+
+    def _write_checkpoint(self, checkpoint_file, checkpoint):
+        atomic_write(checkpoint_file, json.dumps(checkpoint, default=str).encode("utf-8"))
+
+    def _rejects_size(self, rejects_file):
+        return os.path.getsize(rejects_file) if os.path.exists(rejects_file) else 0
+
+    def _write_rejects(self, rejects_file, rejects):
+        if rejects:
+            with open(rejects_file, "a", encoding="utf-8") as f:
+                for reject in rejects:
+                    f.write(json.dumps(reject, default=str) + "\n")
+
+
+if __name__ == "__main__":
+    import argparse
+    from api_handler import API_ROOT, CarbonInterfaceAPI
+    from data_analysis import DataAnalysis
+    from request_scheduler import RequestScheduler
+
+    parser = argparse.ArgumentParser(description="Estimate and store a CSV or JSONL file of activities.")
+    parser.add_argument("source", help="Activity file with user_id, type and the type's fields per row")
+    parser.add_argument("--api-key", default=os.environ.get("CARBON_INTERFACE_API_KEY", ""),
+                        help="Carbon Interface API key (default: $CARBON_INTERFACE_API_KEY)")
+    parser.add_argument("--api-root", default=API_ROOT, help="API root URL, e.g. a mock server")
+    parser.add_argument("--data-file", default="emissions_data.csv", help="Emissions data file to add to")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows estimated and stored per batch")
+    parser.add_argument("--workers", type=int, default=8, help="Estimate requests in flight at once")
+    parser.add_argument("--rate", type=float, help="Maximum estimate requests per second (default: no limit)")
+    args = parser.parse_args()
+
+    scheduler = RequestScheduler(rate=args.rate)
+    api = CarbonInterfaceAPI(args.api_key, max_workers=args.workers, api_root=args.api_root, scheduler=scheduler)
+    data_analysis = DataAnalysis(args.data_file, append_log=True)
+    try:
+        result = BulkImporter(api, data_analysis, args.batch_size, args.workers).import_file(args.source)
+        data_analysis.compact()
+    finally:
+        api.close()
+    print(f"Imported {result['imported']} records, rejected {result['rejected']}.")
+    print(f"API requests: {scheduler.stats()}")
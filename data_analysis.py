@@ -1,176 +1,1085 @@
 import pandas as pd
+import numpy as np
+import io
 import os
-import matplotlib.pyplot as plt
-import seaborn as sns
+import atexit
+import contextlib
+import threading
+import json
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime
+import metrics
+from emission_index import EmissionIndex
+from locks import FileLock, RWLock, file_signature
+from parallel_aggregation import DEFAULT_PARALLEL_THRESHOLD
+from rollups import RollupStore, window_bounds
+from storage import COLUMNS, atomic_write, concat_compact, empty_frame, storage_for_path, to_compact_dtypes
+
+
+MAX_BATCH_IDS = 100  # Most recent batch IDs of add_emissions kept through compactions
+
+
+def _log_changes(entries):
+    """Counts the log entries that change records; batch IDs kept through a compaction do not."""
+    return sum(1 for entry in entries if entry["op"] != "batch" or entry["records"])
+
+
+def is_emission(carbon_kg):
+    """True for a finite number; NaN and infinity would corrupt the running totals."""
+    return isinstance(carbon_kg, (int, float)) and math.isfinite(carbon_kg)
+
+
+def _user_key(user_id):
+    """A user ID as the frame stores it, so 7 and "7" are the same user; None stays None."""
+    return user_id if user_id is None or isinstance(user_id, str) else str(user_id)
+
+
+def parse_records(records):
+    """Checks (category, carbon_kg, user_id[, timestamp]) records before any of them is stored.
+
+    Returns them as (category, carbon_kg, user_id, timestamp), with the user ID as a string
+    and dated now where no timestamp is given. Records whose emission is not a finite number are skipped. A timestamp that cannot be read
+    raises ValueError, so a batch is stored whole or not at all.
+    """
+    now = pd.Timestamp(datetime.now())
+    parsed = []
+    for record in records:
+        category, carbon_kg, user_id = record[:3]
+        if not is_emission(carbon_kg):
+            print(f"Skipping record for User ID {user_id}: invalid data type for emission. Expected a number.")
+            continue
+        timestamp = record[3] if len(record) > 3 else None
+        if timestamp is None:
+            timestamp = now
+        else:
+            try:
+                timestamp = pd.Timestamp(timestamp)
+            except (TypeError, ValueError):
+                timestamp = pd.NaT
+            if pd.isna(timestamp):
+                raise ValueError(f"Invalid timestamp {record[3]!r} for User ID {user_id}.")
+        parsed.append((category, carbon_kg, _user_key(user_id), timestamp))
+    return parsed
+
+
+def sorted_positions(values, ascending=True, limit=None):
+    """Returns the positions that order a float array, or just the first `limit` of them.
+
+    Equal values keep their original order in either direction and NaN always comes last,
+    so a limited result is exactly the start of the full one.
+    """
+    keys = values if ascending else -values  # NaN stays NaN, and numpy sorts it last
+    if limit is None or not 0 <= limit < len(values):
+        return np.argsort(keys, kind="stable")
+    if limit == 0:
+        return np.array([], dtype=np.intp)
+    kth = np.partition(keys, limit - 1)[limit - 1]
+    if np.isnan(kth):
+        below, tied = np.flatnonzero(~np.isnan(keys)), np.flatnonzero(np.isnan(keys))
+    else:
+        below, tied = np.flatnonzero(keys < kth), np.flatnonzero(keys == kth)
+    # Of the values equal to the cut-off, the earliest ones make it in
+    candidates = np.concatenate([below, tied[:limit - len(below)]])
+    return candidates[np.argsort(keys[candidates], kind="stable")]
+
+
+def prompt_user_ids(user_exists):
+    """Asks for user IDs until the user stops, accepting only IDs for which user_exists is true."""
+    user_ids = []
+
+    while True:
+        user_id_input = input("Enter a user ID: ")
+        
+        if not user_exists(user_id_input):
+            print(f"User ID '{user_id_input}' does not exist in the data. Please enter a valid User ID.")
+            continue
+        
+        user_ids.append(user_id_input)
+        
+        more_users = input("Would you like to add another user? (y/n): ").lower()
+        if more_users != 'y':
+            break
+    return user_ids
+
+
+def draw_category_totals(ax, category_totals, title):
+    """Draws a bar chart of {category: total emission}, largest first, on the given axes."""
+    import seaborn as sns  # Plotting libraries are slow to import, so only when plotting
+    emissions_sum = pd.DataFrame({"Emission (kg)": pd.Series(category_totals, dtype=float)}).rename_axis("Category")
+    emissions_sum = emissions_sum.sort_values(by="Emission (kg)", ascending=False)
+    emissions_sum.plot(kind="bar", y="Emission (kg)", legend=False, color=sns.color_palette("Set2", len(emissions_sum)), ax=ax)
+    ax.bar_label(ax.containers[0], labels=[f'{v:.2f}' for v in emissions_sum["Emission (kg)"]], label_type="edge", fontsize=10)
+    ax.set_title(title, fontsize=16)
+    ax.set_xlabel("Emission (kg)", fontsize=12)
+    ax.set_ylabel("Category", fontsize=12)
+
+
+def draw_users_comparison(ax, user_category_totals):
+    """Draws grouped bars of {user_id: {category: total emission}} on the given axes."""
+    emissions_sum = pd.DataFrame(user_category_totals).T
+    emissions_sum = emissions_sum.fillna(0).sort_index().sort_index(axis=1)
+    emissions_sum = emissions_sum.rename_axis(index="User ID", columns="Category")
+
+    emissions_sum.plot(kind="bar", stacked=False, colormap="Set2", ax=ax)
+
+    ax.set_title(f"Emissions Comparison for Selected Users", fontsize=16)
+    ax.set_xlabel("Category", fontsize=12)
+    ax.set_ylabel("Emission (kg)", fontsize=12)
+
+
+def plot_category_totals(category_totals, title):
+    """Shows a bar chart of {category: total emission}, largest first."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    sns.set(style="whitegrid")
+    _, ax = plt.subplots()
+    draw_category_totals(ax, category_totals, title)
+    plt.tight_layout()
+    plt.show()
+
+
+def plot_users_comparison(user_category_totals):
+    """Shows grouped bars of {user_id: {category: total emission}}."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    sns.set(style="whitegrid")
+    _, ax = plt.subplots(figsize=(10, 6))
+    draw_users_comparison(ax, user_category_totals)
+    plt.tight_layout()
+    plt.show()
+
+
+def style_whitegrid(ax):
+    """Gives axes seaborn's whitegrid look without changing matplotlib's global settings."""
+    ax.set_facecolor("white")
+    ax.set_axisbelow(True)
+    ax.grid(True, color=".8", linestyle="-", linewidth=1)
+    for spine in ax.spines.values():
+        spine.set_color(".8")
+    ax.tick_params(length=0, colors=".15")
+
+
+def render_chart(draw, fmt="png", figsize=(8, 6)):
+    """Draws a chart off screen and returns it as PNG or SVG bytes.
+
+    The figure is built without pyplot, so no display or GUI backend is needed and
+    charts can be rendered from several threads.
+    """
+    from matplotlib.figure import Figure
+    if fmt not in ("png", "svg"):
+        raise ValueError(f"Unsupported chart format '{fmt}'. Expected 'png' or 'svg'.")
+    figure = Figure(figsize=figsize)
+    ax = figure.subplots()
+    draw(ax)
+    style_whitegrid(ax)
+    figure.tight_layout()
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def write_chart(data, output):
+    """Writes chart bytes to a file path or a binary file object."""
+    if hasattr(output, "write"):
+        output.write(data)
+    else:
+        atomic_write(os.fspath(output), data)
+
+
+def chart_format(output, fmt=None):
+    """The chart format to use: fmt if given, else svg for .svg paths, else png."""
+    if fmt:
+        return fmt.lower()
+    if isinstance(output, (str, os.PathLike)) and os.fspath(output).lower().endswith(".svg"):
+        return "svg"
+    return "png"
 
 
 class DataAnalysis:
-    def __init__(self, data_file="emissions_data.csv"):
+    def __init__(self, data_file="emissions_data.csv", append_log=False, compact_threshold=10000, storage=None,
+                 workers=None, parallel_threshold=DEFAULT_PARALLEL_THRESHOLD, write_behind=False, flush_rows=1000,
+                 flush_interval=5.0, durability="log", lazy_load=False, process_lock=True, reload_interval=1.0):
         self.total_emissions = 0.0
         self.data_file = data_file if data_file else "emissions_data.csv"
-        self.emissions_df = pd.DataFrame(columns=["Category", "Emission (kg)", "User ID"])
-
-        # Load existing data
-        self.load_data()
-
-    def add_emission(self, category, carbon_kg, user_id):
-        """Adds an emission record with the user's ID."""
-        if isinstance(carbon_kg, (int, float)):
-            self.total_emissions += carbon_kg
-            new_data = pd.DataFrame({"Category": [category], "Emission (kg)": [carbon_kg], "User ID": [user_id]})
-            self.emissions_df = pd.concat([self.emissions_df, new_data], ignore_index=True)
-            self.save_data()
+        # CSV, Parquet or Feather, chosen from the file extension unless given
+        self.storage = storage if storage else storage_for_path(self.data_file)
+        # In append-log mode new records go to "<data_file>.log" and are folded
+        # into the data file once the log holds compact_threshold entries.
+        self.append_log = append_log
+        self.log_file = f"{self.data_file}.log"
+        self.compact_threshold = compact_threshold
+        self._log_entries = 0
+        self._log_offset = 0  # Bytes of the log read or written so far
+        self._pending = []  # Rows added since the frame was last materialized
+        self._next_label = 0  # Frame label of the next added row
+        # Deleted rows stay in the frame, marked by tombstones, until the next frame read or
+        # save drops them all in one pass: each user's rows below a cutoff label, and ranges
+        # [start, stop) of labels. The index and rollups forget deleted rows at once.
+        self._user_tombstones = {}
+        self._range_tombstones = []
+        # Goes up whenever the rows are numbered anew (loads, saves and compactions), so a
+        # removal by number can tell that the numbers it was given no longer mean the same rows
+        self._numbering = 0
+        self._shown_numbering = None  # Numbering of the rows display_emission_data last showed
+        self._batch_ids = OrderedDict()  # IDs of stored add_emissions batches, oldest first
+        self._df = empty_frame()
+        self.index = EmissionIndex(workers, parallel_threshold)
+        self.rollups = RollupStore()  # Daily, weekly and monthly totals per user and category
+
+        # Rendered charts keyed on the users they show and those users' data versions. Every
+        # change takes the next data version and stamps it on the user it touched, so a
+        # chart is only rendered again after one of its users changed.
+        self._data_version = 0
+        self._user_versions = {}
+        self._reload_version = 0  # Data version when all records were last replaced
+        self._charts = OrderedDict()
+        self._charts_lock = threading.Lock()
+        self.max_cached_charts = 64
+
+        # In write-behind mode changes are applied in memory and saved by a background thread
+        # once flush_rows changes are waiting or every flush_interval seconds. With durability
+        # "log" every change is also appended to the log first, so a crash loses nothing;
+        # with "none" changes made since the last flush are lost if the process dies.
+        if durability not in ("log", "none"):
+            raise ValueError(f"Unknown durability '{durability}'. Expected 'log' or 'none'.")
+        self.write_behind = write_behind
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.durability = durability
+        if write_behind and durability == "log":
+            self.append_log = True
+        # Without the append log, deletions (and batches with an ID) are still logged rather
+        # than saved by rewriting the data file; they are folded into it with the next save.
+        # Only write-behind with durability "none" keeps no log at all.
+        self._reads_log = self.append_log or not write_behind
+        self._lock = RWLock()  # Queries share the records; changes, loads and saves take them alone
+        self._save_lock = threading.RLock()  # Keeps saves in order
+        self._unflushed = 0
+        self._flusher = None
+        self._loaded = False
+        self._warm_thread = None
+
+        # Several processes can share the data file. With process_lock every change holds
+        # "<data_file>.lock" and first applies whatever other processes wrote, so none of them
+        # overwrites another's records; queries look for such changes at most every
+        # reload_interval seconds (None never looks). Write-behind with durability "none" keeps changes only in
+        # memory until a flush, so it cannot take in others' changes and expects one writer.
+        self.process_lock = process_lock
+        self.reload_interval = reload_interval
+        self._file_lock = FileLock(f"{self.data_file}.lock") if process_lock else contextlib.nullcontext()
+        self._tracks_changes = process_lock and not (write_behind and durability == "none")
+        self._files_seen = None  # _file_state() after the last load, save or log write
+        self._next_check = 0.0
+
+        # Load existing data, or with lazy_load wait for the first query that needs it
+        if not lazy_load:
+            self._ensure_loaded()
+
+        if write_behind:
+            self._flush_requested = threading.Event()
+            self._closing = threading.Event()
+            self._flusher = threading.Thread(target=self._flush_loop, name="emissions-flusher", daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
+
+    def _ensure_loaded(self):
+        """Loads the data file the first time the records are needed, and afterwards picks
+        up changes made by other processes. Must not be called holding the read lock."""
+        if not self._loaded:
+            with self._lock.write():
+                if not self._loaded:
+                    self.load_data()
+                    self._loaded = True
+        elif self._tracks_changes and self.reload_interval is not None and time.monotonic() >= self._next_check:
+            self._next_check = time.monotonic() + self.reload_interval
+            if self._file_state() != self._files_seen:
+                with self._lock.write(), self._file_lock:
+                    self._catch_up()
+
+    def _file_state(self):
+        """Identifies what the data file and the log hold, without reading them."""
+        log_size = os.path.getsize(self.log_file) if self._reads_log and os.path.exists(self.log_file) else 0
+        return file_signature(self.data_file), log_size
+
+    def _remember_files(self):
+        self._files_seen = (file_signature(self.data_file), self._log_offset)
+        if self.reload_interval is not None:
+            self._next_check = time.monotonic() + self.reload_interval
+
+    def _catch_up(self):
+        """Applies what other processes wrote since this one last read or wrote the files.
+
+        Appended log entries are replayed; a replaced data file or a shorter log means another
+        process compacted or saved, and everything is loaded again. Needs the write and file locks.
+        """
+        if not self._tracks_changes or self._files_seen is None:
+            return
+        data_state, log_size = self._file_state()
+        seen_data, seen_log = self._files_seen
+        if (data_state, log_size) == self._files_seen:
+            return
+        if data_state != seen_data or log_size < seen_log:
+            self.load_data()
+            metrics.inc("data_reloads_total", kind="full")
+        else:
+            self._replay_log(self._read_log(seen_log))
+            self._remember_files()
+            metrics.inc("data_reloads_total", kind="log")
+
+    @contextlib.contextmanager
+    def _changing(self, logged=False):
+        """Holds the records alone, caught up with other processes, while a change is applied.
+
+        The change adds its log entries to the yielded list. They are then appended to the
+        log or, without one, the data file is saved before the locks are released. Deletions
+        and batches with an ID pass logged=True to be logged even without the append log.
+        """
+        self._ensure_loaded()
+        saves_now = not self.append_log and not self.write_behind
+        entries = []
+        with self._save_lock if saves_now else contextlib.nullcontext(), self._lock.write(), self._file_lock:
+            self._catch_up()
+            yield entries
+            if entries and (self.append_log or logged and saves_now):
+                self._append_log(*entries)
+            elif entries and saves_now:
+                self.save_data()
+        if entries:
+            self._persist(len(entries))
+
+    def warm(self, background=True):
+        """Loads the data now if it is not loaded yet, by default on a background thread."""
+        if self._loaded or (self._warm_thread is not None and self._warm_thread.is_alive()):
+            return self._warm_thread
+        if not background:
+            self._ensure_loaded()
+            return None
+        self._warm_thread = threading.Thread(target=self._ensure_loaded, daemon=True)
+        self._warm_thread.start()
+        return self._warm_thread
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def flush(self):
+        """Saves any changes still waiting in memory."""
+        with self._lock.write():
+            changes, self._unflushed = self._unflushed, 0
+        if changes:
+            try:
+                self.save_data()
+            except Exception:
+                with self._lock.write():
+                    self._unflushed += changes
+                raise
+
+    def close(self):
+        """Stops the background flusher, if any, and saves what is still waiting."""
+        if self._flusher is not None:
+            self._closing.set()
+            self._flush_requested.set()
+            self._flusher.join()
+            self._flusher = None
+            atexit.unregister(self.close)
+        self.flush()
+
+    def _flush_loop(self):
+        while not self._closing.is_set():
+            self._flush_requested.wait(self.flush_interval)
+            self._flush_requested.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error saving emissions data in the background: {e}")
+
+    def _persist(self, changes):
+        """Schedules saving, or compacts a full log, after `changes` records were added or removed.
+
+        Without write-behind, a change not logged was already saved while it was made.
+        """
+        if self.write_behind:
+            with self._lock.write():
+                self._unflushed += changes
+                if self._unflushed >= self.flush_rows:
+                    self._flush_requested.set()
+        elif self._reads_log and self._log_entries >= self.compact_threshold:
+            self.compact()
+
+    @property
+    def emissions_df(self):
+        """The emissions frame, with any pending rows concatenated in one go."""
+        self._ensure_loaded()
+        return self._frame()
+
+    def _frame(self):
+        """The frame with pending rows concatenated and deleted rows dropped, without loading
+        or catching up first. Must not be called holding only the read lock."""
+        with self._lock.read():
+            if self._settled():
+                return self._df
+        with self._lock.write():
+            df = self._materialize()
+            if self._user_tombstones or self._range_tombstones:
+                self._df = df[self._live_mask(df)]
+                self._user_tombstones = {}
+                self._range_tombstones = []
+            return self._df
+
+    def _settled(self):
+        """True if the frame has no pending rows to concatenate nor deleted rows to drop, so
+        readers can share it as it is. Needs the read lock."""
+        return not self._pending and not self._user_tombstones and not self._range_tombstones
+
+    def _materialize(self):
+        """The frame with pending rows concatenated, still holding deleted rows. Needs the write lock."""
+        if self._pending:
+            labels = range(self._next_label - len(self._pending), self._next_label)
+            new_data = to_compact_dtypes(pd.DataFrame(self._pending, columns=COLUMNS, index=labels))
+            if self._df.empty:
+                self._df = new_data
+            else:
+                self._df = concat_compact(self._df, new_data)
+            self._pending = []
+        return self._df
+
+    def _live_mask(self, df):
+        """False for the rows of df that a tombstone marks deleted."""
+        labels = df.index.to_numpy()
+        dead = np.zeros(len(df), dtype=bool)
+        if self._user_tombstones:
+            users = df["User ID"]
+            if isinstance(users.dtype, pd.CategoricalDtype):
+                # One lookup per distinct user rather than per row
+                cutoffs = np.array([self._user_tombstones.get(user, -1) for user in users.cat.categories] + [-1])
+                row_cutoffs = cutoffs[users.cat.codes.to_numpy()]  # Code -1 (missing) picks the trailing -1
+            else:
+                row_cutoffs = users.map(lambda user: self._user_tombstones.get(user, -1)).to_numpy()
+            dead |= labels < row_cutoffs
+        for start, stop in self._range_tombstones:
+            dead |= (labels >= start) & (labels < stop)
+        return ~dead
+
+    @emissions_df.setter
+    def emissions_df(self, df):
+        with self._lock.write():
+            self._pending = []
+            self._df = df.reset_index(drop=True)
+            self._next_label = len(self._df)
+            self._numbering += 1
+            self._user_tombstones = {}
+            self._range_tombstones = []
+            self._data_version += 1
+            self._reload_version = self._data_version
+            self._user_versions.clear()
+            self._charts.clear()
+            self.index.rebuild(self._df)
+            self.rollups.rebuild(self._df)
+
+    def add_emission(self, category, carbon_kg, user_id, timestamp=None):
+        """Adds an emission record with the user's ID, dated now unless a timestamp is given."""
+        if is_emission(carbon_kg):
+            user_id = _user_key(user_id)
+            timestamp = pd.Timestamp(timestamp) if timestamp is not None else pd.Timestamp(datetime.now())
+            with self._changing() as entries:
+                self._add_row(category, carbon_kg, user_id, timestamp)
+                entries.append({"op": "add", "Category": category, "Emission (kg)": carbon_kg,
+                                "User ID": user_id, "Timestamp": timestamp.isoformat()})
         else:
             print("Invalid data type for emission. Expected a number.")
 
+    def add_emissions(self, records, batch_id=None):
+        """Adds many (category, carbon_kg, user_id[, timestamp]) records with a single save or log write.
+
+        Records whose emission is not a finite number are skipped, and an unreadable timestamp
+        raises ValueError before anything is added. Returns the number of records added.
+        With a batch_id the records are logged as one entry together with the ID, so has_batch
+        tells afterwards whether they were stored, even after a crash.
+        """
+        if batch_id is not None and not self._reads_log:
+            raise ValueError("Batch IDs need a log, which write-behind with durability 'none' does not keep.")
+        records = parse_records(records)
+        added = []
+        with self._changing(logged=batch_id is not None) as entries:
+            for category, carbon_kg, user_id, timestamp in records:
+                self._add_row(category, carbon_kg, user_id, timestamp)
+                added.append({"Category": category, "Emission (kg)": carbon_kg, "User ID": user_id,
+                              "Timestamp": timestamp.isoformat()})
+            if batch_id is not None:
+                # One line, so a torn write loses the records and the ID together
+                entries.append({"op": "batch", "id": batch_id, "records": added})
+                self._remember_batch(batch_id)
+            else:
+                entries.extend(dict(record, op="add") for record in added)
+        return len(added)
+
+    def has_batch(self, batch_id):
+        """Returns True if add_emissions stored a batch with this ID (one of the last MAX_BATCH_IDS)."""
+        self._ensure_loaded()
+        return batch_id in self._batch_ids
+
+    def _remember_batch(self, batch_id):
+        self._batch_ids[batch_id] = None
+        while len(self._batch_ids) > MAX_BATCH_IDS:
+            self._batch_ids.popitem(last=False)
+
+    def _add_row(self, category, carbon_kg, user_id, timestamp=None):
+        """Queues a row for the frame and records it in the index and rollups."""
+        user_id = _user_key(user_id)  # Logs written before IDs were strings may hold numbers
+        self.index.add(self._next_label, category, carbon_kg, user_id)
+        self.rollups.add(timestamp, category, carbon_kg, user_id)
+        self.total_emissions += carbon_kg
+        self._next_label += 1
+        self._data_version += 1
+        self._user_versions[user_id] = self._data_version
+        self._pending.append([category, carbon_kg, user_id, timestamp])
+
+    def _remove_rows(self, user_id=None):
+        """Deletes a user's rows with a tombstone, or every row. Returns True if there were any."""
+        if user_id:
+            user_id = _user_key(user_id)
+            if user_id not in self.index:
+                return False
+            self.total_emissions -= self.index.total(user_id)
+            self.index.remove_user(user_id)
+            self.rollups.remove_user(user_id)
+            self._user_tombstones[user_id] = self._next_label
+            self._data_version += 1
+            self._user_versions[user_id] = self._data_version
+            return True
+        had_rows = not self._df.empty or bool(self._pending)
+        self.emissions_df = empty_frame()
+        self.total_emissions = 0.0
+        return had_rows
+
+    def _remove_range(self, start, stop):
+        """Deletes the live rows labelled start up to, but not including, stop. Returns how many there were."""
+        df = self._materialize()
+        if stop <= start or df.empty:
+            return 0
+        rows = df.loc[start:stop - 1]
+        rows = rows[self._live_mask(rows)]
+        if rows.empty:
+            return 0
+        self.index.remove_rows(zip(rows.index, rows["Category"], rows["Emission (kg)"], rows["User ID"]))
+        for timestamp, category, carbon_kg, user_id in zip(rows["Timestamp"], rows["Category"],
+                                                           rows["Emission (kg)"], rows["User ID"]):
+            if user_id == user_id:  # Rows without a user are not rolled up
+                self.rollups.remove(timestamp, category, carbon_kg, user_id)
+        self.total_emissions -= rows["Emission (kg)"].sum()
+        self._range_tombstones.append((start, stop))
+        self._data_version += 1
+        for user_id in rows["User ID"].dropna().unique():
+            self._user_versions[user_id] = self._data_version
+        return len(rows)
+
+    @metrics.timed("analytics_call_seconds", operation="get_total_emissions")
     def get_total_emissions(self, user_id=None):
         """Returns total emissions, filtered by User ID if specified."""
+        self._ensure_loaded()
+        # A single dict lookup or attribute read is atomic, so no lock is needed
         if user_id:
-            return self.emissions_df[self.emissions_df["User ID"] == user_id]["Emission (kg)"].sum()
-        return self.emissions_df["Emission (kg)"].sum()
+            return self.index.total(_user_key(user_id))
+        return self.total_emissions
 
     def save_data(self):
-        """Saves the emissions data to a CSV file."""
-        directory = os.path.dirname(self.data_file)
+        """Saves the emissions data to the data file."""
+        started = time.perf_counter()
+        with self._save_lock:
+            if self.append_log or self._reads_log and self._log_entries:
+                self.compact()  # Also folds in logged tombstones
+            elif self._tracks_changes:
+                # What other processes saved is taken in first, so it is not saved over
+                with self._lock.write(), self._file_lock:
+                    self._catch_up()
+                    df = self.storage.write_order(self._frame())
+                    self._write_data_file(self.storage.serialize(df))
+                    self._remember_files()
+                    self._renumber(df)
+            else:
+                # The frame is replaced, never modified, on change, so it can be written while others read
+                frame = self._frame()
+                df = self.storage.write_order(frame)
+                data = self.storage.serialize(df)
+                with self._file_lock:
+                    # Write-behind with durability "none" expects one writer and has no log to catch up from
+                    if self.process_lock and self._files_seen is not None and self._file_state() != self._files_seen:
+                        print(f"Warning: {self.data_file} was changed by another process; saving over it.")
+                    self._write_data_file(data)
+                    self._remember_files()
+                if not self.write_behind:
+                    with self._lock.write():
+                        if self._df is frame and not self._pending:  # Else a later save numbers them
+                            self._renumber(df)
+        if metrics.is_enabled():
+            self._record_io("save", started)
+
+    def load_data(self):
+        """Loads the emissions data from the data file, replaying the append log if present."""
+        started = time.perf_counter()
+        with self._lock.write(), self._file_lock:
+            log_entries = self._read_log() if self._reads_log else []
+            raw = self._read_data_file()
+            if raw is not None:
+                df = self.storage.deserialize(raw) if raw else empty_frame()
+
+                # Ensure required columns exist; files written before timestamps get NaT
+                for col in COLUMNS:
+                    if col not in df.columns:
+                        df[col] = None
+                self.emissions_df = to_compact_dtypes(df[COLUMNS])
+            else:
+                if not log_entries and not self._loaded:
+                    print("No existing data file found. Starting fresh.")
+                self.emissions_df = empty_frame()
+
+            self.total_emissions = self._df["Emission (kg)"].sum()
+            # Batches a crashed compaction already wrote into the data file keep their IDs
+            self._batch_ids.clear()
+            for entry in log_entries:
+                if entry["op"] == "batch":
+                    self._remember_batch(entry["id"])
+            if log_entries:
+                self._replay_log(self._unapplied_log_entries(log_entries, lambda: raw))
+            self._remember_files()
+        if metrics.is_enabled():
+            self._record_io("load", started)
+
+    def _record_io(self, operation, started):
+        """Records how long a load or save took, and the rows and file bytes it left."""
+        metrics.observe(f"data_{operation}_seconds", time.perf_counter() - started)
+        metrics.set_gauge("data_rows", len(self._df) + len(self._pending))
+        metrics.set_gauge("data_file_bytes", os.path.getsize(self.data_file) if os.path.exists(self.data_file) else 0)
+
+    def load_user_data(self, user_id, columns=None):
+        """Reads one user's records straight from storage, without loading the whole history."""
+        user_id = _user_key(user_id)
+        with self._file_lock:
+            if os.path.exists(self.data_file):
+                df = self.storage.read(self.data_file, columns=columns, user_id=user_id)
+            else:
+                df = pd.DataFrame(columns=columns if columns else COLUMNS)
+            log_entries = self._read_log(count=False) if self._reads_log else []
+
+        if any(entry["op"] == "remove_records" for entry in log_entries):
+            # Record ranges are numbered across all users, so the whole history is needed
+            return self._records(user_id)[list(df.columns)].reset_index(drop=True)
+        if log_entries:
+            rows = []
+            for entry in self._unapplied_log_entries(log_entries, self._read_data_file):
+                if entry["op"] == "add" and _user_key(entry["User ID"]) == user_id:
+                    rows.append([entry.get(col) for col in COLUMNS])
+                elif entry["op"] == "batch":
+                    rows.extend([record.get(col) for col in COLUMNS] for record in entry["records"]
+                                if _user_key(record["User ID"]) == user_id)
+                elif (entry["op"] == "remove" and _user_key(entry["User ID"]) in (None, user_id)
+                      or entry["op"] == "remove_users" and user_id in map(_user_key, entry["User IDs"])):
+                    df = df.iloc[0:0]
+                    rows = []
+            if rows:
+                logged = to_compact_dtypes(pd.DataFrame(rows, columns=COLUMNS))[list(df.columns)]
+                df = logged if df.empty else pd.concat([df, logged], ignore_index=True)
+        return df
+
+    def compact(self):
+        """Folds the append log into the data file and truncates the log."""
+        # Entries logged during the compaction would be truncated with it
+        with self._save_lock, self._lock.write(), self._file_lock:
+            self._catch_up()
+            df = self.storage.write_order(self._frame())  # Drops deleted rows for good
+            data = self.storage.serialize(df)
+            # The marker lets load_data tell whether the data file was replaced
+            # before a crash, in which case the entries above it are already in it.
+            self._append_log({"op": "compact", "sha256": hashlib.sha256(data).hexdigest()})
+            self._write_data_file(data)
+            # The log starts over with just the recent batch IDs, replaced in one step
+            kept = "".join(json.dumps({"op": "batch", "id": batch_id, "records": []}) + "\n"
+                           for batch_id in self._batch_ids).encode("utf-8")
+            atomic_write(self.log_file, kept)
+            self._log_entries = 0
+            self._log_offset = len(kept)
+            self._remember_files()
+            self._renumber(df)
+
+    def _renumber(self, df):
+        """Numbers the rows of the saved frame df as a fresh load of the data file would, since
+        later log entries may name rows by number. df must be in the order the rows were
+        written (storage.write_order), which for clustered Parquet is not the order they were
+        added. Needs the write lock."""
+        if not df.index.equals(pd.RangeIndex(len(df))):
+            self.index.relabel(df.index)
+            self._df = df.reset_index(drop=True)
+            self._next_label = len(self._df)
+            self._numbering += 1
+
+    def _read_data_file(self):
+        """Returns the raw bytes of the data file, or None if there is none."""
+        if not os.path.exists(self.data_file):
+            return None
+        with open(self.data_file, "rb") as f:
+            return f.read()
+
+    def _write_data_file(self, data):
+        """Atomically replaces the data file so a crash never leaves it half written."""
+        atomic_write(self.data_file, data)
+
+    def _append_log(self, *entries):
+        """Appends one JSON line per entry to the log and forces them to disk together."""
+        directory = os.path.dirname(self.log_file)
         if directory and not os.path.exists(directory):
             os.makedirs(directory, exist_ok=True)
-        self.emissions_df.to_csv(self.data_file, index=False)
+        with open(self.log_file, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+            f.flush()
+            os.fsync(f.fileno())
+            self._log_offset = f.tell()
+        self._log_entries += _log_changes(entries)
+        if self._files_seen is not None:
+            self._files_seen = (self._files_seen[0], self._log_offset)
 
-    def load_data(self):
-        """Loads the emissions data from a CSV file."""
-        if os.path.exists(self.data_file):
-            self.emissions_df = pd.read_csv(self.data_file)
-            
-            # Ensure required columns exist
-            required_columns = ["Category", "Emission (kg)", "User ID"]
-            for col in required_columns:
-                if col not in self.emissions_df.columns:
-                    self.emissions_df[col] = None  
-            
-            self.total_emissions = self.emissions_df["Emission (kg)"].sum()
-        else:
-            print("No existing data file found. Starting fresh.")
-            self.emissions_df = pd.DataFrame(columns=["Category", "Emission (kg)", "User ID"])
+    def _read_log(self, offset=0, count=True):
+        """Reads the complete entries of the log from a byte offset, cutting off a torn last line.
 
+        With count the entries read are tracked for compaction and later reads from where this one
+        stopped. Needs the file lock, since another process's append looks torn until it finishes.
+        """
+        if not os.path.exists(self.log_file):
+            if count:
+                self._log_entries = 0
+                self._log_offset = 0
+            return []
+        entries = []
+        valid_size = offset
+        with open(self.log_file, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break
+                valid_size += len(line)
+        if valid_size < os.path.getsize(self.log_file):
+            # Drop the partial write so the next append starts on a fresh line
+            with open(self.log_file, "r+b") as f:
+                f.truncate(valid_size)
+        if count:
+            self._log_entries = _log_changes(entries) + (self._log_entries if offset else 0)
+            self._log_offset = valid_size
+        return entries
 
+    @staticmethod
+    def _unapplied_log_entries(entries, read_raw):
+        """Drops entries a finished compaction already wrote into the data file."""
+        markers = [i for i, entry in enumerate(entries) if entry["op"] == "compact"]
+        if not markers:
+            return entries
+        raw = read_raw()
+        if raw is not None and hashlib.sha256(raw).hexdigest() == entries[markers[-1]]["sha256"]:
+            return entries[markers[-1] + 1:]
+        return [entry for entry in entries if entry["op"] != "compact"]
+
+    def _replay_log(self, entries):
+        """Applies logged operations on top of the loaded data file."""
+        for entry in entries:
+            if entry["op"] == "add":
+                self._replay_add(entry)
+            elif entry["op"] == "batch":
+                for record in entry["records"]:
+                    self._replay_add(record)
+                self._remember_batch(entry["id"])
+            elif entry["op"] == "remove":
+                self._remove_rows(entry["User ID"])
+            elif entry["op"] == "remove_users":
+                for user_id in entry["User IDs"]:
+                    self._remove_rows(user_id)
+            elif entry["op"] == "remove_records":
+                self._remove_range(entry["start"], entry["stop"])
+
+    def _replay_add(self, entry):
+        if not is_emission(entry["Emission (kg)"]):
+            return  # Logged before NaN was refused
+        timestamp = entry.get("Timestamp")
+        self._add_row(entry["Category"], entry["Emission (kg)"], entry["User ID"],
+                      pd.Timestamp(timestamp) if timestamp else None)
+
+    @metrics.timed("analytics_call_seconds", operation="display_emission_data")
     def display_emission_data(self, user_id=None):
         """Displays emissions data filtered by User ID if specified."""
+        self._ensure_loaded()
+        with self._lock.write():  # The numbers shown must be those of the numbering remembered
+            records = self._records(user_id) if user_id else self._frame()
+            self._shown_numbering = self._numbering
         if user_id:
-            user_data = self.emissions_df[self.emissions_df["User ID"] == user_id]
+            user_data = records
             if not user_data.empty:
                 print("Emissions Data for User ID:", user_id)
                 print(user_data)
             else:
                 print("No data available for this User ID.")
         else:
-            if not self.emissions_df.empty:
+            emissions_df = records
+            if not emissions_df.empty:
                 print("Emissions Data for All Users:")
-                print(self.emissions_df)
+                print(emissions_df)
             else:
                 print("No emission data available.")
 
-    def visualize_emissions(self, user_id=None):
-            sns.set(style="whitegrid")
+    def _records(self, user_id=None):
+        """All records, or one user's, consistent with the index at one moment."""
+        self._ensure_loaded()
+        with self._lock.read():
+            if self._settled():
+                return self._df.loc[self.index.rows(_user_key(user_id))] if user_id else self._df
+        with self._lock.write():  # Materializing pending rows changes the frame
+            df = self._frame()
+            return df.loc[self.index.rows(_user_key(user_id))] if user_id else df
+
+    def _user_version(self, user_id):
+        return max(self._user_versions.get(user_id, 0), self._reload_version)
+
+    def _cached_chart(self, key, render):
+        """Returns the chart cached under key, rendering and caching it first if needed."""
+        with self._charts_lock:
+            chart = self._charts.get(key)
+            if chart is not None:
+                self._charts.move_to_end(key)
+        if chart is not None:
+            metrics.inc("chart_cache_total", result="hit")
+            return chart
+        metrics.inc("chart_cache_total", result="miss")
+        chart = render()
+        with self._charts_lock:
+            self._charts[key] = chart
+            while len(self._charts) > self.max_cached_charts:
+                self._charts.popitem(last=False)
+        return chart
+
+    def render_emissions(self, user_id=None, fmt="png"):
+        """Returns the category chart of one user, or all users, as PNG or SVG bytes.
+
+        Returns None when there is nothing to plot. Charts are cached until the user's data changes.
+        """
+        self._ensure_loaded()
+        user_id = _user_key(user_id)
+        with self._lock.read():
             if user_id:
-                data_to_visualize = self.emissions_df[self.emissions_df["User ID"] == user_id]
+                category_totals = self.index.category_breakdown(user_id)
                 title = f"Emissions by Category (User ID: {user_id})"
+                version = self._user_version(user_id)
             else:
-                data_to_visualize = self.emissions_df
+                category_totals = self.index.category_breakdown()
                 title = "Emissions by Category (All Users)"
-            
-            if not data_to_visualize.empty:
-                emissions_sum = data_to_visualize.groupby("Category").sum().sort_values(by="Emission (kg)", ascending=False)
-                ax = emissions_sum.plot(kind="bar", y="Emission (kg)", legend=False, color=sns.color_palette("Set2", len(emissions_sum)))
-                ax.bar_label(ax.containers[0], labels=[f'{v:.2f}' for v in emissions_sum["Emission (kg)"]], label_type="edge", fontsize=10)
-                plt.title(title, fontsize=16)
-                plt.xlabel("Emission (kg)", fontsize=12)
-                plt.ylabel("Category", fontsize=12)
-                plt.tight_layout()
-                plt.show()
-            else:
+                version = self._data_version
+            key = ("categories", user_id or None, version, fmt)
+        if not category_totals:
+            return None
+        return self._cached_chart(key, lambda: render_chart(
+            lambda ax: draw_category_totals(ax, category_totals, title), fmt))
+
+    def render_users_comparison(self, user_ids, fmt="png"):
+        """Returns the comparison chart of the given users as PNG or SVG bytes, or None without data."""
+        self._ensure_loaded()
+        user_ids = sorted(set(map(_user_key, user_ids)))
+        with self._lock.read():
+            user_category_totals = {user_id: self.index.category_breakdown(user_id) for user_id in user_ids}
+            key = ("comparison", tuple(user_ids), tuple(map(self._user_version, user_ids)), fmt)
+        if not any(user_category_totals.values()):
+            return None
+        return self._cached_chart(key, lambda: render_chart(
+            lambda ax: draw_users_comparison(ax, user_category_totals), fmt, figsize=(10, 6)))
+
+    def visualize_emissions(self, user_id=None, output=None, fmt=None):
+        """Shows the category chart, or with output or fmt renders it off screen.
+
+        output may be a file path or a binary file object; the rendered bytes are also returned.
+        """
+        self._ensure_loaded()
+        if output is not None or fmt is not None:
+            chart = self.render_emissions(user_id, chart_format(output, fmt))
+            if chart is None:
                 print("No data available to visualize.")
+            elif output is not None:
+                write_chart(chart, output)
+            return chart
+
+        category_totals = self.get_category_totals(user_id)
+        if user_id:
+            title = f"Emissions by Category (User ID: {user_id})"
+        else:
+            title = "Emissions by Category (All Users)"
+
+        if category_totals:
+            plot_category_totals(category_totals, title)
+        else:
+            print("No data available to visualize.")
+
+    def compare_users_emissions(self, user_ids=None, output=None, fmt=None):
+        """Compares users' emissions by category, asking for the users unless user_ids is given.
 
-    def compare_users_emissions(self):
-        user_ids = []
-
-        while True:
-            user_id_input = input("Enter a user ID: ")
-            
-            if user_id_input not in self.emissions_df["User ID"].values:
-                print(f"User ID '{user_id_input}' does not exist in the data. Please enter a valid User ID.")
-                continue
-            
-            user_ids.append(user_id_input)
-            
-            more_users = input("Would you like to add another user? (y/n): ").lower()
-            if more_users != 'y':
-                break
+        With output or fmt the chart is rendered off screen like in visualize_emissions.
+        """
+        self._ensure_loaded()
+        if user_ids is None:
+            user_ids = prompt_user_ids(self.has_user)
         
-        if user_ids:
-            data_to_visualize = self.emissions_df[self.emissions_df["User ID"].isin(user_ids)]
-            
-            if not data_to_visualize.empty:
-                emissions_sum = data_to_visualize.groupby(["User ID", "Category"]).sum().unstack(fill_value=0)
-                emissions_sum = emissions_sum["Emission (kg)"]
-
-                sns.set(style="whitegrid")
-                ax = emissions_sum.plot(kind="bar", stacked=False, figsize=(10, 6), colormap="Set2")
-
-                ax.set_title(f"Emissions Comparison for Selected Users", fontsize=16)
-                ax.set_xlabel("Category", fontsize=12)
-                ax.set_ylabel("Emission (kg)", fontsize=12)
-
-                plt.tight_layout()
-                plt.show()
-            else:
+        if not user_ids:
+            print("No user IDs were selected.")
+            return None
+
+        if output is not None or fmt is not None:
+            chart = self.render_users_comparison(user_ids, chart_format(output, fmt))
+            if chart is None:
                 print("No data available to visualize for the selected users.")
+            elif output is not None:
+                write_chart(chart, output)
+            return chart
+
+        user_category_totals = {user_id: self.get_category_totals(user_id) for user_id in user_ids}
+        if any(user_category_totals.values()):
+            plot_users_comparison(user_category_totals)
         else:
-            print("No user IDs were selected.")
+            print("No data available to visualize for the selected users.")
 
 
     def remove_emission(self, user_id=None):
-        """Removes all emission data, or only for a specific User ID."""
-        if user_id:
-            self.emissions_df = self.emissions_df[self.emissions_df["User ID"] != user_id]
-        else:
-            self.emissions_df = pd.DataFrame(columns=["Category", "Emission (kg)", "User ID"])
-        self.save_data()
+        """Removes all emission data, or only for a specific User ID.
 
-    def sorting_emission_data(self, ascending=True, user_id=None):
-        """Sorts emission data using quicksort, filtered by User ID if specified."""
+        A user's records are marked deleted and leave every query at once; they are dropped
+        from the frame on its next read and from the data file when it is next saved or compacted.
+        """
+        with self._changing(logged=True) as entries:
+            self._remove_rows(user_id)
+            entries.append({"op": "remove", "User ID": _user_key(user_id) if user_id else None})
 
-        def quicksort(arr):
-            """Helper function to perform quicksort on a list of tuples."""
-            if len(arr) <= 1:
-                return arr
-            pivot = arr[0]
-            less = [x for x in arr[1:] if x[1] <= pivot[1]]
-            greater = [x for x in arr[1:] if x[1] > pivot[1]]
-            return quicksort(less) + [pivot] + quicksort(greater)
+    def remove_emissions(self, user_ids):
+        """Removes the records of every listed user with one log entry or save.
 
-        if user_id:
-            data_to_sort = self.emissions_df[self.emissions_df["User ID"] == user_id]
-        else:
-            data_to_sort = self.emissions_df
+        Returns the number of users that had records.
+        """
+        user_ids = list(dict.fromkeys(_user_key(user_id) for user_id in user_ids if user_id))
+        with self._changing(logged=True) as entries:
+            removed = [user_id for user_id in user_ids if self._remove_rows(user_id)]
+            if removed:
+                entries.append({"op": "remove_users", "User IDs": removed})
+        return len(removed)
 
-        if not data_to_sort.empty:
-            data_list = data_to_sort[["User ID", "Emission (kg)","Category"]].values.tolist()
+    @property
+    def record_numbering(self):
+        """Identifies the current numbering of the rows, for remove_records."""
+        return self._numbering
+
+    def remove_records(self, start, stop=None, numbering=None):
+        """Removes the records numbered start up to, but not including, stop (default start + 1).
+
+        The numbers are those last shown by display_emission_data, or those current when
+        record_numbering was `numbering`. Loads, saves and compactions number the rows anew,
+        and if that happened since, ValueError is raised rather than removing other records.
+        Returns the number of records removed.
+        """
+        stop = start + 1 if stop is None else stop
+        numbering = self._shown_numbering if numbering is None else numbering
+        with self._changing(logged=True) as entries:
+            if numbering is None:
+                raise ValueError("Show the records with display_emission_data before removing them by number.")
+            if numbering != self._numbering:
+                raise ValueError("The records were numbered anew since they were shown. Show them again "
+                                 "and check the numbers.")
+            removed = self._remove_range(start, stop)
+            if removed:
+                entries.append({"op": "remove_records", "start": start, "stop": stop})
+        return removed
+
+    @metrics.timed("analytics_call_seconds", operation="sorting_emission_data")
+    def sorting_emission_data(self, ascending=True, user_id=None, limit=None):
+        """Sorts emission data by emission, filtered by User ID if specified.
 
-            # Apply quicksort and optionally reverse if not ascending
-            sorted_list = quicksort(data_list)
-            if not ascending:
-                sorted_list = sorted_list[::-1]
+        With a limit only the smallest (or, when not ascending, largest) records
+        are selected, by partial selection rather than sorting every row.
+        """
+        data_to_sort = self._records(user_id)
+
+        if not data_to_sort.empty:
+            values = pd.to_numeric(data_to_sort["Emission (kg)"], errors="coerce").to_numpy(dtype=float)
+            order = sorted_positions(values, ascending, limit)
 
             # Create a sorted DataFrame for display
-            sorted_data = pd.DataFrame(sorted_list, columns=["User ID", "Emission (kg)","Category"])
+            sorted_data = data_to_sort[["User ID", "Emission (kg)","Category"]].iloc[order].reset_index(drop=True)
             print(sorted_data)
+            return sorted_data
 
         else:
             print("No data available to sort.")
 
+    @metrics.timed("analytics_call_seconds", operation="get_emissions_in_window")
+    def get_emissions_in_window(self, days=30, user_id=None, category=None, end=None):
+        """Returns emissions of the last `days` days up to and including the end date (default today).
+
+        Answered from the daily rollups, so the cost depends on the window length, not the history.
+        Records without a timestamp are not counted.
+        """
+        self._ensure_loaded()
+        start, stop = window_bounds(days, end)
+        with self._lock.read():
+            return self.rollups.window_total(start, stop, _user_key(user_id) if user_id else None, category)
+
+    @metrics.timed("analytics_call_seconds", operation="emission_trend")
+    def emission_trend(self, period="monthly", user_id=None, category=None):
+        """Returns emissions per day, week or month as a Series indexed by the period's first day."""
+        self._ensure_loaded()
+        with self._lock.read():
+            return self.rollups.trend(period, _user_key(user_id) if user_id else None, category)
+
+    def memory_usage(self):
+        """Reports the in-memory size of the emission records, including bytes per row."""
+        df = self.emissions_df
+        total_bytes = int(df.memory_usage(index=True, deep=True).sum())
+        return {
+            "rows": len(df),
+            "bytes": total_bytes,
+            "bytes_per_row": total_bytes / len(df) if len(df) else 0.0,
+        }
+
+    def has_data(self):
+        """Returns True if there is at least one emission record."""
+        return not self.emissions_df.empty
+
+    def has_user(self, user_id):
+        """Returns True if the user has at least one emission record."""
+        self._ensure_loaded()
+        return _user_key(user_id) in self.index  # Atomic, like get_total_emissions
+
+    def get_category_totals(self, user_id=None):
+        """Returns {category: total emission} for one user, or for all users."""
+        self._ensure_loaded()
+        with self._lock.read():
+            return self.index.category_breakdown(_user_key(user_id)) if user_id else self.index.category_breakdown()
+
+    @metrics.timed("analytics_call_seconds", operation="get_leaderboard")
+    def get_leaderboard(self, limit=None):
+        """Returns [(user_id, total emission)] from lowest to highest, or only the first `limit` users."""
+        self._ensure_loaded()
+        with self._lock.read():
+            ranking = self.index.ranking()
+        return ranking[:limit] if limit is not None else ranking
+
+    @metrics.timed("analytics_call_seconds", operation="leaderboard")
     def leaderboard(self):
         """Generates a sorted leaderboard by total emissions, from lowest to highest."""
-        user_emissions = self.emissions_df.groupby("User ID")["Emission (kg)"].sum().sort_values()
+        user_emissions = pd.Series(dict(self.get_leaderboard()), name="Emission (kg)", dtype=float).rename_axis("User ID")
         print("\033[1mLeaderboard by Total Emissions (Lowest to Highest):\033[0m")
         print(user_emissions)
- 
\ No newline at end of file
+ 
+
+
+def migrate_data_file(source, destination):
+    """One-shot copy of a data file, and its append log if any, into the destination's format."""
+    source_data = DataAnalysis(source, append_log=os.path.exists(f"{source}.log"))
+    atomic_write(destination, storage_for_path(destination).serialize(source_data.emissions_df))
+    return len(source_data.emissions_df)
@@ -0,0 +1,161 @@
+import uuid
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+
+FACTOR_COLUMNS = ["estimate_type", "key", "region", "unit", "kg_co2_per_unit"]
+ELECTRICITY_UNITS = {"mwh": 1.0, "kwh": 0.001}  # Multiplier to MWh
+
+
+def build_estimate_response(estimate_type, params, carbon_kg, estimate_id=None):
+    """Wraps a computed carbon_kg in the same response shape the Carbon Interface API returns."""
+    return {
+        "data": {
+            "id": estimate_id if estimate_id else str(uuid.uuid4()),
+            "type": "estimate",
+            "attributes": {
+                **{key: value for key, value in params.items() if key != "type"},
+                "estimated_at": datetime.now(timezone.utc).isoformat(),
+                "carbon_g": round(carbon_kg * 1000),
+                "carbon_lb": round(carbon_kg * 2.20462, 2),
+                "carbon_kg": round(carbon_kg, 2),
+                "carbon_mt": round(carbon_kg / 1000, 4),
+            },
+        }
+    }
+
+
+class FactorTable:
+    """Emission factors for in-process estimates.
+
+    Electricity factors are kg CO2 per MWh keyed by (country, state), where an empty state
+    is the national average. Fuel factors are kg CO2 per unit keyed by (fuel_source_type, unit).
+    """
+
+    def __init__(self, electricity=None, fuel_combustion=None):
+        self.electricity = dict(electricity or {})
+        self.fuel_combustion = dict(fuel_combustion or {})
+        self._reindex()
+
+    @classmethod
+    def from_csv(cls, path):
+        """Loads a table with columns estimate_type, key, region, unit, kg_co2_per_unit.
+
+        Electricity rows use key=country code, region=state (blank for national) and unit kwh or mwh.
+        Fuel combustion rows use key=fuel source type (see data.FUEL_SOURCES) and leave region blank.
+        """
+        df = pd.read_csv(path, dtype={"key": str, "region": str, "unit": str}, keep_default_na=False)
+        missing = [col for col in FACTOR_COLUMNS if col not in df.columns]
+        if missing:
+            raise ValueError(f"Emission factor file {path} is missing columns: {', '.join(missing)}")
+
+        electricity = {}
+        fuel_combustion = {}
+        for row in df.itertuples(index=False):
+            factor = float(row.kg_co2_per_unit)
+            if row.estimate_type == "electricity":
+                unit = row.unit.lower() if row.unit else "mwh"
+                if unit not in ELECTRICITY_UNITS:
+                    raise ValueError(f"Unknown electricity unit '{row.unit}' in {path}")
+                electricity[(row.key.upper(), row.region.upper())] = factor / ELECTRICITY_UNITS[unit]
+            elif row.estimate_type == "fuel_combustion":
+                fuel_combustion[(row.key, row.unit)] = factor
+            else:
+                raise ValueError(f"Unsupported estimate type '{row.estimate_type}' in {path}")
+        return cls(electricity, fuel_combustion)
+
+    def _reindex(self):
+        self._electricity_index = pd.MultiIndex.from_tuples(list(self.electricity), names=["country", "state"]) \
+            if self.electricity else None
+        self._electricity_values = np.array(list(self.electricity.values()), dtype=float)
+        self._fuel_index = pd.MultiIndex.from_tuples(list(self.fuel_combustion), names=["fuel", "unit"]) \
+            if self.fuel_combustion else None
+        self._fuel_values = np.array(list(self.fuel_combustion.values()), dtype=float)
+
+    def electricity_factors(self, countries, states):
+        """Vectorized lookup of kg/MWh; a state without its own factor falls back to the country's."""
+        countries = pd.Series(countries, dtype=str).str.upper().to_numpy()
+        states = pd.Series(states, dtype=str).fillna("").str.upper().to_numpy()
+        factors = self._lookup(self._electricity_index, self._electricity_values, countries, states)
+        missing = np.isnan(factors) & (states != "")
+        if missing.any():
+            factors[missing] = self._lookup(self._electricity_index, self._electricity_values,
+                                            countries[missing], np.full(missing.sum(), ""))
+        return factors
+
+    def fuel_factors(self, fuel_types, units):
+        """Vectorized lookup of kg per fuel unit."""
+        return self._lookup(self._fuel_index, self._fuel_values,
+                            pd.Series(fuel_types, dtype=str).to_numpy(), pd.Series(units, dtype=str).to_numpy())
+
+    @staticmethod
+    def _lookup(index, values, first, second):
+        result = np.full(len(first), np.nan)
+        if index is None or len(first) == 0:
+            return result
+        positions = index.get_indexer(pd.MultiIndex.from_arrays([first, second]))
+        found = positions >= 0
+        result[found] = values[positions[found]]
+        return result
+
+
+class LocalEstimateEngine:
+    """Computes electricity and fuel combustion estimates in-process as value x factor.
+
+    Pass estimate_types to choose which types are computed locally. Requests without a
+    matching factor return None so the caller can fall back to the remote API.
+    """
+
+    SUPPORTED_TYPES = ("electricity", "fuel_combustion")
+
+    def __init__(self, factors, estimate_types=SUPPORTED_TYPES):
+        unsupported = set(estimate_types) - set(self.SUPPORTED_TYPES)
+        if unsupported:
+            raise ValueError(f"Local estimates are not available for: {', '.join(sorted(unsupported))}")
+        self.factors = factors
+        self.estimate_types = set(estimate_types)
+
+    def supports(self, estimate_type):
+        return estimate_type in self.estimate_types
+
+    def estimate_electricity_batch(self, electricity_values, countries, states=None, electricity_units="kwh"):
+        """Returns kg CO2 for arrays of electricity inputs, NaN where no factor is known."""
+        values = np.asarray(electricity_values, dtype=float)
+        states = [""] * len(values) if states is None else states
+        units = [electricity_units] * len(values) if isinstance(electricity_units, str) else electricity_units
+        to_mwh = pd.Series(units, dtype=str).str.lower().map(ELECTRICITY_UNITS).to_numpy(dtype=float)
+        return values * to_mwh * self.factors.electricity_factors(countries, states)
+
+    def estimate_fuel_combustion_batch(self, fuel_source_types, fuel_source_units, fuel_source_values):
+        """Returns kg CO2 for arrays of fuel inputs, NaN where no factor is known."""
+        values = np.asarray(fuel_source_values, dtype=float)
+        return values * self.factors.fuel_factors(fuel_source_types, fuel_source_units)
+
+    def estimate(self, estimate_type, params):
+        """Returns an API-shaped response, or None if this request has to go to the API."""
+        return self.estimate_batch([(estimate_type, params)])[0]
+
+    def estimate_batch(self, estimates):
+        """Computes a list of (estimate_type, params) pairs, vectorized per type. Unhandled items are None."""
+        results = [None] * len(estimates)
+        for estimate_type in self.estimate_types:
+            positions = [i for i, (item_type, _) in enumerate(estimates) if item_type == estimate_type]
+            if not positions:
+                continue
+            params = [estimates[i][1] for i in positions]
+            try:
+                if estimate_type == "electricity":
+                    carbon = self.estimate_electricity_batch(
+                        [p["electricity_value"] for p in params], [p["country"] for p in params],
+                        [p.get("state") or "" for p in params], [p.get("electricity_unit", "kwh") for p in params])
+                else:
+                    carbon = self.estimate_fuel_combustion_batch(
+                        [p["fuel_source_type"] for p in params], [p["fuel_source_unit"] for p in params],
+                        [p["fuel_source_value"] for p in params])
+            except (KeyError, TypeError, ValueError):
+                continue  # Malformed params are left for the API to reject
+            for i, carbon_kg in zip(positions, carbon):
+                if not np.isnan(carbon_kg):
+                    results[i] = build_estimate_response(estimate_type, estimates[i][1], float(carbon_kg))
+        return results
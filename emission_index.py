@@ -0,0 +1,123 @@
+import bisect
+from parallel_aggregation import DEFAULT_PARALLEL_THRESHOLD, aggregate_emissions
+
+
+class EmissionIndex:
+    """Running emission totals per user and per (user, category), plus the row labels of each user."""
+
+    def __init__(self, workers=None, parallel_threshold=DEFAULT_PARALLEL_THRESHOLD):
+        # Rebuilds of frames with at least parallel_threshold rows aggregate on a process pool
+        self.workers = workers
+        self.parallel_threshold = parallel_threshold
+        self.clear()
+
+    def clear(self):
+        self.user_totals = {}
+        self.category_totals = {}
+        self.user_categories = {}
+        self.user_rows = {}
+        # Kept sorted as (total, str(user), user) so the leaderboard never needs a full re-sort
+        self._ranking = []
+
+    def add(self, label, category, carbon_kg, user_id):
+        """Records one emission row under its frame label."""
+        old_total = self.user_totals.get(user_id)
+        if old_total is not None:
+            self._ranking.pop(bisect.bisect_left(self._ranking, (old_total, str(user_id), user_id)))
+        else:
+            self.user_rows[user_id] = []
+            self.user_categories[user_id] = set()
+            old_total = 0.0
+
+        new_total = old_total + carbon_kg
+        self.user_totals[user_id] = new_total
+        bisect.insort(self._ranking, (new_total, str(user_id), user_id))
+
+        key = (user_id, category)
+        self.category_totals[key] = self.category_totals.get(key, 0.0) + carbon_kg
+        self.user_categories[user_id].add(category)
+        self.user_rows[user_id].append(label)
+
+    def remove_user(self, user_id):
+        """Forgets a user and returns the frame labels of their rows."""
+        if user_id not in self.user_totals:
+            return []
+        total = self.user_totals.pop(user_id)
+        self._ranking.pop(bisect.bisect_left(self._ranking, (total, str(user_id), user_id)))
+        for category in self.user_categories.pop(user_id):
+            del self.category_totals[(user_id, category)]
+        return self.user_rows.pop(user_id)
+
+    def remove_rows(self, rows):
+        """Takes (label, category, carbon_kg, user_id) rows out of the totals, e.g. a deleted record range."""
+        by_user = {}
+        for label, category, carbon_kg, user_id in rows:
+            by_user.setdefault(user_id, []).append((label, category, carbon_kg))
+        for user_id, removed in by_user.items():
+            if user_id not in self.user_totals:
+                continue
+            labels = {label for label, _, _ in removed}
+            remaining = [label for label in self.user_rows[user_id] if label not in labels]
+            if not remaining:
+                self.remove_user(user_id)
+                continue
+            self.user_rows[user_id] = remaining
+
+            total = self.user_totals[user_id]
+            self._ranking.pop(bisect.bisect_left(self._ranking, (total, str(user_id), user_id)))
+            for _, category, carbon_kg in removed:
+                total -= carbon_kg
+                key = (user_id, category)
+                if key in self.category_totals:
+                    self.category_totals[key] -= carbon_kg
+                    if abs(self.category_totals[key]) < 1e-9:
+                        del self.category_totals[key]
+                        self.user_categories[user_id].discard(category)
+            self.user_totals[user_id] = total
+            bisect.insort(self._ranking, (total, str(user_id), user_id))
+
+    def relabel(self, index):
+        """Replaces every row label with its position in the given frame index."""
+        self.user_rows = {user_id: index.get_indexer(labels).tolist() for user_id, labels in self.user_rows.items()}
+
+    def rebuild(self, df):
+        """Rebuilds the index from a frame in a single grouped pass."""
+        self.clear()
+        if df.empty:
+            return
+        valid = df[df["User ID"].notna()]
+        for user_id, labels in valid.groupby("User ID", sort=False, observed=True).groups.items():
+            self.user_rows[user_id] = list(labels)
+            self.user_categories[user_id] = set()
+        pair_totals = aggregate_emissions(valid, ["User ID", "Category"], self.workers, self.parallel_threshold)
+        # Rows without a category still count towards the user's total
+        for user_id, total in pair_totals.groupby(level=0, observed=True).sum().items():
+            self.user_totals[user_id] = float(total)
+        for (user_id, category), total in pair_totals.items():
+            if category == category:  # Skips NaN categories
+                self.category_totals[(user_id, category)] = float(total)
+                self.user_categories[user_id].add(category)
+        self._ranking = sorted((total, str(user_id), user_id) for user_id, total in self.user_totals.items())
+
+    def __contains__(self, user_id):
+        return user_id in self.user_totals
+
+    def total(self, user_id):
+        return self.user_totals.get(user_id, 0.0)
+
+    def rows(self, user_id):
+        return self.user_rows.get(user_id, [])
+
+    def category_breakdown(self, user_id=None):
+        """Returns {category: total} for one user, or summed over all users."""
+        if user_id is not None:
+            return {category: self.category_totals[(user_id, category)]
+                    for category in self.user_categories.get(user_id, ())}
+        breakdown = {}
+        for (_, category), total in self.category_totals.items():
+            breakdown[category] = breakdown.get(category, 0.0) + total
+        return breakdown
+
+    def ranking(self):
+        """Returns [(user_id, total)] from lowest to highest total."""
+        return [(user_id, total) for total, _, user_id in self._ranking]
@@ -0,0 +1,182 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def _canonical(value):
+    """Normalizes params so equivalent requests serialize identically (e.g. 100 and 100.0)."""
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def canonical_key(estimate_type, params):
+    """Returns a stable hash of an estimate request, independent of key order."""
+    payload = json.dumps({"type": estimate_type, "params": _canonical(params)},
+                         sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EstimateCache:
+    """Response cache for estimate requests, keyed on canonical_key(estimate_type, params).
+
+    Entries live in an in-memory LRU of max_entries and, when cache_dir is given, in one
+    JSON file per key on disk, bounded by max_disk_entries. Entries older than ttl seconds
+    are treated as missing; ttl=None keeps them until evicted.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None, cache_dir=None, max_disk_entries=100000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()  # key -> (expires_at, response)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        # Files on disk; counted on the first write rather than here, so opening a large cache stays fast
+        self._disk_entries = None if cache_dir else 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, estimate_type, params):
+        """Returns a copy of the cached response, or None on a miss."""
+        key = canonical_key(estimate_type, params)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > now):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return copy.deepcopy(entry[1])
+            if entry is not None:
+                del self._memory[key]
+
+        entry = self._read_disk(key, now)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, entry)
+        return copy.deepcopy(entry[1])
+
+    def put(self, estimate_type, params, response):
+        """Stores a successful response in both tiers."""
+        key = canonical_key(estimate_type, params)
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        entry = (expires_at, copy.deepcopy(response))
+        with self._lock:
+            self._remember(key, entry)
+        if self.cache_dir:
+            self._write_disk(key, entry)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self.cache_dir:
+                for path in self._disk_files():
+                    os.remove(path)
+                self._disk_entries = 0
+
+    def stats(self):
+        self._disk_count()
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_entries,
+            }
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _disk_count(self):
+        if self._disk_entries is None:
+            count = len(self._disk_files())
+            with self._lock:
+                if self._disk_entries is None:
+                    self._disk_entries = count
+        return self._disk_entries
+
+    def _disk_files(self):
+        paths = []
+        for directory, _, files in os.walk(self.cache_dir):
+            paths.extend(os.path.join(directory, name) for name in files if name.endswith(".json"))
+        return paths
+
+    def _read_disk(self, key, now):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if stored["expires_at"] is not None and stored["expires_at"] <= now:
+            try:
+                os.remove(path)
+                with self._lock:
+                    if self._disk_entries is not None:
+                        self._disk_entries -= 1
+            except OSError:
+                pass
+            return None
+        return stored["expires_at"], stored["response"]
+
+    def _write_disk(self, key, entry):
+        self._disk_count()  # Before the new file exists, so it is counted once
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        is_new = not os.path.exists(path)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"expires_at": entry[0], "response": entry[1]}, f)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if is_new:
+                self._disk_entries += 1
+            over_limit = self._disk_entries > self.max_disk_entries
+        if over_limit:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Removes the least recently written files, down to 90% of max_disk_entries."""
+        paths = self._disk_files()
+        keep = int(self.max_disk_entries * 0.9)
+        if len(paths) > keep:
+            paths.sort(key=lambda path: os.path.getmtime(path))
+            for path in paths[:len(paths) - keep]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                with self._lock:
+                    self.evictions += 1
+        with self._lock:
+            self._disk_entries = min(len(paths), keep)
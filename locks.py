@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows has no advisory locks; only the in-process locking applies there
+    fcntl = None
+
+
+class RWLock:
+    """Lets many threads read at once, or one thread write.
+
+    Waiting writers go first, so a steady stream of readers cannot starve them. Both kinds
+    of lock are reentrant, and the writing thread may also read. A thread holding only the
+    read lock cannot take the write lock; trying raises RuntimeError instead of deadlocking.
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._condition = threading.Condition(self._mutex)  # Only waited on when contended
+        self._readers = 0  # Threads holding the read lock
+        self._writer = None  # Ident of the thread holding the write lock
+        self._write_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()  # Read depth of each thread, and whether it counts in _readers
+        self._read_hold = _Hold(self.acquire_read, self.release_read)
+        self._write_hold = _Hold(self.acquire_write, self.release_write)
+
+    def acquire_read(self):
+        local = self._local
+        depth = getattr(local, "depth", 0)
+        if depth:
+            local.depth = depth + 1
+            return
+        if self._writer == threading.get_ident():
+            local.depth, local.counted = 1, False
+            return
+        with self._mutex:
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        local.depth, local.counted = 1, True
+
+    def release_read(self):
+        local = self._local
+        local.depth -= 1
+        if not local.depth and local.counted:
+            with self._mutex:
+                self._readers -= 1
+                if not self._readers and self._waiting_writers:
+                    self._condition.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            self._write_depth += 1
+            return
+        if getattr(self._local, "depth", 0):
+            raise RuntimeError("Cannot take the write lock while holding the read lock.")
+        with self._mutex:
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._write_depth = 1
+
+    def release_write(self):
+        with self._mutex:
+            self._write_depth -= 1
+            if not self._write_depth:
+                self._writer = None
+                self._condition.notify_all()
+
+    def read(self):
+        """Context manager holding the read lock."""
+        return self._read_hold
+
+    def write(self):
+        """Context manager holding the write lock."""
+        return self._write_hold
+
+
+class _Hold:
+    """Reusable context manager for one side of an RWLock; cheaper than a generator-based one."""
+
+    def __init__(self, acquire, release):
+        self._acquire = acquire
+        self._release = release
+
+    def __enter__(self):
+        self._acquire()
+
+    def __exit__(self, exc_type, exc, tb):
+        self._release()
+
+
+class FileLock:
+    """Exclusive advisory lock on a file, held across processes with flock.
+
+    Use it with `with`. It is reentrant and, since flock does not exclude threads of the
+    same process, also serializes the threads of this one. Processes that do not take the
+    lock are not stopped from writing.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if not self._depth and fcntl is not None:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory and not os.path.exists(directory):
+                    os.makedirs(directory, exist_ok=True)
+                started = time.perf_counter()
+                self._file = open(self.path, "a+b")
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+                metrics.observe("file_lock_wait_seconds", time.perf_counter() - started)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        if not self._depth and self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._lock.release()
+
+
+def file_signature(path):
+    """(inode, size, modification time) of a file, or None if it does not exist.
+
+    Changes whenever the file is written or replaced, without reading it.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
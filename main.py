@@ -1,11 +1,70 @@
+import time
+_STARTED = time.perf_counter()  # Before any other import, so --startup-time covers them
+
+import argparse
+import logging
+import metrics
 from user_interface import UserInterface
 
+_IMPORTED = time.perf_counter()
+
+API_KEY = 'LJ9r2nIqdYfeIIYelQWAWA'
+
+
+def serve(args):
+    from service import CarbonServiceServer, create_service
+
+    metrics.enable(log=args.metrics_log)  # Collected for the /metrics endpoint
+    service = create_service(API_KEY)
+    server = CarbonServiceServer(service, args.host, args.port)
+    print(f"Serving the Carbon Footprint Tracker at {server.url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        service.close()
+        if args.metrics:
+            with open(args.metrics, "w", encoding="utf-8") as f:
+                f.write(metrics.export_prometheus())
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Carbon Footprint Tracker")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="Collect timings and counters and write them to FILE in Prometheus text format on exit")
+    parser.add_argument("--metrics-log", action="store_true", help="Also log every measurement as a JSON line")
+    parser.add_argument("--startup-time", action="store_true",
+                        help="Print how long it takes to reach the first prompt, then exit")
+    parser.add_argument("--serve", action="store_true", help="Serve a local JSON API instead of the menus")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to serve on with --serve")
+    parser.add_argument("--port", type=int, default=8000, help="Port to serve on with --serve")
+    args = parser.parse_args()
+
+    if args.metrics or args.metrics_log:
+        metrics.enable(log=args.metrics_log)
+        if args.metrics_log:
+            logging.basicConfig(filename="metrics.log", level=logging.INFO, format="%(message)s")
+
+    if args.serve:
+        serve(args)
+        return
+
     # Pass the API key to the UserInterface
-    user_interface = UserInterface('LJ9r2nIqdYfeIIYelQWAWA')
-    user_interface.run()
+    user_interface = UserInterface(API_KEY)
+    if args.startup_time:
+        ready = time.perf_counter()
+        print(f"Startup: {(ready - _STARTED) * 1000:.1f} ms "
+              f"(imports {(_IMPORTED - _STARTED) * 1000:.1f} ms, setup {(ready - _IMPORTED) * 1000:.1f} ms)")
+        user_interface.data_analysis.close()
+        return
+    try:
+        user_interface.run()
+    finally:
+        if args.metrics:
+            with open(args.metrics, "w", encoding="utf-8") as f:
+                f.write(metrics.export_prometheus())
 
 if __name__ == "__main__":
     main()
-
-    
\ No newline at end of file
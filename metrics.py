@@ -0,0 +1,204 @@
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+
+# Upper bounds in seconds of the duration histogram buckets
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger("carbon_tracker.metrics")
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Registry:
+    """Counters, gauges and histograms keyed by metric name and sorted label pairs."""
+
+    def __init__(self):
+        self.enabled = os.environ.get("CARBON_METRICS", "").lower() in ("1", "true", "yes")
+        self.log = False
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.help = {}
+        self.lock = threading.Lock()
+
+
+_registry = _Registry()
+
+
+def enable(log=False):
+    """Starts collecting metrics; with log=True every observation is also logged as a JSON line."""
+    _registry.enabled = True
+    _registry.log = log
+
+
+def disable():
+    _registry.enabled = False
+    _registry.log = False
+
+
+def is_enabled():
+    return _registry.enabled
+
+
+def reset():
+    """Forgets everything collected so far."""
+    with _registry.lock:
+        _registry.counters.clear()
+        _registry.gauges.clear()
+        _registry.histograms.clear()
+
+
+def _log(kind, name, value, labels):
+    logger.info(json.dumps({"metric": name, "type": kind, "value": value, "labels": labels, "time": time.time()},
+                           default=str))
+
+
+def _key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    """Adds to a counter. Does nothing while metrics are disabled."""
+    if not _registry.enabled:
+        return
+    key = _key(name, labels)
+    with _registry.lock:
+        _registry.counters[key] = _registry.counters.get(key, 0) + amount
+    if _registry.log:
+        _log("counter", name, amount, labels)
+
+
+def set_gauge(name, value, **labels):
+    """Sets a gauge to its current value. Does nothing while metrics are disabled."""
+    if not _registry.enabled:
+        return
+    with _registry.lock:
+        _registry.gauges[_key(name, labels)] = value
+    if _registry.log:
+        _log("gauge", name, value, labels)
+
+
+def observe(name, value, buckets=DURATION_BUCKETS, **labels):
+    """Records a value in a histogram. Does nothing while metrics are disabled."""
+    if not _registry.enabled:
+        return
+    key = _key(name, labels)
+    with _registry.lock:
+        histogram = _registry.histograms.get(key)
+        if histogram is None:
+            histogram = _registry.histograms[key] = _Histogram(buckets)
+        histogram.observe(value)
+    if _registry.log:
+        _log("histogram", name, value, labels)
+
+
+def timed(name, **labels):
+    """Decorator recording each call's duration in the histogram `name`.
+
+    While metrics are disabled the wrapper only checks a flag before calling through.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _registry.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start, **labels)
+        return wrapper
+    return decorator
+
+
+def describe(name, text):
+    """Sets the HELP text shown for a metric in the Prometheus export."""
+    _registry.help[name] = text
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+def export_prometheus():
+    """Returns everything collected so far in the Prometheus text exposition format."""
+    with _registry.lock:
+        counters = sorted(_registry.counters.items())
+        gauges = sorted(_registry.gauges.items())
+        histograms = sorted(((key, (h.buckets, list(h.counts), h.sum, h.count))
+                             for key, h in _registry.histograms.items()), key=lambda item: item[0])
+
+    lines = []
+    described = set()
+
+    def header(name, kind):
+        if name not in described:
+            described.add(name)
+            if name in _registry.help:
+                lines.append(f"# HELP {name} {_registry.help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in counters:
+        header(name, "counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), value in gauges:
+        header(name, "gauge")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), (buckets, counts, total, count) in histograms:
+        header(name, "histogram")
+        cumulative = 0
+        for bound, bucket_count in zip([*buckets, "+Inf"], counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def snapshot():
+    """Returns everything collected so far as plain dicts, e.g. for JSON output."""
+    with _registry.lock:
+        return {
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, labels), value in sorted(_registry.counters.items())],
+            "gauges": [{"name": name, "labels": dict(labels), "value": value}
+                       for (name, labels), value in sorted(_registry.gauges.items())],
+            "histograms": [{"name": name, "labels": dict(labels), "count": h.count, "sum": h.sum,
+                            "mean": h.sum / h.count if h.count else 0.0}
+                           for (name, labels), h in sorted(_registry.histograms.items(), key=lambda item: item[0])],
+        }
+
+
+describe("carbon_api_request_seconds", "Duration of each Carbon Interface API request attempt.")
+describe("carbon_api_responses_total", "Carbon Interface API responses by status code, or error for network failures.")
+describe("carbon_api_response_bytes_total", "Bytes received in Carbon Interface API response bodies.")
+describe("data_load_seconds", "Duration of DataAnalysis.load_data.")
+describe("data_save_seconds", "Duration of DataAnalysis.save_data.")
+describe("data_rows", "Emission records held after the last load or save.")
+describe("data_file_bytes", "Size of the data file after the last load or save.")
+describe("analytics_call_seconds", "Duration of analytics queries by operation.")
+describe("chart_cache_total", "Chart renders answered from the cache (hit) or drawn again (miss).")
+describe("service_requests_total", "HTTP requests handled by the JSON service, by method and first path segment.")
+describe("data_reloads_total", "Times DataAnalysis took in records written by another process, from the log or by a full reload.")
+describe("file_lock_wait_seconds", "Time spent waiting for the data file's cross-process lock.")
@@ -0,0 +1,214 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from emission_factors import build_estimate_response
+
+
+# Placeholder kg CO2 per unit of the main input of each estimate type. These are
+# stand-in numbers for exercising the clients, not real emission factors.
+STAND_IN_FACTORS = {
+    "electricity": ("electricity_value", 0.4),
+    "shipping": ("distance_value", 0.1),
+    "fuel_combustion": ("fuel_source_value", 10.0),
+    "vehicle": ("distance_value", 0.2),
+}
+
+VEHICLE_MAKES = {
+    "mk-toyota": ("Toyota", [("Corolla", 2015), ("Prius", 2018)]),
+    "mk-volkswagen": ("Volkswagen", [("Golf", 2016), ("Passat", 2012)]),
+}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # Accept bursts of concurrent client connections
+
+
+class MockCarbonInterfaceServer:
+    """Local stand-in for the Carbon Interface API, served on 127.0.0.1 from a background thread.
+
+    Point a client at it with api_root=server.api_root. latency delays every response,
+    which is useful for exercising concurrency, timeouts and cancellation.
+
+    Failures can be injected to exercise retries: failure_rate answers that fraction of
+    requests with failure_status, rate_limit answers requests beyond that many per second
+    with 429 and a Retry-After, and fail_next() scripts the next responses exactly.
+    """
+
+    def __init__(self, port=0, latency=0.0, failure_rate=0.0, failure_status=503, rate_limit=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.rate_limit = rate_limit
+        self.estimates = {}
+        self.request_count = 0
+        self.failure_count = 0
+        self._scripted_failures = []
+        self._window = (0, 0)  # (second, requests in it) for rate_limit
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", port), self._handler_class())
+        self._thread = None
+
+    @property
+    def api_root(self):
+        return f"http://127.0.0.1:{self._server.server_port}/api/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def fail_next(self, count=1, status=503, retry_after=None):
+        """Answers the next `count` requests with `status`, optionally with a Retry-After header."""
+        with self._lock:
+            self._scripted_failures.extend([(status, retry_after)] * count)
+
+    def _failure_for_request(self):
+        """Returns (status, retry_after) if this request should fail, else None."""
+        with self._lock:
+            if self._scripted_failures:
+                failure = self._scripted_failures.pop(0)
+            elif self.rate_limit is not None:
+                second = int(time.time())
+                start, count = self._window if self._window[0] == second else (second, 0)
+                self._window = (start, count + 1)
+                failure = (429, 1) if count >= self.rate_limit else None
+            else:
+                failure = None
+            if failure is None and self.failure_rate and random.random() < self.failure_rate:
+                failure = (self.failure_status, None)
+            if failure is not None:
+                self.failure_count += 1
+            return failure
+
+    def create_estimate(self, body):
+        estimate_type = body.get("type")
+        if estimate_type == "flight":
+            carbon_kg = 90.0 * len(body.get("legs", [])) * float(body.get("passengers", 1))
+        elif estimate_type in STAND_IN_FACTORS:
+            field, factor = STAND_IN_FACTORS[estimate_type]
+            carbon_kg = float(body.get(field, 0)) * factor
+        else:
+            return None
+        estimate = build_estimate_response(estimate_type, body, carbon_kg)
+        with self._lock:
+            self.estimates[estimate["data"]["id"]] = estimate
+        return estimate
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, payload, retry_after=None):
+                body = json.dumps(payload).encode("utf-8") if not isinstance(payload, bytes) else payload
+                self.send_response(status)
+                if retry_after is not None:
+                    self.send_header("Retry-After", str(retry_after))
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client gave up (timeout or cancellation)
+
+            def _begin(self):
+                with server._lock:
+                    server.request_count += 1
+                if server.latency:
+                    time.sleep(server.latency)
+
+            def _injected_failure(self):
+                """Sends an injected failure if one is due; returns True if it did."""
+                failure = server._failure_for_request()
+                if failure is None:
+                    return False
+                status, retry_after = failure
+                self._send(status, {"message": f"Injected failure ({status})"}, retry_after)
+                return True
+
+            def do_POST(self):
+                self._begin()
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send(400, {"message": "Invalid JSON"})
+                    return
+                if self._injected_failure():
+                    return
+                if self.path.rstrip("/") != "/api/v1/estimates":
+                    self._send(404, {"message": "Not found"})
+                    return
+                estimate = server.create_estimate(body)
+                if estimate is None:
+                    self._send(422, {"message": f"Unknown estimate type: {body.get('type')}"})
+                else:
+                    self._send(201, estimate)
+
+            def do_GET(self):
+                self._begin()
+                if self._injected_failure():
+                    return
+                parts = self.path.strip("/").split("/")
+                if parts[:3] == ["api", "v1", "estimates"] and len(parts) == 4:
+                    estimate = server.estimates.get(parts[3])
+                    if estimate:
+                        self._send(200, estimate)
+                    else:
+                        self._send(404, {"message": "Estimate not found"})
+                elif parts[:3] == ["api", "v1", "vehicle_makes"] and len(parts) == 3:
+                    self._send(200, [
+                        {"data": {"id": make_id, "type": "vehicle_make",
+                                  "attributes": {"name": name, "number_of_models": len(models)}}}
+                        for make_id, (name, models) in VEHICLE_MAKES.items()
+                    ])
+                elif parts[:3] == ["api", "v1", "vehicle_makes"] and len(parts) == 5 and parts[4] == "vehicle_models":
+                    if parts[3] not in VEHICLE_MAKES:
+                        self._send(404, {"message": "Vehicle make not found"})
+                        return
+                    name, models = VEHICLE_MAKES[parts[3]]
+                    self._send(200, [
+                        {"data": {"id": f"{parts[3]}-{model.lower()}-{year}", "type": "vehicle_model",
+                                  "attributes": {"name": model, "year": year, "vehicle_make": name}}}
+                        for model, year in models
+                    ])
+                else:
+                    self._send(404, {"message": "Not found"})
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Carbon Interface API.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to delay every response")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--rate-limit", type=int, help="Requests per second before answering 429")
+    args = parser.parse_args()
+    with MockCarbonInterfaceServer(port=args.port, latency=args.latency, failure_rate=args.failure_rate,
+                                   rate_limit=args.rate_limit) as mock:
+        print(f"Serving stand-in Carbon Interface API at {mock.api_root}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,45 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_PARALLEL_THRESHOLD = 5_000_000  # Rows below which aggregation stays serial
+
+
+def _partial_sums(frame, by):
+    """Sums Emission (kg) per group of one partition. Runs in a worker process."""
+    return frame.groupby(by, observed=True, dropna=False)["Emission (kg)"].sum()
+
+
+def _user_partitions(df, workers):
+    """Assigns each row to a partition by a hash of its User ID, so a user never spans partitions."""
+    users = df["User ID"]
+    if isinstance(users.dtype, pd.CategoricalDtype):
+        keys = users.cat.codes.to_numpy().astype(np.int64)
+    else:
+        keys = pd.util.hash_pandas_object(users, index=False).to_numpy()
+    return keys % workers
+
+
+def aggregate_emissions(df, by, workers=None, threshold=DEFAULT_PARALLEL_THRESHOLD):
+    """Returns the sum of Emission (kg) grouped by the given columns.
+
+    Frames with at least threshold rows are partitioned by user hash across a process pool
+    of `workers` processes (default: one per CPU); the partial sums are merged afterwards.
+    The result matches the serial groupby.
+    """
+    workers = workers if workers else os.cpu_count() or 1
+    frame = df[list(dict.fromkeys([*by, "User ID", "Emission (kg)"]))]
+    if workers <= 1 or len(frame) < threshold:
+        return _partial_sums(frame, by)
+
+    partitions = _user_partitions(frame, workers)
+    parts = [frame[partitions == i] for i in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        partials = list(executor.map(_partial_sums, parts, [by] * workers))
+    merged = pd.concat(partials)
+    if "User ID" not in by:
+        # Groups that do not include the user can appear in several partitions
+        merged = merged.groupby(level=list(range(len(by))), dropna=False).sum()
+    return merged.sort_index()
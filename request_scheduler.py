@@ -0,0 +1,263 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the circuit breaker is open."""
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+    return max(0.0, retry_at - (now if now is not None else time.time()))
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average, with bursts of up to `capacity`.
+
+    reserve() takes a token and returns how long the caller must wait before using it, so
+    callers sleep outside the lock. pause() holds every caller back, e.g. for a Retry-After.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity else max(1.0, rate))
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def pause(self, seconds):
+        with self._lock:
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+
+class CircuitBreaker:
+    """Stops sending after failure_threshold consecutive failures, for reset_timeout seconds.
+
+    After the timeout one trial request is let through (half open); its success closes the
+    circuit again and its failure reopens it. A trial that ends without either, e.g. on an
+    unexpected exception, must be passed to abandon_trial() so the circuit does not stay
+    half open.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Returns (allowed, trial): whether a request may be sent, and whether it is the
+        half-open trial, decided together so no other caller's transition comes between."""
+        with self._lock:
+            if self.state == "open" and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                return True, True
+            return self.state == "closed", False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        """Counts a failure; returns True if it opened the circuit."""
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.state = "open"
+                self.opened_at = self.clock()
+                return True
+            return False
+
+    def abandon_trial(self):
+        """Reopens the circuit if the half-open trial ended with neither success nor failure."""
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+                self.opened_at = self.clock()
+                return True
+            return False
+
+
+class RequestScheduler:
+    """Rate limiting, retries and a circuit breaker around API requests.
+
+    Wrap a request in a zero-argument callable that sends it and returns the response
+    (a requests.Response or an aiohttp response with its body already read), then pass it
+    to run() or, from async code, run_async(). Responses with a retryable status and the
+    given retry_exceptions are retried up to max_retries times with exponential backoff
+    and full jitter, or after the server's Retry-After; a Retry-After longer than backoff_max
+    is not waited for. The final response is returned whatever its status; the final
+    exception is re-raised. While the circuit is open,
+    CircuitOpenError is raised without sending anything.
+
+    rate (requests per second) enables the token bucket; leave it None for no limit.
+    """
+
+    def __init__(self, rate=None, burst=None, max_retries=4, backoff_base=0.5, backoff_max=30.0,
+                 failure_threshold=5, reset_timeout=30.0, retry_statuses=RETRYABLE_STATUSES, clock=time.monotonic):
+        self.bucket = TokenBucket(rate, burst, clock) if rate else None
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, clock)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses)
+        self.clock = clock
+        self.counters = {"calls": 0, "requests": 0, "succeeded": 0, "failed": 0, "retries": 0, "throttled": 0,
+                         "rejected": 0, "circuit_opened": 0, "wait_seconds": 0.0}
+        self._started = None
+        self._lock = threading.Lock()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _start_call(self):
+        """Counts a call and checks the circuit; returns True if the call is the half-open trial."""
+        with self._lock:
+            self.counters["calls"] += 1
+            if self._started is None:
+                self._started = self.clock()
+        allowed, trial = self.breaker.allow()
+        if not allowed:
+            self._count("rejected")
+            raise CircuitOpenError("Carbon Interface API is failing; requests are paused by the circuit breaker.")
+        return trial
+
+    def _end_call(self, trial):
+        if trial and self.breaker.abandon_trial():
+            self._count("circuit_opened")
+
+    def _rate_wait(self):
+        wait = self.bucket.reserve() if self.bucket else 0.0
+        self._count("requests")
+        if wait > 0:
+            self._count("wait_seconds", wait)
+        return wait
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _failure(self):
+        if self.breaker.record_failure():
+            self._count("circuit_opened")
+
+    def _retry_delay(self, attempt, response=None, error=None):
+        """Records an attempt's outcome; returns the delay before retrying, or None to stop."""
+        status = None
+        if error is None:
+            status = getattr(response, "status_code", None) or getattr(response, "status", None)
+            if status not in self.retry_statuses:
+                # A 4xx other than 429 means the request itself is wrong, not that the API is down
+                self.breaker.record_success()
+                self._count("succeeded" if status is not None and status < 400 else "failed")
+                return None
+            if status == 429:
+                self._count("throttled")
+            else:
+                self._failure()
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        else:
+            self._failure()
+            retry_after = None
+
+        # A Retry-After longer than backoff_max would block the caller, e.g. the menu, for that long
+        too_long = retry_after is not None and retry_after > self.backoff_max
+        if attempt >= self.max_retries or self.breaker.state == "open" or too_long:
+            if status == 429:
+                self._failure()  # Still throttled; treat it like the API being down
+            self._count("failed")
+            return None
+        self._count("retries")
+        if retry_after is not None:
+            if self.bucket:
+                self.bucket.pause(retry_after)  # Every caller shares the quota the server is enforcing
+            return retry_after
+        return self._backoff(attempt)
+
+    def run(self, send, retry_exceptions=()):
+        """Sends a request through the scheduler from a thread."""
+        trial = self._start_call()
+        try:
+            attempt = 0
+            while True:
+                wait = self._rate_wait()
+                if wait > 0:
+                    time.sleep(wait)
+                try:
+                    response = send()
+                except retry_exceptions as e:
+                    delay = self._retry_delay(attempt, error=e)
+                    if delay is None:
+                        raise
+                else:
+                    delay = self._retry_delay(attempt, response=response)
+                    if delay is None:
+                        return response
+                time.sleep(delay)
+                attempt += 1
+        finally:
+            self._end_call(trial)
+
+    async def run_async(self, send, retry_exceptions=()):
+        """Sends a request through the scheduler from a coroutine; send is an async callable."""
+        trial = self._start_call()
+        try:
+            attempt = 0
+            while True:
+                wait = self._rate_wait()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                try:
+                    response = await send()
+                except retry_exceptions as e:
+                    delay = self._retry_delay(attempt, error=e)
+                    if delay is None:
+                        raise
+                else:
+                    delay = self._retry_delay(attempt, response=response)
+                    if delay is None:
+                        return response
+                await asyncio.sleep(delay)
+                attempt += 1
+        finally:
+            self._end_call(trial)
+
+    def stats(self):
+        """Counters so far, the circuit state and completed calls per second since the first call."""
+        with self._lock:
+            stats = dict(self.counters)
+            elapsed = self.clock() - self._started if self._started is not None else 0.0
+        stats["circuit"] = self.breaker.state
+        stats["throughput"] = stats["succeeded"] / elapsed if elapsed > 0 else 0.0
+        return stats
@@ -0,0 +1,136 @@
+from datetime import date, datetime, timedelta
+import pandas as pd
+
+
+PERIODS = ("daily", "weekly", "monthly")
+
+
+def bucket_start(day, period):
+    """Returns the first day of the daily, weekly (Monday-based) or monthly bucket holding a date."""
+    if period == "daily":
+        return day
+    if period == "weekly":
+        return day - timedelta(days=day.weekday())
+    if period == "monthly":
+        return day.replace(day=1)
+    raise ValueError(f"Unknown period '{period}'. Expected one of: {', '.join(PERIODS)}")
+
+
+def _bucket_starts(timestamps, period):
+    """Vectorized bucket_start over a datetime Series."""
+    days = timestamps.dt.normalize()
+    if period == "weekly":
+        days = days - pd.to_timedelta(days.dt.weekday, unit="D")
+    elif period == "monthly":
+        days = days - pd.to_timedelta(days.dt.day - 1, unit="D")
+    return days.dt.date
+
+
+class RollupStore:
+    """Emission totals per time bucket, user and category, for daily, weekly and monthly buckets.
+
+    Kept up to date one record at a time, so time-window totals and trends are read from
+    the buckets instead of scanning raw records. The user None holds the totals of all users.
+    Records without a timestamp are not rolled up.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        # period -> user_id (or None for everyone) -> bucket start date -> {category: total}
+        self.buckets = {period: {None: {}} for period in PERIODS}
+
+    def add(self, timestamp, category, carbon_kg, user_id):
+        if timestamp is None or pd.isna(timestamp):
+            return
+        day = pd.Timestamp(timestamp).date()
+        for period in PERIODS:
+            start = bucket_start(day, period)
+            for owner in (None, user_id):
+                categories = self.buckets[period].setdefault(owner, {}).setdefault(start, {})
+                categories[category] = categories.get(category, 0.0) + carbon_kg
+
+    def remove(self, timestamp, category, carbon_kg, user_id):
+        """Takes one record back out of its buckets."""
+        if timestamp is None or pd.isna(timestamp):
+            return
+        day = pd.Timestamp(timestamp).date()
+        for period in PERIODS:
+            start = bucket_start(day, period)
+            for owner in (None, user_id):
+                owner_buckets = self.buckets[period].get(owner, {})
+                categories = owner_buckets.get(start)
+                if not categories or category not in categories:
+                    continue
+                categories[category] -= carbon_kg
+                if abs(categories[category]) < 1e-9:
+                    del categories[category]
+                if not categories:
+                    del owner_buckets[start]
+
+    def remove_user(self, user_id):
+        """Drops a user's buckets and takes them out of the all-users totals."""
+        for period in PERIODS:
+            user_buckets = self.buckets[period].pop(user_id, {})
+            everyone = self.buckets[period][None]
+            for start, categories in user_buckets.items():
+                for category, total in categories.items():
+                    everyone[start][category] -= total
+                    if abs(everyone[start][category]) < 1e-9:
+                        del everyone[start][category]
+                if not everyone[start]:
+                    del everyone[start]
+
+    def rebuild(self, df):
+        """Rebuilds every rollup from a frame with Timestamp, Category, Emission (kg) and User ID."""
+        self.clear()
+        dated = df[df["Timestamp"].notna() & df["User ID"].notna()]
+        if dated.empty:
+            return
+        for period in PERIODS:
+            frame = pd.DataFrame({
+                "bucket": _bucket_starts(dated["Timestamp"], period),
+                "User ID": dated["User ID"].astype(object),
+                "Category": dated["Category"].astype(object),
+                "Emission (kg)": dated["Emission (kg)"],
+            })
+            totals = frame.groupby(["bucket", "User ID", "Category"], dropna=False)["Emission (kg)"].sum()
+            for (start, user_id, category), total in totals.items():
+                for owner in (None, user_id):
+                    categories = self.buckets[period].setdefault(owner, {}).setdefault(start, {})
+                    categories[category] = categories.get(category, 0.0) + float(total)
+
+    def window_total(self, start, end, user_id=None, category=None):
+        """Total emissions from the start date up to, but not including, the end date."""
+        daily = self.buckets["daily"].get(user_id, {})
+        total = 0.0
+        day = start
+        while day < end:
+            categories = daily.get(day)
+            if categories:
+                total += categories.get(category, 0.0) if category is not None else sum(categories.values())
+            day += timedelta(days=1)
+        return total
+
+    def trend(self, period="monthly", user_id=None, category=None):
+        """Returns emissions per bucket as a Series indexed by bucket start date, oldest first."""
+        if period not in PERIODS:
+            raise ValueError(f"Unknown period '{period}'. Expected one of: {', '.join(PERIODS)}")
+        user_buckets = self.buckets[period].get(user_id, {})
+        totals = {
+            start: categories.get(category, 0.0) if category is not None else sum(categories.values())
+            for start, categories in sorted(user_buckets.items())
+        }
+        return pd.Series(totals, dtype=float, name="Emission (kg)").rename_axis("Period Start")
+
+
+def window_bounds(days, end=None):
+    """Returns (start, end) dates of the last `days` days, including the end date's day."""
+    if end is None:
+        end = datetime.now().date()
+    elif isinstance(end, datetime):
+        end = end.date()
+    elif not isinstance(end, date):
+        end = pd.Timestamp(end).date()
+    return end - timedelta(days=days - 1), end + timedelta(days=1)
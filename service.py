@@ -0,0 +1,303 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+import metrics
+from bulk_import import estimate_carbon_kg, validate_activity
+
+
+MAX_BODY_BYTES = 10 * 1024 * 1024  # Largest estimate request accepted
+CHART_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+# First path segments counted separately in service_requests_total; anything else counts as "other"
+ROUTES = ("estimates", "users", "leaderboard", "compare", "compare.png", "compare.svg", "chart.png", "chart.svg",
+          "metrics", "health")
+
+
+class CarbonService:
+    """Estimates and analytics without any prompts, for scripts and the HTTP server.
+
+    One instance keeps a single DataAnalysis and API client warm, and can be shared by
+    the server's request threads.
+    """
+
+    def __init__(self, api, data_analysis):
+        self.api = api
+        self.data_analysis = data_analysis
+
+    def close(self):
+        """Saves waiting records and closes the API client's connections."""
+        self.data_analysis.close()
+        self.api.close()
+
+    def submit_estimates(self, activities):
+        """Estimates and stores activities given as dicts in the bulk import format.
+
+        Returns one result per activity, in order: {"user_id", "category", "carbon_kg",
+        "timestamp"} for stored estimates and {"error": ...} for rejected ones.
+        """
+        results = [None] * len(activities)
+        valid = []
+        for i, activity in enumerate(activities):
+            try:
+                if not isinstance(activity, dict):
+                    raise ValueError("Activity is not a JSON object.")
+                category, estimate_type, params, user_id, timestamp = validate_activity(activity)
+            except ValueError as e:
+                results[i] = {"error": str(e)}
+                continue
+            valid.append((i, category, estimate_type, params, user_id, timestamp))
+
+        responses = self.api.create_estimates_batch([(item[2], item[3]) for item in valid]) if valid else []
+        records = []
+        for (i, category, _, _, user_id, timestamp), response in zip(valid, responses):
+            carbon_kg = estimate_carbon_kg(response)
+            if carbon_kg is None:
+                results[i] = {"error": response.get("error", "No carbon_kg in the response.")}
+                continue
+            records.append((category, carbon_kg, user_id, timestamp))
+            results[i] = {"user_id": user_id, "category": category, "carbon_kg": carbon_kg,
+                          "timestamp": timestamp.isoformat()}
+        if records:
+            self.data_analysis.add_emissions(records)
+        return results
+
+    def user_summary(self, user_id):
+        """Returns a user's total, last 30 days and per-category emissions, or None for unknown users."""
+        if not self.data_analysis.has_user(user_id):
+            return None
+        return {
+            "user_id": user_id,
+            "total_kg": self.data_analysis.get_total_emissions(user_id),
+            "last_30_days_kg": self.data_analysis.get_emissions_in_window(30, user_id),
+            "categories": self.data_analysis.get_category_totals(user_id),
+        }
+
+    def user_trend(self, user_id, period="monthly"):
+        trend = self.data_analysis.emission_trend(period, user_id)
+        return [{"period_start": start.isoformat(), "kg": float(kg)} for start, kg in trend.items()]
+
+    def leaderboard(self, limit=None):
+        return [{"user_id": user_id, "total_kg": total} for user_id, total in self.data_analysis.get_leaderboard(limit)]
+
+    def delete_users(self, user_ids):
+        """Deletes every record of the given users; returns how many of them had records."""
+        return self.data_analysis.remove_emissions(user_ids)
+
+    def compare(self, user_ids):
+        """Returns {user_id: {category: total emission}} for the given users."""
+        return {user_id: self.data_analysis.get_category_totals(user_id) for user_id in sorted(set(user_ids))}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class CarbonServiceServer:
+    """Serves a CarbonService as JSON over HTTP on the standard library server.
+
+    Endpoints:
+        POST /estimates                      one activity object, or a list of them
+        POST /users/delete                   deletes the records of {"user_ids": [...]}
+        GET  /users/<id>                     totals for a user
+        DELETE /users/<id>                   deletes a user's records
+        GET  /users/<id>/trend?period=       daily, weekly or monthly totals
+        GET  /users/<id>/chart.png|.svg      a user's category chart
+        GET  /chart.png|.svg                 the category chart of all users
+        GET  /leaderboard?limit=             users from lowest to highest total
+        GET  /compare?users=a,b              per-category totals of several users
+        GET  /compare.png|.svg?users=a,b     their comparison chart
+        GET  /metrics                        Prometheus metrics
+        GET  /health
+    """
+
+    def __init__(self, service, host="127.0.0.1", port=8000):
+        self.service = service
+        self._server = _Server((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        """Serves from a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _handler_class(self):
+        service = self.service
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, payload, content_type="application/json"):
+                body = payload if isinstance(payload, bytes) else json.dumps(payload, default=str).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _send_chart(self, chart, fmt):
+                if chart is None:
+                    self._send(404, {"error": "No data available to visualize."})
+                else:
+                    self._send(200, chart, CHART_TYPES[fmt])
+
+            def _handle(self, route):
+                path = urlsplit(self.path)
+                parts = [unquote(part) for part in path.path.strip("/").split("/") if part]
+                query = {key: values[-1] for key, values in parse_qs(path.query).items()}
+                try:
+                    route(parts, query)
+                except ValueError as e:
+                    self._send(400, {"error": str(e)})
+                except Exception as e:
+                    print(f"Error handling {self.command} {self.path}: {e}")
+                    self._send(500, {"error": "Internal server error"})
+                finally:
+                    metrics.inc("service_requests_total", method=self.command,
+                                route=parts[0] if parts and parts[0] in ROUTES else "other")
+
+            def do_POST(self):
+                self._handle(self._post)
+
+            def do_GET(self):
+                self._handle(self._get)
+
+            def do_DELETE(self):
+                self._handle(self._delete)
+
+            def _delete(self, parts, query):
+                if len(parts) == 2 and parts[0] == "users":
+                    if service.delete_users([parts[1]]):
+                        self._send(200, {"user_id": parts[1], "deleted": True})
+                    else:
+                        self._send(404, {"error": f"User ID '{parts[1]}' does not exist in the data."})
+                else:
+                    self._send(404, {"error": "Not found"})
+
+            def _post(self, parts, query):
+                if parts not in (["estimates"], ["users", "delete"]):
+                    self._send(404, {"error": "Not found"})
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                if length > MAX_BODY_BYTES:
+                    self._send(413, {"error": f"Request body is larger than {MAX_BODY_BYTES} bytes."})
+                    self.close_connection = True
+                    return
+                try:
+                    body = json.loads(self.rfile.read(length) or b"null")
+                except ValueError:
+                    self._send(400, {"error": "Invalid JSON"})
+                    return
+                if parts == ["users", "delete"]:
+                    user_ids = body.get("user_ids") if isinstance(body, dict) else None
+                    if not isinstance(user_ids, list) or not all(isinstance(user_id, str) for user_id in user_ids):
+                        raise ValueError("'user_ids' must be a list of user IDs.")
+                    self._send(200, {"deleted_users": service.delete_users(user_ids)})
+                elif isinstance(body, list):
+                    self._send(200, service.submit_estimates(body))
+                else:
+                    result = service.submit_estimates([body])[0]
+                    self._send(422 if "error" in result else 201, result)
+
+            def _get(self, parts, query):
+                name, _, fmt = parts[-1].rpartition(".") if parts else ("", "", "")
+                if parts == ["health"]:
+                    self._send(200, {"status": "ok"})
+                elif parts == ["metrics"]:
+                    self._send(200, metrics.export_prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+                elif parts == ["leaderboard"]:
+                    limit = query.get("limit")
+                    if limit is not None and not limit.isdigit():
+                        raise ValueError("'limit' must be a whole number.")
+                    self._send(200, service.leaderboard(int(limit) if limit is not None else None))
+                elif parts == ["compare"] or (len(parts) == 1 and name == "compare" and fmt in CHART_TYPES):
+                    user_ids = [user_id for user_id in query.get("users", "").split(",") if user_id]
+                    if not user_ids:
+                        raise ValueError("'users' must list at least one user ID, e.g. users=a,b.")
+                    if parts == ["compare"]:
+                        self._send(200, service.compare(user_ids))
+                    else:
+                        self._send_chart(service.data_analysis.render_users_comparison(user_ids, fmt), fmt)
+                elif len(parts) == 1 and name == "chart" and fmt in CHART_TYPES:
+                    self._send_chart(service.data_analysis.render_emissions(None, fmt), fmt)
+                elif len(parts) == 2 and parts[0] == "users":
+                    summary = service.user_summary(parts[1])
+                    if summary is None:
+                        self._send(404, {"error": f"User ID '{parts[1]}' does not exist in the data."})
+                    else:
+                        self._send(200, summary)
+                elif len(parts) == 3 and parts[0] == "users" and parts[2] == "trend":
+                    self._send(200, service.user_trend(parts[1], query.get("period", "monthly")))
+                elif len(parts) == 3 and parts[0] == "users" and name == "chart" and fmt in CHART_TYPES:
+                    self._send_chart(service.data_analysis.render_emissions(parts[1], fmt), fmt)
+                else:
+                    self._send(404, {"error": "Not found"})
+
+        return Handler
+
+
+def create_service(api_key, data_file="emissions_data.csv", api_root=None):
+    """Builds a CarbonService set up like the interactive tracker, with the data loaded."""
+    from api_handler import API_ROOT, CarbonInterfaceAPI
+    from data_analysis import DataAnalysis
+    from emission_factors import FactorTable, LocalEstimateEngine
+    from estimate_cache import EstimateCache
+    from request_scheduler import RequestScheduler
+
+    local_engine = None
+    if os.path.exists("emission_factors.csv"):
+        local_engine = LocalEstimateEngine(FactorTable.from_csv("emission_factors.csv"))
+    api = CarbonInterfaceAPI(api_key, api_root=api_root or API_ROOT, local_engine=local_engine,
+                             cache=EstimateCache(ttl=30 * 24 * 3600, cache_dir=".estimate_cache"),
+                             scheduler=RequestScheduler())
+    return CarbonService(api, DataAnalysis(data_file, write_behind=True))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the Carbon Footprint Tracker as a local JSON API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--api-key", default=os.environ.get("CARBON_INTERFACE_API_KEY", ""),
+                        help="Carbon Interface API key (default: $CARBON_INTERFACE_API_KEY)")
+    parser.add_argument("--api-root", help="API root URL, e.g. a mock server")
+    parser.add_argument("--data-file", default="emissions_data.csv", help="Emissions data file to serve")
+    args = parser.parse_args()
+
+    metrics.enable()
+    service = create_service(args.api_key, args.data_file, args.api_root)
+    server = CarbonServiceServer(service, args.host, args.port)
+    print(f"Serving the Carbon Footprint Tracker at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        service.close()
@@ -0,0 +1,114 @@
+import asyncio
+import copy
+import threading
+from estimate_cache import canonical_key
+
+
+def split_duplicates(estimates, indexes):
+    """Splits (estimate_type, params) items at the given indexes into the first index of each
+    distinct request and (duplicate index, first index) pairs for the rest."""
+    first = {}
+    duplicates = []
+    for i in indexes:
+        key = canonical_key(*estimates[i])
+        if key in first:
+            duplicates.append((i, first[key]))
+        else:
+            first[key] = i
+    return list(first.values()), duplicates
+
+
+class _Counters:
+    def __init__(self):
+        self.calls = 0
+        self.executed = 0
+        self.deduplicated = 0
+        self._lock = threading.Lock()
+
+    def _record(self, leader, count=1):
+        with self._lock:
+            self.calls += count
+            if leader:
+                self.executed += count
+            else:
+                self.deduplicated += count
+
+    def record_deduplicated(self, count):
+        """Counts calls answered by another call without going through do()."""
+        if count:
+            self._record(False, count)
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "executed": self.executed, "deduplicated": self.deduplicated}
+
+
+class SingleFlight(_Counters):
+    """Coalesces concurrent calls with the same key from threads.
+
+    The first caller for a key runs the function; callers arriving while it runs wait for
+    it and get a copy of its result, or its exception. Nothing is remembered once the
+    call finishes, so this only removes duplicate work that overlaps in time.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._calls = {}  # key -> [done event, result, exception]
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = [threading.Event(), None, None]
+        self._record(leader)
+
+        if not leader:
+            call[0].wait()
+            if call[2] is not None:
+                raise call[2]
+            return copy.deepcopy(call[1])
+
+        try:
+            call[1] = fn()
+            return call[1]
+        except Exception as e:
+            call[2] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call[0].set()
+
+
+class AsyncSingleFlight(_Counters):
+    """Coalesces concurrent calls with the same key from coroutines on one event loop.
+
+    The shared request runs as its own task. A waiter that is cancelled stops waiting
+    without affecting the others; the request itself is cancelled when its last waiter is.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._calls = {}  # key -> [task, number of waiters]
+
+    async def do(self, key, coro_fn):
+        call = self._calls.get(key)
+        leader = call is None
+        if leader:
+            call = self._calls[key] = [asyncio.ensure_future(coro_fn()), 0]
+            call[0].add_done_callback(lambda task: self._calls.pop(key, None) if self._calls.get(key) is call else None)
+        self._record(leader)
+
+        call[1] += 1
+        try:
+            result = await asyncio.shield(call[0])
+        except asyncio.CancelledError:
+            if call[1] == 1 and not call[0].done():
+                call[0].cancel()
+                if self._calls.get(key) is call:
+                    del self._calls[key]  # Later callers must not join the cancelled request
+            raise
+        finally:
+            call[1] -= 1
+        return result if leader else copy.deepcopy(result)
@@ -0,0 +1,411 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+import pandas as pd
+import metrics
+from data_analysis import (chart_format, draw_category_totals, draw_users_comparison, is_emission, parse_records,
+                           plot_category_totals, plot_users_comparison, prompt_user_ids, render_chart, write_chart)
+from rollups import PERIODS, window_bounds
+from storage import COLUMNS
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS emissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    category TEXT,
+    emission_kg REAL NOT NULL,
+    user_id TEXT NOT NULL,
+    recorded_at TEXT  -- ISO 8601 local time, NULL for records imported without one
+);
+-- Covers per-user totals, per-user category breakdowns and per-user deletes
+CREATE INDEX IF NOT EXISTS idx_emissions_user_category ON emissions(user_id, category, emission_kg);
+CREATE INDEX IF NOT EXISTS idx_emissions_category ON emissions(category, emission_kg);
+CREATE INDEX IF NOT EXISTS idx_emissions_emission ON emissions(emission_kg);
+
+-- Running totals per user, kept current by triggers so the leaderboard reads one row per user
+CREATE TABLE IF NOT EXISTS user_totals (
+    user_id TEXT PRIMARY KEY,
+    total_kg REAL NOT NULL,
+    records INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_user_totals_total ON user_totals(total_kg);
+
+CREATE TRIGGER IF NOT EXISTS emissions_after_insert AFTER INSERT ON emissions BEGIN
+    INSERT INTO user_totals (user_id, total_kg, records) VALUES (NEW.user_id, NEW.emission_kg, 1)
+    ON CONFLICT(user_id) DO UPDATE SET total_kg = total_kg + excluded.total_kg, records = records + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS emissions_after_delete AFTER DELETE ON emissions BEGIN
+    UPDATE user_totals SET total_kg = total_kg - OLD.emission_kg, records = records - 1
+    WHERE user_id = OLD.user_id;
+    DELETE FROM user_totals WHERE user_id = OLD.user_id AND records <= 0;
+END;
+
+-- IDs of batches stored by add_emissions, committed with their records
+CREATE TABLE IF NOT EXISTS import_batches (
+    batch_id TEXT PRIMARY KEY
+);
+
+-- Running totals per user and category, so category charts do not group the raw records
+CREATE TABLE IF NOT EXISTS user_category_totals (
+    user_id TEXT NOT NULL,
+    category TEXT NOT NULL,  -- '' for records without a category
+    total_kg REAL NOT NULL,
+    records INTEGER NOT NULL,
+    PRIMARY KEY (user_id, category)
+);
+
+CREATE TRIGGER IF NOT EXISTS emissions_after_insert_category AFTER INSERT ON emissions BEGIN
+    INSERT INTO user_category_totals (user_id, category, total_kg, records)
+    VALUES (NEW.user_id, IFNULL(NEW.category, ''), NEW.emission_kg, 1)
+    ON CONFLICT(user_id, category) DO UPDATE SET total_kg = total_kg + excluded.total_kg, records = records + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS emissions_after_delete_category AFTER DELETE ON emissions BEGIN
+    UPDATE user_category_totals SET total_kg = total_kg - OLD.emission_kg, records = records - 1
+    WHERE user_id = OLD.user_id AND category = IFNULL(OLD.category, '');
+    DELETE FROM user_category_totals WHERE user_id = OLD.user_id AND category = IFNULL(OLD.category, '')
+        AND records <= 0;
+END;
+"""
+
+# Fills user_category_totals in databases created before it existed
+BACKFILL_CATEGORY_TOTALS = """
+INSERT INTO user_category_totals (user_id, category, total_kg, records)
+SELECT user_id, IFNULL(category, ''), SUM(emission_kg), COUNT(*) FROM emissions GROUP BY user_id, IFNULL(category, '')
+"""
+
+# Created after the recorded_at column exists; window totals and trends are range scans over them
+TIME_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_emissions_user_time ON emissions(user_id, recorded_at, emission_kg);
+CREATE INDEX IF NOT EXISTS idx_emissions_time ON emissions(recorded_at, emission_kg);
+"""
+
+SELECT_RECORDS = ('SELECT category AS "Category", emission_kg AS "Emission (kg)", user_id AS "User ID", '
+                  'recorded_at AS "Timestamp" FROM emissions')
+
+# SQLite date expressions giving the first day of each rollup period
+PERIOD_STARTS = {
+    "daily": "date(recorded_at)",
+    "weekly": "date(recorded_at, '-' || ((CAST(strftime('%w', recorded_at) AS INTEGER) + 6) % 7) || ' days')",
+    "monthly": "date(recorded_at, 'start of month')",
+}
+
+
+class SQLiteDataAnalysis:
+    """DataAnalysis backed by an embedded SQLite database instead of an in-memory frame.
+
+    Queries run as indexed SQL, so memory use does not grow with the history, and the
+    database runs in WAL mode so readers and writers do not block each other. Each thread
+    gets its own connection.
+    """
+
+    def __init__(self, db_file="emissions.db"):
+        self.db_file = db_file if db_file else "emissions.db"
+        directory = os.path.dirname(self.db_file)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            has_category_totals = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_category_totals'").fetchone()
+            conn.executescript(SCHEMA)
+            if not has_category_totals:
+                conn.execute(BACKFILL_CATEGORY_TOTALS)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(emissions)")]
+            if "recorded_at" not in columns:
+                # Databases created before records were timestamped
+                conn.execute("ALTER TABLE emissions ADD COLUMN recorded_at TEXT")
+            conn.executescript(TIME_INDEXES)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def warm(self, background=True):
+        """Does nothing: queries read the database directly, so there is nothing to load ahead."""
+        return None
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def import_csv(self, csv_file, chunksize=100000):
+        """Copies the records of an existing CSV data file into the database, chunk by chunk."""
+        rows = 0
+        conn = self._connection()
+        for chunk in pd.read_csv(csv_file, chunksize=chunksize):
+            chunk = chunk.dropna(subset=["Emission (kg)", "User ID"])
+            if "Timestamp" in chunk.columns:
+                timestamps = pd.to_datetime(chunk["Timestamp"], errors="coerce", format="ISO8601")
+                timestamps = [ts.isoformat(sep=" ") if pd.notna(ts) else None for ts in timestamps]
+            else:
+                timestamps = [None] * len(chunk)
+            records = zip(chunk["Category"].where(chunk["Category"].notna(), None),
+                          chunk["Emission (kg)"].astype(float), chunk["User ID"].astype(str), timestamps)
+            with conn:
+                conn.executemany("INSERT INTO emissions (category, emission_kg, user_id, recorded_at) "
+                                 "VALUES (?, ?, ?, ?)", records)
+            rows += len(chunk)
+        return rows
+
+    @property
+    def total_emissions(self):
+        return self.get_total_emissions()
+
+    def add_emission(self, category, carbon_kg, user_id, timestamp=None):
+        """Adds an emission record with the user's ID, dated now unless a timestamp is given."""
+        if is_emission(carbon_kg):
+            timestamp = pd.Timestamp(timestamp) if timestamp is not None else pd.Timestamp(datetime.now())
+            with self._connection() as conn:
+                conn.execute("INSERT INTO emissions (category, emission_kg, user_id, recorded_at) VALUES (?, ?, ?, ?)",
+                             (category, float(carbon_kg), user_id, timestamp.isoformat(sep=" ")))
+        else:
+            print("Invalid data type for emission. Expected a number.")
+
+    def add_emissions(self, records, batch_id=None):
+        """Adds many (category, carbon_kg, user_id[, timestamp]) records in one transaction.
+
+        Records whose emission is not a finite number are skipped, and an unreadable timestamp
+        raises ValueError before anything is added. Returns the number of records added.
+        A batch_id is stored in the same transaction, for has_batch.
+        """
+        rows = [(category, float(carbon_kg), user_id, timestamp.isoformat(sep=" "))
+                for category, carbon_kg, user_id, timestamp in parse_records(records)]
+        if rows or batch_id is not None:
+            with self._connection() as conn:
+                conn.executemany("INSERT INTO emissions (category, emission_kg, user_id, recorded_at) "
+                                 "VALUES (?, ?, ?, ?)", rows)
+                if batch_id is not None:
+                    conn.execute("INSERT OR IGNORE INTO import_batches (batch_id) VALUES (?)", (batch_id,))
+        return len(rows)
+
+    def has_batch(self, batch_id):
+        """Returns True if add_emissions stored a batch with this ID."""
+        return self._connection().execute(
+            "SELECT 1 FROM import_batches WHERE batch_id = ?", (batch_id,)).fetchone() is not None
+
+    @metrics.timed("analytics_call_seconds", operation="get_total_emissions")
+    def get_total_emissions(self, user_id=None):
+        """Returns total emissions, filtered by User ID if specified."""
+        conn = self._connection()
+        if user_id:
+            row = conn.execute("SELECT total_kg FROM user_totals WHERE user_id = ?", (user_id,)).fetchone()
+        else:
+            row = conn.execute("SELECT SUM(total_kg) FROM user_totals").fetchone()
+        return row[0] if row and row[0] is not None else 0.0
+
+    def has_data(self):
+        """Returns True if there is at least one emission record."""
+        return self._connection().execute("SELECT 1 FROM emissions LIMIT 1").fetchone() is not None
+
+    def has_user(self, user_id):
+        """Returns True if the user has at least one emission record."""
+        return self._connection().execute("SELECT 1 FROM user_totals WHERE user_id = ?", (user_id,)).fetchone() is not None
+
+    @metrics.timed("analytics_call_seconds", operation="display_emission_data")
+    def display_emission_data(self, user_id=None):
+        """Displays emissions data filtered by User ID if specified."""
+        conn = self._connection()
+        if user_id:
+            user_data = pd.read_sql_query(f"{SELECT_RECORDS} WHERE user_id = ? ORDER BY id", conn, params=(user_id,))
+            if not user_data.empty:
+                print("Emissions Data for User ID:", user_id)
+                print(user_data)
+            else:
+                print("No data available for this User ID.")
+        else:
+            count = conn.execute("SELECT COUNT(*) FROM emissions").fetchone()[0]
+            if count:
+                print("Emissions Data for All Users:")
+                # Like pandas, show only the head and tail of a long table, without loading the rest
+                half = (pd.get_option("display.max_rows") or count) // 2
+                if count > 2 * half:
+                    head = pd.read_sql_query(f"{SELECT_RECORDS} ORDER BY id LIMIT ?", conn, params=(half,))
+                    tail = pd.read_sql_query(f"{SELECT_RECORDS} ORDER BY id DESC LIMIT ?", conn, params=(half,))
+                    print(head.to_string())
+                    print("...")
+                    print(tail.iloc[::-1].set_axis(range(count - half, count)).to_string(header=False))
+                    print(f"\n[{count} rows x {len(COLUMNS)} columns]")
+                else:
+                    print(pd.read_sql_query(f"{SELECT_RECORDS} ORDER BY id", conn))
+            else:
+                print("No emission data available.")
+
+    def _category_totals(self, user_ids=None):
+        conn = self._connection()
+        if user_ids is None:
+            rows = conn.execute("SELECT NULL, NULLIF(category, ''), SUM(total_kg) FROM user_category_totals "
+                                "GROUP BY category")
+        else:
+            placeholders = ", ".join("?" * len(user_ids))
+            rows = conn.execute("SELECT user_id, NULLIF(category, ''), total_kg FROM user_category_totals "
+                                f"WHERE user_id IN ({placeholders})", list(user_ids))
+        totals = {}
+        for user_id, category, total in rows:
+            totals.setdefault(user_id, {})[category] = total
+        return totals
+
+    def get_category_totals(self, user_id=None):
+        """Returns {category: total emission} for one user, or for all users."""
+        return self._category_totals([user_id]).get(user_id, {}) if user_id else self._category_totals().get(None, {})
+
+    def render_emissions(self, user_id=None, fmt="png"):
+        """Returns the category chart of one user, or all users, as PNG or SVG bytes, or None without data.
+
+        The totals come from the user_category_totals summary table, which triggers keep
+        current, so charts are not cached here.
+        """
+        category_totals = self.get_category_totals(user_id)
+        if not category_totals:
+            return None
+        title = f"Emissions by Category (User ID: {user_id})" if user_id else "Emissions by Category (All Users)"
+        return render_chart(lambda ax: draw_category_totals(ax, category_totals, title), fmt)
+
+    def render_users_comparison(self, user_ids, fmt="png"):
+        """Returns the comparison chart of the given users as PNG or SVG bytes, or None without data."""
+        user_category_totals = self._category_totals(sorted(set(user_ids)))
+        if not user_category_totals:
+            return None
+        return render_chart(lambda ax: draw_users_comparison(ax, user_category_totals), fmt, figsize=(10, 6))
+
+    def visualize_emissions(self, user_id=None, output=None, fmt=None):
+        """Shows the category chart, or with output or fmt renders it off screen and returns the bytes."""
+        if output is not None or fmt is not None:
+            chart = self.render_emissions(user_id, chart_format(output, fmt))
+            if chart is None:
+                print("No data available to visualize.")
+            elif output is not None:
+                write_chart(chart, output)
+            return chart
+
+        category_totals = self.get_category_totals(user_id)
+        if user_id:
+            title = f"Emissions by Category (User ID: {user_id})"
+        else:
+            title = "Emissions by Category (All Users)"
+
+        if category_totals:
+            plot_category_totals(category_totals, title)
+        else:
+            print("No data available to visualize.")
+
+    def compare_users_emissions(self, user_ids=None, output=None, fmt=None):
+        """Compares users' emissions by category, asking for the users unless user_ids is given."""
+        if user_ids is None:
+            user_ids = prompt_user_ids(self.has_user)
+
+        if not user_ids:
+            print("No user IDs were selected.")
+            return None
+
+        if output is not None or fmt is not None:
+            chart = self.render_users_comparison(user_ids, chart_format(output, fmt))
+            if chart is None:
+                print("No data available to visualize for the selected users.")
+            elif output is not None:
+                write_chart(chart, output)
+            return chart
+
+        user_category_totals = self._category_totals(sorted(set(user_ids)))
+        if user_category_totals:
+            plot_users_comparison(user_category_totals)
+        else:
+            print("No data available to visualize for the selected users.")
+
+    def remove_emission(self, user_id=None):
+        """Removes all emission data, or only for a specific User ID."""
+        with self._connection() as conn:
+            if user_id:
+                conn.execute("DELETE FROM emissions WHERE user_id = ?", (user_id,))
+            else:
+                conn.execute("DELETE FROM emissions")
+                conn.execute("DELETE FROM user_totals")
+                conn.execute("DELETE FROM user_category_totals")
+
+    def remove_emissions(self, user_ids):
+        """Removes the records of every listed user in one transaction. Returns the number of users that had records."""
+        user_ids = list(dict.fromkeys(user_id for user_id in user_ids if user_id))
+        with self._connection() as conn:
+            removed = [user_id for user_id in user_ids
+                       if conn.execute("DELETE FROM emissions WHERE user_id = ?", (user_id,)).rowcount]
+        return len(removed)
+
+    @metrics.timed("analytics_call_seconds", operation="sorting_emission_data")
+    def sorting_emission_data(self, ascending=True, user_id=None, limit=None):
+        """Sorts emission data by emission, filtered by User ID if specified.
+
+        Ties keep insertion order in either direction, as in DataAnalysis.
+        """
+        direction = "ASC" if ascending else "DESC"
+        query = 'SELECT user_id AS "User ID", emission_kg AS "Emission (kg)", category AS "Category" FROM emissions'
+        params = []
+        if user_id:
+            query += " WHERE user_id = ?"
+            params.append(user_id)
+        query += f" ORDER BY emission_kg {direction}, id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(int(limit))
+
+        sorted_data = pd.read_sql_query(query, self._connection(), params=params)
+        if not sorted_data.empty:
+            print(sorted_data)
+            return sorted_data
+        else:
+            print("No data available to sort.")
+
+    @metrics.timed("analytics_call_seconds", operation="get_emissions_in_window")
+    def get_emissions_in_window(self, days=30, user_id=None, category=None, end=None):
+        """Returns emissions of the last `days` days up to and including the end date (default today)."""
+        start, stop = window_bounds(days, end)
+        query = "SELECT SUM(emission_kg) FROM emissions WHERE recorded_at >= ? AND recorded_at < ?"
+        params = [start.isoformat(), stop.isoformat()]
+        if user_id:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        if category is not None:
+            query += " AND category = ?"
+            params.append(category)
+        row = self._connection().execute(query, params).fetchone()
+        return row[0] if row[0] is not None else 0.0
+
+    @metrics.timed("analytics_call_seconds", operation="emission_trend")
+    def emission_trend(self, period="monthly", user_id=None, category=None):
+        """Returns emissions per day, week or month as a Series indexed by the period's first day."""
+        if period not in PERIODS:
+            raise ValueError(f"Unknown period '{period}'. Expected one of: {', '.join(PERIODS)}")
+        query = f"SELECT {PERIOD_STARTS[period]} AS bucket, SUM(emission_kg) FROM emissions WHERE recorded_at IS NOT NULL"
+        params = []
+        if user_id:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        if category is not None:
+            query += " AND category = ?"
+            params.append(category)
+        rows = self._connection().execute(query + " GROUP BY bucket ORDER BY bucket", params).fetchall()
+        totals = {datetime.strptime(bucket, "%Y-%m-%d").date(): total for bucket, total in rows}
+        return pd.Series(totals, dtype=float, name="Emission (kg)").rename_axis("Period Start")
+
+    @metrics.timed("analytics_call_seconds", operation="get_leaderboard")
+    def get_leaderboard(self, limit=None):
+        """Returns [(user_id, total emission)] from lowest to highest, or only the first `limit` users."""
+        query = "SELECT user_id, total_kg FROM user_totals ORDER BY total_kg, user_id"
+        if limit is not None:
+            return self._connection().execute(query + " LIMIT ?", (int(limit),)).fetchall()
+        return self._connection().execute(query).fetchall()
+
+    @metrics.timed("analytics_call_seconds", operation="leaderboard")
+    def leaderboard(self):
+        """Generates a sorted leaderboard by total emissions, from lowest to highest."""
+        user_emissions = pd.Series(dict(self.get_leaderboard()), name="Emission (kg)", dtype=float).rename_axis("User ID")
+        print("\033[1mLeaderboard by Total Emissions (Lowest to Highest):\033[0m")
+        print(user_emissions)
@@ -0,0 +1,214 @@
+import io
+import os
+import pandas as pd
+
+
+COLUMNS = ["Category", "Emission (kg)", "User ID", "Timestamp"]
+CATEGORICAL_COLUMNS = ["Category", "User ID"]
+
+
+def atomic_write(path, data):
+    """Replaces a file with new bytes so a crash never leaves it half written."""
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Parquet and Feather storage need pyarrow. Install it with 'pip install pyarrow'.")
+    return pyarrow
+
+
+def to_compact_dtypes(df):
+    """Converts a frame in place to emissions as float64, Category/User ID as categorical codes
+    and Timestamp as datetime64 (NaT where unknown)."""
+    for col in CATEGORICAL_COLUMNS:
+        if not isinstance(df[col].dtype, pd.CategoricalDtype):
+            values = df[col]
+            if not pd.api.types.is_string_dtype(values) or pd.api.types.infer_dtype(values, skipna=True) != "string":
+                values = values.map(str, na_action="ignore")  # IDs like 123 and "123" must be the same user
+            df[col] = values.astype("category")
+    if df["Emission (kg)"].dtype != "float64":
+        df["Emission (kg)"] = pd.to_numeric(df["Emission (kg)"], errors="coerce").astype("float64")
+    if "Timestamp" in df.columns and not pd.api.types.is_datetime64_dtype(df["Timestamp"]):
+        df["Timestamp"] = pd.to_datetime(df["Timestamp"], errors="coerce", format="ISO8601")
+    return df
+
+
+def empty_frame():
+    """An empty emissions frame that already has the compact dtypes."""
+    return to_compact_dtypes(pd.DataFrame(columns=COLUMNS))
+
+
+def concat_compact(df, new_rows):
+    """Appends compact rows to a compact frame without falling back to object columns."""
+    new_rows = new_rows.copy(deep=False)
+    for col in CATEGORICAL_COLUMNS:
+        existing = df[col].cat.categories
+        added = new_rows[col].cat.categories.difference(existing)
+        if len(added):
+            df = df.assign(**{col: df[col].cat.add_categories(added)})
+        new_rows[col] = new_rows[col].cat.set_categories(df[col].cat.categories)
+    return pd.concat([df, new_rows])
+
+
+def _encode(df):
+    """Stores Category and User ID as dictionary-encoded strings and emissions as float64."""
+    return to_compact_dtypes(df.copy(deep=False)).reset_index(drop=True)
+
+
+class CSVStorage:
+    """Plain CSV, the original format."""
+
+    def write_order(self, df):
+        """df in the order serialize writes its rows; CSV keeps them as they are."""
+        return df
+
+    def serialize(self, df):
+        return df.to_csv(index=False).encode("utf-8")
+
+    def deserialize(self, raw):
+        if not raw.strip():
+            return empty_frame()
+        # Parse the repeated strings straight into categorical codes
+        return pd.read_csv(io.BytesIO(raw), dtype={"Category": "category", "User ID": "category"})
+
+    def read(self, path, columns=None, user_id=None):
+        # IDs stay strings, so "0042" is not read back as the number 42
+        df = pd.read_csv(path, usecols=columns if columns is None or user_id is None else list({*columns, "User ID"}),
+                         dtype={"Category": "category", "User ID": "category"})
+        if user_id is not None:
+            df = df[df["User ID"] == str(user_id)]
+            if columns is not None:
+                df = df[columns]
+        return df
+
+    def iter_chunks(self, path, columns=None, chunksize=100000):
+        """Yields the file as frames of at most chunksize rows."""
+        dtype = {col: "category" for col in CATEGORICAL_COLUMNS if columns is None or col in columns}
+        yield from pd.read_csv(path, usecols=columns, dtype=dtype, chunksize=chunksize)
+
+
+class ParquetStorage:
+    """Parquet with dictionary-encoded Category/User ID columns.
+
+    With cluster_by_user the rows are grouped by user when written, so a read filtered on
+    one user only touches the row groups whose statistics can contain that user.
+    """
+
+    def __init__(self, row_group_size=64 * 1024, cluster_by_user=True):
+        self.row_group_size = row_group_size
+        self.cluster_by_user = cluster_by_user
+
+    def write_order(self, df):
+        """df in the order serialize writes its rows: grouped by user with cluster_by_user, with
+        the original labels kept so callers can tell where each row went."""
+        if self.cluster_by_user:
+            return df.sort_values("User ID", kind="stable", na_position="last")
+        return df
+
+    def serialize(self, df):
+        _require_pyarrow()
+        out = _encode(self.write_order(df))
+        buffer = io.BytesIO()
+        out.to_parquet(buffer, engine="pyarrow", index=False, row_group_size=self.row_group_size)
+        return buffer.getvalue()
+
+    def deserialize(self, raw):
+        _require_pyarrow()
+        return pd.read_parquet(io.BytesIO(raw), engine="pyarrow")
+
+    def read(self, path, columns=None, user_id=None):
+        """Reads only the requested columns, and only row groups that may hold user_id."""
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+        filters = [("User ID", "=", str(user_id))] if user_id is not None else None
+        return pq.read_table(path, columns=columns, filters=filters).to_pandas()
+
+    def iter_chunks(self, path, columns=None, chunksize=100000):
+        """Yields the file as frames of at most chunksize rows."""
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+
+
+class FeatherStorage:
+    """Feather (Arrow IPC) with dictionary-encoded Category/User ID columns.
+
+    Reads are memory-mapped, so projecting columns only touches those columns' buffers.
+    """
+
+    def __init__(self, compression="lz4"):
+        self.compression = compression
+
+    def write_order(self, df):
+        """df in the order serialize writes its rows; Feather keeps them as they are."""
+        return df
+
+    def serialize(self, df):
+        _require_pyarrow()
+        buffer = io.BytesIO()
+        _encode(df).to_feather(buffer, compression=self.compression)
+        return buffer.getvalue()
+
+    def deserialize(self, raw):
+        _require_pyarrow()
+        return pd.read_feather(io.BytesIO(raw))
+
+    def read(self, path, columns=None, user_id=None):
+        pyarrow = _require_pyarrow()
+        import pyarrow.compute as pc
+        import pyarrow.feather as feather
+        read_columns = columns if columns is None or user_id is None else list({*columns, "User ID"})
+        table = feather.read_table(path, columns=read_columns, memory_map=True)
+        if user_id is not None:
+            user_column = table.column("User ID").cast(pyarrow.string())
+            table = table.filter(pc.equal(user_column, str(user_id)))
+            if columns is not None:
+                table = table.select(columns)
+        return table.to_pandas()
+
+    def iter_chunks(self, path, columns=None, chunksize=100000):
+        """Yields the file as frames of at most chunksize rows, memory-mapped."""
+        pyarrow = _require_pyarrow()
+        import pyarrow.ipc as ipc
+        with pyarrow.memory_map(path) as source:
+            reader = ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(columns)
+                for offset in range(0, batch.num_rows, chunksize):
+                    yield batch.slice(offset, chunksize).to_pandas()
+
+
+def storage_for_path(path):
+    """Picks the storage backend from the file extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".parquet":
+        return ParquetStorage()
+    if extension in (".feather", ".arrow"):
+        return FeatherStorage()
+    return CSVStorage()
+
+
+if __name__ == "__main__":
+    import argparse
+    from data_analysis import migrate_data_file
+
+    parser = argparse.ArgumentParser(description="Copy an emissions data file into another storage format.")
+    parser.add_argument("source", help="Existing data file, e.g. emissions_data.csv")
+    parser.add_argument("destination", help="New data file, e.g. emissions_data.parquet")
+    args = parser.parse_args()
+    rows = migrate_data_file(args.source, args.destination)
+    print(f"Migrated {rows} records from {args.source} to {args.destination}.")
@@ -0,0 +1,88 @@
+import pandas as pd
+from storage import storage_for_path
+
+
+class StreamingAnalysis:
+    """Totals, leaderboard and category summaries over a data file read chunk by chunk.
+
+    Each chunk is reduced to partial aggregates that are folded together, so memory is
+    bounded by chunksize (plus one row per user or category) rather than by the file size.
+    Only the data file itself is read; use it on archived exports, not on a live store with
+    an unfolded append log.
+    """
+
+    def __init__(self, data_file="emissions_data.csv", chunksize=100000, storage=None):
+        self.data_file = data_file
+        self.chunksize = chunksize
+        self.storage = storage if storage else storage_for_path(data_file)
+
+    def _chunks(self, columns):
+        for chunk in self.storage.iter_chunks(self.data_file, columns=columns, chunksize=self.chunksize):
+            chunk["Emission (kg)"] = pd.to_numeric(chunk["Emission (kg)"], errors="coerce")
+            yield chunk
+
+    def _fold(self, by, user_id=None):
+        """Folds per-chunk sum/count/max of emissions grouped by the given columns."""
+        columns = list(dict.fromkeys([*by, "Emission (kg)"] + (["User ID"] if user_id else [])))
+        folded = None
+        for chunk in self._chunks(columns):
+            if user_id:
+                chunk = chunk[chunk["User ID"] == user_id]
+            partial = chunk.groupby(by, observed=True)["Emission (kg)"].agg(["sum", "count", "max"])
+            if folded is None:
+                folded = partial
+            else:
+                folded = pd.concat([folded, partial]).groupby(level=list(range(len(by)))).agg(
+                    {"sum": "sum", "count": "sum", "max": "max"})
+        if folded is None:
+            return pd.DataFrame(columns=["sum", "count", "max"])
+        return folded
+
+    def get_total_emissions(self, user_id=None):
+        """Returns total emissions, filtered by User ID if specified."""
+        total = 0.0
+        columns = ["Emission (kg)", "User ID"] if user_id else ["Emission (kg)"]
+        for chunk in self._chunks(columns):
+            if user_id:
+                chunk = chunk[chunk["User ID"] == user_id]
+            total += chunk["Emission (kg)"].sum()
+        return total
+
+    def user_totals(self):
+        """Returns total emissions per user, from lowest to highest."""
+        totals = self._fold(["User ID"])["sum"].astype(float).sort_values()
+        return totals.rename("Emission (kg)").rename_axis("User ID")
+
+    def leaderboard(self):
+        """Generates a sorted leaderboard by total emissions, from lowest to highest."""
+        user_emissions = self.user_totals()
+        print("\033[1mLeaderboard by Total Emissions (Lowest to Highest):\033[0m")
+        print(user_emissions)
+        return user_emissions
+
+    def category_summary(self, user_id=None):
+        """Returns total, record count, mean and max emission per category, filtered by User ID if specified."""
+        folded = self._fold(["Category"], user_id=user_id)
+        summary = pd.DataFrame({
+            "Total (kg)": folded["sum"].astype(float),
+            "Records": folded["count"].astype(int),
+            "Mean (kg)": (folded["sum"] / folded["count"]).astype(float),
+            "Max (kg)": folded["max"].astype(float),
+        })
+        return summary.rename_axis("Category").sort_values("Total (kg)", ascending=False)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Report on an emissions data file without loading it into memory.")
+    parser.add_argument("data_file", help="CSV, Parquet or Feather emissions file")
+    parser.add_argument("--user", help="Restrict totals and the category summary to one User ID")
+    parser.add_argument("--chunksize", type=int, default=100000, help="Rows read per chunk")
+    args = parser.parse_args()
+
+    analysis = StreamingAnalysis(args.data_file, chunksize=args.chunksize)
+    print(f"\033[1mTotal Emissions: {analysis.get_total_emissions(args.user):.2f} kg CO2\033[0m")
+    print(analysis.category_summary(args.user))
+    if not args.user:
+        analysis.leaderboard()
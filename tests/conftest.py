@@ -0,0 +1,35 @@
+import os
+import sys
+import pytest
+
+# The tracker's modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_analysis import DataAnalysis
+from sqlite_analysis import SQLiteDataAnalysis
+
+
+class FakeAPI:
+    """Stands in for CarbonInterfaceAPI: every estimate's carbon_kg is its distance_value."""
+
+    def create_estimates_batch(self, requests, max_workers=None):
+        return [{"data": {"attributes": {"carbon_kg": params["distance_value"]}}} for _, params in requests]
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def api():
+    return FakeAPI()
+
+
+@pytest.fixture(params=["frame", "plain", "sqlite"])
+def store(request, tmp_path):
+    """Each store the service and importer run on: DataAnalysis with and without the append log, and SQLite."""
+    if request.param == "sqlite":
+        store = SQLiteDataAnalysis(str(tmp_path / "emissions.db"))
+    else:
+        store = DataAnalysis(str(tmp_path / "emissions.csv"), append_log=request.param == "frame")
+    yield store
+    store.close()
@@ -0,0 +1,25 @@
+import threading
+import time
+from api_handler import CarbonInterfaceAPI
+
+
+def test_batch_workers_never_outnumber_pooled_connections():
+    api = CarbonInterfaceAPI("key", max_workers=2)
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def post_estimate(estimate_type, params):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return {"data": {"attributes": {"carbon_kg": params["distance_value"]}}}
+    api._post_estimate = post_estimate
+
+    estimates = [("vehicle", {"distance_value": i}) for i in range(8)]
+    results = api.create_estimates_batch(estimates, max_workers=8)
+    assert [result["data"]["attributes"]["carbon_kg"] for result in results] == list(range(8))
+    assert peak[0] == 2
+    api.close()
@@ -0,0 +1,25 @@
+import asyncio
+from async_api_handler import AsyncCarbonInterfaceAPI
+
+
+def test_every_method_passes_its_timeout_on():
+    api = AsyncCarbonInterfaceAPI("key")
+    timeouts = []
+
+    async def request(method, url, error_message, json=None, timeout=None, operation="estimate"):
+        timeouts.append(timeout)
+        return {"data": {}}
+    api._request = request
+
+    async def call_all():
+        await api.estimate_electricity(100, "US", timeout=3)
+        await api.estimate_flight(1, [{"departure_airport": "JFK", "destination_airport": "LHR"}], timeout=3)
+        await api.estimate_shipping(10, "kg", 100, "km", "truck", timeout=3)
+        await api.estimate_fuel_combustion("ng", "thousand_cubic_feet", 5, timeout=3)
+        await api.estimate_vehicle(10, "km", "model", timeout=3)
+        await api.get_vehicle_makes(timeout=3)
+        await api.get_vehicle_models("make", timeout=3)
+        await api.get_estimate("id", timeout=3)
+
+    asyncio.run(call_all())
+    assert timeouts == [3] * 8
@@ -0,0 +1,123 @@
+import json
+import pytest
+from bulk_import import BulkImporter
+from data_analysis import DataAnalysis
+
+
+class Crash(Exception):
+    pass
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "activities.jsonl"
+    path.write_text("".join(json.dumps({"user_id": f"u{i}", "type": "vehicle", "distance_value": i + 1,
+                                        "distance_unit": "km", "vehicle_model_id": "model"}) + "\n"
+                            for i in range(4)))
+    return str(path)
+
+
+def importer_crashing_in(api, store, method):
+    importer = BulkImporter(api, store, batch_size=2)
+
+    def crash(*args, **kwargs):
+        raise Crash()
+    setattr(importer, method, crash)
+    return importer
+
+
+def imported_users(store):
+    return sorted(store.sorting_emission_data()["User ID"].astype(str))
+
+
+def test_resume_after_batch_stored_while_another_writer_adds(api, store, source):
+    # Stops after storing the first batch, before the checkpoint that follows it
+    with pytest.raises(Crash):
+        importer_crashing_in(api, store, "_write_rejects").import_file(source)
+    store.add_emissions([("Flight", 9.0, "other")])
+
+    result = BulkImporter(api, store, batch_size=2).import_file(source)
+    assert result == {"imported": 4, "rejected": 0, "skipped": 2}
+    assert imported_users(store) == ["other", "u0", "u1", "u2", "u3"]
+
+
+def test_resume_after_batch_lost_while_another_writer_adds(api, store, source):
+    # Stops before the first batch is stored; another writer then adds as many rows as it had
+    importer = BulkImporter(api, store, batch_size=2)
+    store_batch = store.add_emissions
+
+    def crash(records, batch_id=None):
+        raise Crash()
+    store.add_emissions = crash
+    with pytest.raises(Crash):
+        importer.import_file(source)
+    store.add_emissions = store_batch
+    store.add_emissions([("Flight", 9.0, "other"), ("Flight", 9.0, "other")])
+
+    result = BulkImporter(api, store, batch_size=2).import_file(source)
+    assert result == {"imported": 4, "rejected": 0, "skipped": 0}
+    assert imported_users(store) == ["other", "other", "u0", "u1", "u2", "u3"]
+
+
+def test_batch_ids_survive_compaction_and_reload(tmp_path):
+    path = str(tmp_path / "emissions.csv")
+    store = DataAnalysis(path, append_log=True)
+    store.add_emissions([("Flight", 1.0, "a")], batch_id="import:0")
+    store.compact()
+    store.close()
+
+    store = DataAnalysis(path, append_log=True)
+    assert store.has_batch("import:0") and not store.has_batch("import:2")
+    assert store.total_emissions == 1.0
+    store.close()
+
+
+def test_unreadable_timestamp_rejects_only_its_row(api, store, tmp_path):
+    path = tmp_path / "activities.jsonl"
+    rows = [{"user_id": "a", "type": "vehicle", "distance_value": 1, "distance_unit": "km",
+             "vehicle_model_id": "model", "timestamp": timestamp} for timestamp in ("2026-01-05", "yesterday")]
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+
+    result = BulkImporter(api, store, batch_size=2).import_file(str(path))
+    assert result == {"imported": 1, "rejected": 1, "skipped": 0}
+    with open(f"{path}.rejects.jsonl", encoding="utf-8") as f:
+        assert [json.loads(line)["row"] for line in f] == [2]
+    assert store.get_total_emissions() == 1.0
+
+
+def test_add_emissions_checks_every_record_before_storing(store):
+    with pytest.raises(ValueError):
+        store.add_emissions([("Flight", 1.0, "a"), ("Flight", 2.0, "b", "yesterday")])
+    assert store.get_total_emissions() == 0.0
+    assert not store.has_data()
+
+
+def crash_after_storing(importer, step):
+    """Makes the importer stop at `step` ("rejects" or "checkpoint") right after storing the first batch."""
+    write_rejects, write_checkpoint = importer._write_rejects, importer._write_checkpoint
+
+    def rejects(rejects_file, rejects):
+        if step == "rejects":
+            raise Crash()
+        write_rejects(rejects_file, rejects)
+
+    def checkpoint(checkpoint_file, checkpoint):
+        if step == "checkpoint" and "batch" not in checkpoint:
+            raise Crash()
+        write_checkpoint(checkpoint_file, checkpoint)
+    importer._write_rejects, importer._write_checkpoint = rejects, checkpoint
+    return importer
+
+
+@pytest.mark.parametrize("step", ["rejects", "checkpoint"])
+def test_rejects_of_a_stored_batch_are_listed_once_after_resume(api, store, source, step):
+    with open(source, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"user_id": "bad", "type": "teleport"}) + "\n")
+    importer = crash_after_storing(BulkImporter(api, store, batch_size=5), step)
+    with pytest.raises(Crash):
+        importer.import_file(source)
+
+    result = BulkImporter(api, store, batch_size=5).import_file(source)
+    assert result == {"imported": 4, "rejected": 1, "skipped": 5}
+    with open(f"{source}.rejects.jsonl", encoding="utf-8") as f:
+        assert [json.loads(line)["row"] for line in f] == [5]
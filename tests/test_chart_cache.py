@@ -0,0 +1,60 @@
+import pytest
+import data_analysis
+from data_analysis import DataAnalysis
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Replaces chart rendering with a stub that records what it drew."""
+    rendered = []
+
+    def render_chart(draw, fmt="png", figsize=(8, 6)):
+        rendered.append(fmt)
+        return f"chart {len(rendered)}".encode("utf-8")
+    monkeypatch.setattr(data_analysis, "render_chart", render_chart)
+    return rendered
+
+
+@pytest.fixture
+def three_users(tmp_path):
+    store = DataAnalysis(str(tmp_path / "emissions.csv"), append_log=True)
+    store.add_emissions([("Flight", 1.0, "a"), ("Vehicle", 2.0, "b"), ("Flight", 3.0, "c")])
+    yield store
+    store.close()
+
+
+def charts(store):
+    return {"a": store.render_emissions("a"), "b": store.render_emissions("b"),
+            "a+c": store.render_users_comparison(["a", "c"]), "all": store.render_emissions()}
+
+
+def test_repeated_charts_come_from_the_cache(three_users, renders):
+    store = three_users
+    first = charts(store)
+    assert len(renders) == 4
+    assert charts(store) == first
+    assert len(renders) == 4
+    store.render_emissions("a", "svg")  # Another format is another chart
+    assert len(renders) == 5
+
+
+def test_a_change_only_renders_charts_of_the_changed_user_again(three_users, renders):
+    store = three_users
+    before = charts(store)
+    store.add_emission("Shipping", 5.0, "a")
+    after = charts(store)
+    assert {name for name in before if after[name] != before[name]} == {"a", "a+c", "all"}
+
+    before = after
+    store.remove_emission("b")
+    after = charts(store)
+    assert after["b"] is None  # Nothing left to plot
+    assert {name for name in before if after[name] != before[name]} == {"b", "all"}
+
+
+def test_reload_renders_every_chart_again(three_users, renders):
+    store = three_users
+    before = charts(store)
+    store.load_data()
+    after = charts(store)
+    assert all(after[name] != before[name] for name in before)
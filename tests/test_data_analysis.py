@@ -0,0 +1,188 @@
+import os
+import subprocess
+import sys
+import threading
+import pytest
+import data_analysis
+from data_analysis import DataAnalysis
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = """
+import sys
+from data_analysis import DataAnalysis
+path, mode, user_id, count = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+store = DataAnalysis(path, append_log=mode == "log", compact_threshold=25)
+for i in range(count):
+    store.add_emission("Electricity", 1.0, user_id)
+store.close()
+"""
+
+
+class Crash(Exception):
+    pass
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "emissions.csv")
+
+
+def user_counts(store):
+    return store.emissions_df["User ID"].astype(str).value_counts().to_dict()
+
+
+def test_log_replay_drops_torn_last_write(path):
+    store = DataAnalysis(path, append_log=True)
+    store.add_emissions([("Flight", 2.0, "a"), ("Vehicle", 3.0, "b")])
+    store.add_emissions([("Flight", 4.0, "c")], batch_id="import:0")
+    store.close()
+    with open(path + ".log", "ab") as f:
+        f.write(b'{"op": "batch", "id": "import:1", "records": [{"Category": "Fl')  # Crashed mid-append
+
+    store = DataAnalysis(path, append_log=True)
+    assert store.total_emissions == 9.0
+    assert store.has_batch("import:0") and not store.has_batch("import:1")
+    with open(path + ".log", "rb") as f:
+        assert f.read().endswith(b"\n")  # The torn line was cut off
+    store.add_emission("Shipping", 1.0, "d")
+    store.close()
+
+    store = DataAnalysis(path, append_log=True)
+    assert store.total_emissions == 10.0
+    assert user_counts(store) == {"a": 1, "b": 1, "c": 1, "d": 1}
+    store.close()
+
+
+@pytest.mark.parametrize("crash_point", ["before_data_file", "after_data_file"])
+def test_crash_mid_compaction_neither_loses_nor_repeats_records(path, monkeypatch, crash_point):
+    store = DataAnalysis(path, append_log=True)
+    store.add_emissions([("Flight", 2.0, "a"), ("Vehicle", 3.0, "b")], batch_id="import:0")
+    store.remove_emission("b")
+    store.add_emission("Flight", 5.0, "c")
+
+    if crash_point == "before_data_file":
+        def write_data_file(data):
+            raise Crash()
+        monkeypatch.setattr(store, "_write_data_file", write_data_file)
+    else:
+        atomic_write = data_analysis.atomic_write
+
+        def write_log_fails(target, data):
+            if target == store.log_file:
+                raise Crash()
+            atomic_write(target, data)
+        monkeypatch.setattr(data_analysis, "atomic_write", write_log_fails)
+    with pytest.raises(Crash):
+        store.compact()
+    monkeypatch.undo()
+
+    # A fresh process finds the compact marker in the log and only replays what the data file lacks
+    reloaded = DataAnalysis(path, append_log=True)
+    assert reloaded.total_emissions == 7.0
+    assert user_counts(reloaded) == {"a": 1, "c": 1}
+    assert reloaded.has_batch("import:0")
+    reloaded.compact()
+    reloaded.close()
+
+    reloaded = DataAnalysis(path, append_log=True)
+    assert reloaded.total_emissions == 7.0 and reloaded.has_batch("import:0")
+    reloaded.close()
+
+
+@pytest.mark.parametrize("mode", ["log", "plain"])
+def test_adds_from_several_processes_are_all_kept(path, mode):
+    env = dict(os.environ, PYTHONPATH=REPO)
+    workers = [subprocess.Popen([sys.executable, "-c", WORKER, path, mode, f"p{i}", "40"], env=env)
+               for i in range(4)]
+    for worker in workers:
+        assert worker.wait(timeout=120) == 0
+
+    store = DataAnalysis(path, append_log=mode == "log")
+    assert store.total_emissions == 160.0
+    assert user_counts(store) == {f"p{i}": 40 for i in range(4)}
+    store.close()
+
+
+@pytest.mark.parametrize("extension", ["csv", "parquet", "feather"])
+@pytest.mark.parametrize("append_log", [True, False])
+def test_removed_record_numbers_mean_the_same_rows_after_reload(tmp_path, extension, append_log):
+    path = str(tmp_path / f"emissions.{extension}")
+    store = DataAnalysis(path, append_log=append_log)
+    store.add_emissions([("Flight", 1.0, "zed"), ("Flight", 2.0, "amy"), ("Flight", 3.0, "zed")])
+    store.compact()
+    store.display_emission_data()
+    shown = store.emissions_df
+    number = shown.index[(shown["User ID"] == "zed") & (shown["Emission (kg)"] == 1.0)][0]
+    assert store.remove_records(number) == 1
+    expected = {"zed": 3.0, "amy": 2.0}
+    assert dict(store.get_leaderboard()) == expected
+    store.close()
+
+    # Another process replays the logged range against the rows as they were written
+    reloaded = DataAnalysis(path, append_log=append_log)
+    assert dict(reloaded.get_leaderboard()) == expected
+    assert sorted(reloaded.emissions_df["Emission (kg)"]) == [2.0, 3.0]
+    reloaded.close()
+
+
+def test_non_finite_emissions_are_refused(path):
+    store = DataAnalysis(path, append_log=True)
+    store.add_emissions([("Flight", 4.0, "a"), ("Flight", 1.0, "b"), ("Flight", 0.5, "d")])
+    store.add_emission("Flight", float("nan"), "c")
+    assert store.add_emissions([("Flight", float("inf"), "c"), ("Flight", 2.0, "c")]) == 1
+    assert store.get_leaderboard() == [("d", 0.5), ("b", 1.0), ("c", 2.0), ("a", 4.0)]
+    store.remove_emission("c")
+    assert store.get_leaderboard() == [("d", 0.5), ("b", 1.0), ("a", 4.0)]
+    assert store.total_emissions == 5.5
+    store.close()
+
+
+def test_numeric_user_ids_are_the_same_users_as_their_strings(path):
+    store = DataAnalysis(path, append_log=True)
+    store.add_emission("Flight", 1.0, 7)
+    store.add_emissions([("Flight", 1.0, "1"), ("Vehicle", 1.0, 1)])
+    store.add_emission("Vehicle", 2.0, 2)
+    assert store.has_user("7") and store.has_user(7)
+    assert store.get_total_emissions(1) == store.get_total_emissions("1") == 2.0
+    assert store.get_leaderboard() == [("7", 1.0), ("1", 2.0), ("2", 2.0)]
+
+    store.remove_emission(7)
+    assert not store.has_user("7")
+    assert "7" not in set(store.emissions_df["User ID"])
+    store.close()
+
+    reloaded = DataAnalysis(path, append_log=True)
+    assert set(reloaded.emissions_df["User ID"]) == {"1", "2"}
+    assert reloaded.total_emissions == 4.0
+    reloaded.close()
+
+
+def test_save_takes_in_what_another_process_saved(path, capsys):
+    first = DataAnalysis(path, reload_interval=None)
+    first.add_emission("Flight", 1.0, "a")
+    second = DataAnalysis(path, reload_interval=None)
+    second.add_emission("Flight", 2.0, "b")
+
+    first.save_data()
+    assert "saving over it" not in capsys.readouterr().out
+    reloaded = DataAnalysis(path)
+    assert dict(reloaded.get_leaderboard()) == {"a": 1.0, "b": 2.0}
+    for store in (first, second, reloaded):
+        store.close()
+
+
+def test_queries_share_the_records_once_nothing_is_pending(path):
+    store = DataAnalysis(path, append_log=True, reload_interval=None)
+    store.add_emissions([("Flight", 2.0, "a"), ("Flight", 1.0, "b")])
+    store.emissions_df  # Concatenates the pending rows
+    results = []
+    store._lock.acquire_read()  # Another query still reading
+    try:
+        thread = threading.Thread(target=lambda: results.append(store.sorting_emission_data(user_id="a")))
+        thread.start()
+        thread.join(2)
+        assert len(results) == 1  # Did not wait for the write lock
+    finally:
+        store._lock.release_read()
+    store.close()
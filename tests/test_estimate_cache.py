@@ -0,0 +1,28 @@
+import os
+from estimate_cache import EstimateCache
+
+
+def test_opening_does_not_walk_the_cache_directory(tmp_path, monkeypatch):
+    cache = EstimateCache(cache_dir=str(tmp_path))
+    for i in range(5):
+        cache.put("electricity", {"value": i}, {"data": {"value": i}})
+
+    walks = []
+    real_walk = os.walk
+    monkeypatch.setattr(os, "walk", lambda *args, **kwargs: walks.append(args) or real_walk(*args, **kwargs))
+    reopened = EstimateCache(cache_dir=str(tmp_path))
+    assert reopened.get("electricity", {"value": 3}) == {"data": {"value": 3}}
+    assert walks == []
+
+    reopened.put("electricity", {"value": 5}, {"data": {"value": 5}})
+    reopened.put("electricity", {"value": 0}, {"data": {"value": 0}})  # Overwrites an existing file
+    assert reopened.stats()["disk_entries"] == 6
+    assert len(walks) == 1
+
+
+def test_disk_limit_evicts_oldest_files(tmp_path):
+    cache = EstimateCache(max_entries=1, cache_dir=str(tmp_path), max_disk_entries=10)
+    for i in range(11):
+        cache.put("electricity", {"value": i}, {"data": {"value": i}})
+    assert cache.stats()["disk_entries"] == 9
+    assert EstimateCache(cache_dir=str(tmp_path)).stats()["disk_entries"] == 9
@@ -0,0 +1,75 @@
+import threading
+import time
+import pytest
+from locks import RWLock
+
+
+def test_read_and_write_locks_are_reentrant():
+    lock = RWLock()
+    with lock.read():
+        with lock.read():
+            pass
+    with lock.write():
+        with lock.write():
+            with lock.read():
+                with lock.read():
+                    pass
+    # Everything was released: another thread can write
+    done = threading.Event()
+    thread = threading.Thread(target=lambda: (lock.acquire_write(), lock.release_write(), done.set()))
+    thread.start()
+    thread.join(2)
+    assert done.is_set()
+
+
+def test_upgrading_read_to_write_raises():
+    lock = RWLock()
+    with lock.read():
+        with pytest.raises(RuntimeError):
+            lock.acquire_write()
+    with lock.write():
+        pass
+
+
+def test_readers_share_and_writer_excludes():
+    lock = RWLock()
+    inside = threading.Barrier(2, timeout=2)
+
+    def reader():
+        with lock.read():
+            inside.wait()  # Both readers hold the lock at once
+
+    threads = [threading.Thread(target=reader) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(2)
+    assert not inside.broken
+
+
+def test_waiting_writer_goes_before_new_readers():
+    lock = RWLock()
+    order = []
+    lock.acquire_read()
+
+    def writer():
+        with lock.write():
+            order.append("writer")
+
+    def late_reader():
+        with lock.read():
+            order.append("reader")
+
+    writer_thread = threading.Thread(target=writer)
+    writer_thread.start()
+    while not lock._waiting_writers:
+        time.sleep(0.001)
+    reader_thread = threading.Thread(target=late_reader)
+    reader_thread.start()
+    time.sleep(0.05)
+    assert order == []  # The late reader waits behind the writer instead of joining the first reader
+
+    lock.release_read()
+    writer_thread.join(2)
+    reader_thread.join(2)
+    assert order == ["writer", "reader"]
@@ -0,0 +1,59 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pytest
+import parallel_aggregation
+from data_analysis import DataAnalysis
+from parallel_aggregation import aggregate_emissions
+from storage import to_compact_dtypes
+
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(7)
+    rows = 5000
+    df = pd.DataFrame({
+        "Category": rng.choice(["Flight", "Vehicle", "Shipping", None], rows),
+        "Emission (kg)": rng.random(rows) * 100,
+        "User ID": rng.choice([f"u{i}" for i in range(97)] + [None], rows),
+        "Timestamp": pd.NaT,
+    })
+    return to_compact_dtypes(df)
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    """Counts the process pools started, to tell the parallel path actually ran."""
+    started = []
+
+    class CountingPool(ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            started.append(kwargs.get("max_workers"))
+            super().__init__(*args, **kwargs)
+    monkeypatch.setattr(parallel_aggregation, "ProcessPoolExecutor", CountingPool)
+    return started
+
+
+@pytest.mark.parametrize("by", [["User ID"], ["Category"], ["User ID", "Category"]])
+def test_parallel_sums_match_serial(frame, pools, by):
+    serial = aggregate_emissions(frame, by, workers=1)
+    assert pools == []
+    parallel = aggregate_emissions(frame, by, workers=3, threshold=1)
+    assert pools == [3]
+    pd.testing.assert_series_equal(parallel.sort_index(), serial.sort_index(), check_exact=False)
+
+
+def test_parallel_index_rebuild_matches_serial(tmp_path, frame, pools):
+    path = str(tmp_path / "emissions.csv")
+    with open(path, "wb") as f:
+        f.write(frame.to_csv(index=False).encode("utf-8"))
+    serial = DataAnalysis(path, workers=1)
+    parallel = DataAnalysis(path, workers=3, parallel_threshold=1)
+    assert pools == [3]
+
+    assert [user for user, _ in parallel.get_leaderboard()] == [user for user, _ in serial.get_leaderboard()]
+    assert dict(parallel.get_leaderboard()) == pytest.approx(dict(serial.get_leaderboard()))
+    assert parallel.get_category_totals() == pytest.approx(serial.get_category_totals())
+    assert parallel.get_category_totals("u5") == pytest.approx(serial.get_category_totals("u5"))
+    serial.close()
+    parallel.close()
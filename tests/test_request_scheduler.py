@@ -0,0 +1,131 @@
+import asyncio
+import pytest
+from request_scheduler import CircuitOpenError, RequestScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+
+def scheduler(clock, **kwargs):
+    kwargs.setdefault("max_retries", 0)
+    return RequestScheduler(failure_threshold=1, reset_timeout=10.0, backoff_base=0.0, clock=clock, **kwargs)
+
+
+def trip(s, clock):
+    s.run(lambda: Response(503))
+    assert s.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        s.run(lambda: Response(200))
+    clock.now += 10.0
+
+
+def test_success_closes_half_open_circuit():
+    clock = FakeClock()
+    s = scheduler(clock)
+    trip(s, clock)
+    assert s.run(lambda: Response(200)).status_code == 200
+    assert s.breaker.state == "closed"
+
+
+def test_exhausted_429_reopens_half_open_circuit():
+    clock = FakeClock()
+    s = scheduler(clock, max_retries=2)
+    trip(s, clock)
+    assert s.run(lambda: Response(429)).status_code == 429
+    assert s.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        s.run(lambda: Response(200))
+    clock.now += 100.0
+    assert s.run(lambda: Response(200)).status_code == 200
+    assert s.breaker.state == "closed"
+
+
+def test_unexpected_exception_reopens_half_open_circuit():
+    clock = FakeClock()
+    s = scheduler(clock)
+    trip(s, clock)
+
+    def send():
+        raise KeyError("not a retryable error")
+
+    with pytest.raises(KeyError):
+        s.run(send, retry_exceptions=(ConnectionError,))
+    assert s.breaker.state == "open"
+    clock.now += 10.0
+    assert s.run(lambda: Response(200)).status_code == 200
+
+
+def test_cancelled_async_trial_reopens_circuit():
+    clock = FakeClock()
+    s = scheduler(clock)
+    trip(s, clock)
+
+    async def send():
+        raise asyncio.CancelledError()
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(s.run_async(send))
+    assert s.breaker.state == "open"
+    clock.now += 10.0
+
+    async def ok():
+        return Response(200)
+
+    assert asyncio.run(s.run_async(ok)).status_code == 200
+    assert s.breaker.state == "closed"
+
+
+def test_retries_then_returns_last_response():
+    clock = FakeClock()
+    s = RequestScheduler(max_retries=3, backoff_base=0.0, failure_threshold=10, clock=clock)
+    responses = iter([Response(503), Response(502), Response(200)])
+    assert s.run(lambda: next(responses)).status_code == 200
+    stats = s.stats()
+    assert stats["retries"] == 2 and stats["succeeded"] == 1 and stats["circuit"] == "closed"
+
+
+def test_client_error_is_not_retried():
+    clock = FakeClock()
+    s = RequestScheduler(max_retries=3, backoff_base=0.0, clock=clock)
+    calls = []
+    s.run(lambda: calls.append(1) or Response(404))
+    assert len(calls) == 1 and s.breaker.state == "closed"
+
+
+def test_long_retry_after_is_not_waited_for(monkeypatch):
+    clock = FakeClock()
+    s = RequestScheduler(max_retries=3, backoff_max=30.0, failure_threshold=10, clock=clock)
+    slept = []
+    monkeypatch.setattr("request_scheduler.time.sleep", slept.append)
+    throttled = Response(429)
+    throttled.headers["Retry-After"] = "3600"
+    assert s.run(lambda: throttled).status_code == 429
+    assert slept == []
+    stats = s.stats()
+    assert stats["failed"] == 1 and stats["retries"] == 0 and s.breaker.failures == 1
+
+    throttled.headers["Retry-After"] = "2"
+    responses = iter([throttled, Response(200)])
+    assert s.run(lambda: next(responses)).status_code == 200
+    assert slept == [2.0]
+
+
+def test_allow_reports_the_half_open_trial_once():
+    clock = FakeClock()
+    s = scheduler(clock)
+    trip(s, clock)
+    assert s.breaker.allow() == (True, True)
+    assert s.breaker.allow() == (False, False)  # Only one trial while half open
+    s.breaker.record_success()
+    assert s.breaker.allow() == (True, False)
@@ -0,0 +1,41 @@
+import json
+import urllib.error
+import urllib.request
+import pytest
+from data_analysis import DataAnalysis
+from service import CarbonService, CarbonServiceServer
+
+
+@pytest.fixture
+def server(api, tmp_path):
+    data_analysis = DataAnalysis(str(tmp_path / "emissions.csv"), append_log=True)
+    data_analysis.add_emissions([("Flight", 5.0, "a"), ("Vehicle", 1.0, "b"), ("Flight", 3.0, "c")])
+    with CarbonServiceServer(CarbonService(api, data_analysis), port=0) as server:
+        yield server
+    data_analysis.close()
+
+
+def request(server, method, path, body=None):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    try:
+        with urllib.request.urlopen(urllib.request.Request(server.url + path, data=data, method=method)) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_leaderboard_limit(server):
+    assert request(server, "GET", "/leaderboard?limit=0") == (200, [])
+    status, rows = request(server, "GET", "/leaderboard?limit=2")
+    assert status == 200 and [row["user_id"] for row in rows] == ["b", "c"]
+    assert len(request(server, "GET", "/leaderboard")[1]) == 3
+    assert request(server, "GET", "/leaderboard?limit=-1")[0] == 400
+
+
+def test_delete_users(server):
+    assert request(server, "DELETE", "/users/a")[0] == 200
+    assert request(server, "DELETE", "/users/a")[0] == 404
+    assert request(server, "GET", "/users/a")[0] == 404
+    assert request(server, "POST", "/users/delete", {"user_ids": ["b", "nobody"]}) == (200, {"deleted_users": 1})
+    assert request(server, "POST", "/users/delete", {"user_ids": "c"})[0] == 400
+    assert [row["user_id"] for row in request(server, "GET", "/leaderboard")[1]] == ["c"]
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+import pytest
+from single_flight import AsyncSingleFlight, SingleFlight, split_duplicates
+
+
+def wait_for_calls(flight, calls):
+    deadline = time.monotonic() + 2
+    while flight.stats()["calls"] < calls and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_concurrent_thread_calls_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    executions = []
+
+    def fetch():
+        executions.append(1)
+        release.wait(2)
+        return {"carbon_kg": 1.0}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", fetch))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    wait_for_calls(flight, 5)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+
+    assert len(executions) == 1
+    assert results == [{"carbon_kg": 1.0}] * 5
+    assert len({id(result) for result in results}) == 5  # Waiters get copies
+    assert flight.stats() == {"calls": 5, "executed": 1, "deduplicated": 4}
+    flight.do("key", fetch)  # Nothing is remembered once the call finished
+    assert len(executions) == 2
+
+
+def test_waiting_threads_get_the_leaders_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(2)
+        raise ConnectionError("down")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("key", fail)
+        except ConnectionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    wait_for_calls(flight, 3)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+    assert len(errors) == 3
+
+
+def test_concurrent_coroutines_share_one_request():
+    flight = AsyncSingleFlight()
+    executions = []
+
+    async def fetch():
+        executions.append(1)
+        await asyncio.sleep(0.01)
+        return {"carbon_kg": 2.0}
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", fetch) for _ in range(4)))
+
+    assert asyncio.run(main()) == [{"carbon_kg": 2.0}] * 4
+    assert len(executions) == 1
+    assert flight.stats() == {"calls": 4, "executed": 1, "deduplicated": 3}
+
+
+def test_request_is_cancelled_only_with_its_last_waiter():
+    flight = AsyncSingleFlight()
+    started, cancelled = [], []
+
+    async def fetch():
+        started.append(1)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+        return "late"
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("key", fetch))
+        second = asyncio.ensure_future(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        await asyncio.sleep(0)
+        assert cancelled == []  # The second waiter still wants the result
+
+        second.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await second
+        await asyncio.sleep(0)
+        assert cancelled == [1]
+
+        async def quick():
+            started.append(1)
+            return "fresh"
+        # A later caller starts a new request instead of joining the cancelled one
+        assert await flight.do("key", quick) == "fresh"
+
+    asyncio.run(main())
+    assert len(started) == 2
+
+
+def test_split_duplicates_keeps_the_first_of_equivalent_requests():
+    estimates = [("vehicle", {"distance_value": 100}), ("vehicle", {"distance_value": 100.0}),
+                 ("flight", {"passengers": 1}), ("vehicle", {"distance_value": 100})]
+    assert split_duplicates(estimates, range(4)) == ([0, 2], [(1, 0), (3, 0)])
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from data_analysis import DataAnalysis, sorted_positions
+from sqlite_analysis import SQLiteDataAnalysis
+
+
+@pytest.mark.parametrize("ascending", [True, False])
+def test_limited_sort_is_the_start_of_the_full_sort(ascending):
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        values = rng.integers(0, 4, size=rng.integers(1, 30)).astype(float)
+        values[rng.random(len(values)) < 0.2] = np.nan
+        full = sorted_positions(values, ascending)
+        for limit in range(len(values) + 2):
+            assert sorted_positions(values, ascending, limit).tolist() == full[:limit].tolist()
+
+
+def test_ties_keep_original_order_and_nan_comes_last():
+    values = np.array([5, 1, np.nan, 5, 3, 5, 2])
+    assert sorted_positions(values, ascending=False).tolist() == [0, 3, 5, 4, 6, 1, 2]
+    assert sorted_positions(values, ascending=False, limit=2).tolist() == [0, 3]
+    assert sorted_positions(values).tolist() == [1, 6, 4, 0, 3, 5, 2]
+
+
+@pytest.mark.parametrize("limit", [None, 2, 4])
+@pytest.mark.parametrize("ascending", [True, False])
+def test_both_stores_order_ties_the_same_way(tmp_path, ascending, limit):
+    records = [("Flight", kg, f"user{i}") for i, kg in enumerate([5.0, 1.0, 5.0, 3.0, 5.0, 2.0])]
+    frame = DataAnalysis(str(tmp_path / "emissions.csv"))
+    frame.add_emissions(records)
+    sqlite = SQLiteDataAnalysis(str(tmp_path / "emissions.db"))
+    sqlite.add_emissions(records)
+    expected = frame.sorting_emission_data(ascending, limit=limit)
+    assert sqlite.sorting_emission_data(ascending, limit=limit)["User ID"].tolist() == expected["User ID"].astype(str).tolist()
+    sqlite.close()
@@ -0,0 +1,37 @@
+from service import CarbonService
+from sqlite_analysis import SQLiteDataAnalysis
+
+
+def vehicle(user_id, km, timestamp="2026-01-05T10:00:00"):
+    return {"user_id": user_id, "type": "vehicle", "distance_value": km, "distance_unit": "km",
+            "vehicle_model_id": "model", "timestamp": timestamp}
+
+
+def test_service_works_on_every_store(api, store):
+    service = CarbonService(api, store)
+    results = service.submit_estimates([vehicle("a", 5.0), vehicle("b", 1.0), vehicle("a", 2.0), {"type": "vehicle"}])
+    assert [result.get("carbon_kg") for result in results] == [5.0, 1.0, 2.0, None]
+    store.warm()
+
+    assert service.user_summary("a")["total_kg"] == 7.0
+    assert service.user_summary("a")["categories"] == {"Vehicle": 7.0}
+    assert service.user_summary("nobody") is None
+    assert service.leaderboard() == [{"user_id": "b", "total_kg": 1.0}, {"user_id": "a", "total_kg": 7.0}]
+    assert service.leaderboard(1) == [{"user_id": "b", "total_kg": 1.0}]
+    assert service.compare(["a", "b"]) == {"a": {"Vehicle": 7.0}, "b": {"Vehicle": 1.0}}
+    assert service.user_trend("a") == [{"period_start": "2026-01-01", "kg": 7.0}]
+    assert store.render_emissions("a", "svg").startswith(b"<?xml")
+    assert store.render_users_comparison(["a", "b"], "png").startswith(b"\x89PNG")
+    assert store.render_emissions("nobody") is None
+
+    assert service.delete_users(["a", "nobody"]) == 1
+    assert not store.has_user("a") and store.has_user("b")
+    assert store.get_category_totals() == {"Vehicle": 1.0}
+
+
+def test_add_emissions_skips_invalid_records(tmp_path):
+    store = SQLiteDataAnalysis(str(tmp_path / "emissions.db"))
+    assert store.add_emissions([("Flight", 2.0, "a"), ("Flight", "x", "a"), ("Vehicle", 1, "b", "2026-01-01")]) == 2
+    assert store.get_total_emissions() == 3.0
+    assert store.get_leaderboard() == [("b", 1.0), ("a", 2.0)]
+    store.close()
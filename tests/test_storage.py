@@ -0,0 +1,13 @@
+import pandas as pd
+from storage import CSVStorage
+
+
+def test_csv_read_keeps_numeric_looking_user_ids_as_strings(tmp_path):
+    path = tmp_path / "emissions.csv"
+    pd.DataFrame({"Category": ["Flight", "Flight", "Vehicle"], "Emission (kg)": [3.0, 4.0, 5.0],
+                  "User ID": ["123", "0042", "42"], "Timestamp": [None] * 3}).to_csv(path, index=False)
+    storage = CSVStorage()
+    assert storage.read(path, user_id="0042")["Emission (kg)"].tolist() == [4.0]
+    assert storage.read(path, user_id="123")["Emission (kg)"].tolist() == [3.0]
+    assert storage.read(path, columns=["Emission (kg)"], user_id="42")["Emission (kg)"].tolist() == [5.0]
+    assert storage.read(path, columns=["Emission (kg)"]).shape == (3, 1)
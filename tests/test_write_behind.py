@@ -0,0 +1,60 @@
+import os
+import time
+import pandas as pd
+import pytest
+from data_analysis import DataAnalysis
+
+
+def rows_on_disk(path):
+    return len(pd.read_csv(path)) if os.path.exists(path) else 0
+
+
+def wait_for_rows(path, rows, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while rows_on_disk(path) < rows and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return rows_on_disk(path)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "emissions.csv")
+
+
+def test_flushes_once_flush_rows_changes_wait(path):
+    store = DataAnalysis(path, write_behind=True, flush_rows=3, flush_interval=60, durability="none")
+    store.add_emissions([("Flight", 1.0, "a"), ("Flight", 1.0, "b")])
+    time.sleep(0.1)
+    assert rows_on_disk(path) == 0
+    store.add_emission("Flight", 1.0, "c")
+    assert wait_for_rows(path, 3) == 3
+    store.close()
+
+
+def test_flushes_every_flush_interval(path):
+    store = DataAnalysis(path, write_behind=True, flush_rows=1000, flush_interval=0.05, durability="none")
+    store.add_emission("Flight", 1.0, "a")
+    assert wait_for_rows(path, 1) == 1
+    store.close()
+
+
+@pytest.mark.parametrize("durability", ["none", "log"])
+def test_close_saves_what_is_waiting(path, durability):
+    store = DataAnalysis(path, write_behind=True, flush_rows=1000, flush_interval=60, durability=durability)
+    store.add_emissions([("Flight", 1.0, "a"), ("Flight", 2.0, "b")])
+    store.close()
+    assert rows_on_disk(path) == 2
+    assert not store._flusher
+    reloaded = DataAnalysis(path)
+    assert reloaded.total_emissions == 3.0
+    reloaded.close()
+
+
+def test_log_durability_keeps_unflushed_changes_for_other_readers(path):
+    store = DataAnalysis(path, write_behind=True, flush_rows=1000, flush_interval=60, durability="log")
+    store.add_emission("Flight", 4.0, "a")
+    assert rows_on_disk(path) == 0  # Not flushed yet, but already in the log
+    reader = DataAnalysis(path, append_log=True)
+    assert reader.total_emissions == 4.0
+    reader.close()
+    store.close()
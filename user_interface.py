@@ -1,19 +1,35 @@
 from api_handler import CarbonInterfaceAPI
-from data_analysis import DataAnalysis
+from estimate_cache import EstimateCache
+from request_scheduler import RequestScheduler
+from vehicle_catalog import VehicleCatalog
+from emission_factors import FactorTable, LocalEstimateEngine
+from data_analysis import DataAnalysis, prompt_user_ids
 from data import FUEL_SOURCES, COUNTRY_CODES
+import os
 import re
 
 
 class UserInterface:
     def __init__(self, api_key):
-        self.api = CarbonInterfaceAPI(api_key)
-        self.data_analysis = DataAnalysis()  # Shared data analysis instance
-        self.emission_estimates = EmissionEstimates(self.api, self.data_analysis)
+        # Electricity and fuel estimates are computed locally when a factor table is provided
+        local_engine = None
+        if os.path.exists("emission_factors.csv"):
+            local_engine = LocalEstimateEngine(FactorTable.from_csv("emission_factors.csv"))
+        # Identical estimates (same bill, same commute) are answered from a 30-day local cache
+        self.api = CarbonInterfaceAPI(api_key, cache=EstimateCache(ttl=30 * 24 * 3600, cache_dir=".estimate_cache"),
+                                      local_engine=local_engine, scheduler=RequestScheduler())
+        # Shared data analysis instance; records are logged at once and saved in the background.
+        # The data file is read on first use rather than before the first prompt.
+        self.data_analysis = DataAnalysis(write_behind=True, lazy_load=True)
+        # Only fetched or refreshed once the vehicle menu is used, so startup stays offline
+        self.vehicle_catalog = VehicleCatalog(self.api)
+        self.emission_estimates = EmissionEstimates(self.api, self.data_analysis, self.vehicle_catalog)
         self.data_analysis_interface = DataAnalysisInterface(self.data_analysis)
         self.user_id = None  # Store user ID
 
     def run(self):
         print("Welcome to the Carbon Emission Tracker!")
+        self.data_analysis.warm()  # Reads the data file while the user types
         self.user_id = input("Please enter your User ID: ").strip()
 
         while True:
@@ -33,6 +49,7 @@ class UserInterface:
                 self.switch_user()
             elif main_choice == "0":
                 print("Exiting program.")
+                self.data_analysis.close()
                 break
             else:
                 print("Invalid choice, please try again.")
@@ -64,11 +81,12 @@ class UserInterface:
             print("3. Visualize Emissions")
             print("4. Remove All Emission Data")
             print("5. Show Leaderboard")
+            print("6. Show Emission Trend")
             print("0. Back to Main Menu")
 
             choice = input("Enter the number of your choice: ")
 
-            if choice in ["1", "2", "3", "4", "5"]:
+            if choice in ["1", "2", "3", "4", "5", "6"]:
                 self.data_analysis_interface.handle_choice(choice, self.user_id)
             elif choice == "0":
                 break
@@ -84,9 +102,10 @@ class UserInterface:
             print("Invalid User ID. Please try again.")
 
 class EmissionEstimates:
-    def __init__(self, api, data_analysis):
+    def __init__(self, api, data_analysis, vehicle_catalog=None):
         self.api = api
         self.data_analysis = data_analysis
+        self.vehicle_catalog = vehicle_catalog if vehicle_catalog else VehicleCatalog(api)
 
     def handle_choice(self, choice, user_id):
         if choice == "1":
@@ -207,54 +226,55 @@ class EmissionEstimates:
 
 
     def handle_vehicle(self, user_id):
-        # Step 1: Get the list of vehicle makes
-        print("Fetching vehicle makes...")
-        vehicle_makes_response = self.api.get_vehicle_makes()
+        # Step 1: Get the list of vehicle makes from the local catalog
+        makes = self.vehicle_catalog.get_makes()  # List of (make_name, make_id) tuples
 
-        if not isinstance(vehicle_makes_response, list) or not vehicle_makes_response:
-            print(f"Error fetching vehicle makes: {vehicle_makes_response if isinstance(vehicle_makes_response, dict) else 'Unknown error'}")
+        if not isinstance(makes, list) or not makes:
+            print(f"Error fetching vehicle makes: {makes if isinstance(makes, dict) else 'Unknown error'}")
             return
 
         # Step 2: Display vehicle makes with numbers
         print("Available Vehicle Makes:")
-        makes = []  # List to store makes and IDs for easy reference
-        for i, make in enumerate(vehicle_makes_response, 1):
-            make_name = make['data']['attributes']['name']
-            make_id = make['data']['id']
-            makes.append((make_name, make_id))  # Store (make_name, make_id) tuple for easy lookup
+        for i, (make_name, _) in enumerate(makes, 1):
             print(f"{i}. {make_name}")
 
-        # Step 3: Prompt the user to select a vehicle make by number
-        try:
-            vehicle_make_choice = int(input("\nEnter the number of the vehicle make you want to choose: "))
-            if vehicle_make_choice < 1 or vehicle_make_choice > len(makes):
+        # Step 3: Prompt the user to select a vehicle make by number or name
+        make_choice = input("\nEnter the number or name of the vehicle make you want to choose: ").strip()
+        if make_choice.isdigit():
+            if int(make_choice) < 1 or int(make_choice) > len(makes):
                 print("Invalid choice.")
                 return
-            selected_make_name, selected_make_id = makes[vehicle_make_choice - 1]
-            print(f"\nYou selected: {selected_make_name} (ID: {selected_make_id})")
-
-        except ValueError:
-            print("Invalid input. Please enter a number.")
-            return
-
-        print(f"Fetching vehicle models for {selected_make_name}...")
+            selected_make_name, selected_make_id = makes[int(make_choice) - 1]
+        else:
+            selected_make = self.vehicle_catalog.find_make(make_choice)
+            if selected_make is None:
+                print("Invalid choice.")
+                return
+            selected_make_name, selected_make_id = selected_make
+        print(f"\nYou selected: {selected_make_name} (ID: {selected_make_id})")
 
         # Step 4: Get the vehicle models for the selected make
-        vehicle_models_response = self.api.get_vehicle_models(selected_make_id)
+        models = self.vehicle_catalog.get_models(selected_make_id)  # List of (model_name, model_year, model_id)
 
-        # Ensure vehicle_models_response is a list and not empty
-        if not isinstance(vehicle_models_response, list) or not vehicle_models_response:
-            print(f"Error fetching vehicle models: {vehicle_models_response if isinstance(vehicle_models_response, dict) else 'Unknown error'}")
+        # Ensure models is a list and not empty
+        if not isinstance(models, list) or not models:
+            print(f"Error fetching vehicle models: {models if isinstance(models, dict) else 'Unknown error'}")
             return
 
-        # Step 5: Display vehicle models with numbers
+        # Step 5: Let the user narrow the list down by model name and year
+        model_filter = input("Enter a model name and optional year to search (leave blank to list all): ").strip()
+        if model_filter:
+            name, _, year = model_filter.rpartition(" ")
+            if name and year.isdigit():
+                models = self.vehicle_catalog.find_models(selected_make_id, name=name, year=year)
+            else:
+                models = self.vehicle_catalog.find_models(selected_make_id, name=model_filter)
+            if not models:
+                print("No matching vehicle models found.")
+                return
+
         print("Available Vehicle Models:")
-        models = []  # List to store models and IDs for easy reference
-        for i, model in enumerate(vehicle_models_response, 1):
-            model_name = model['data']['attributes']['name']
-            model_year = model['data']['attributes']['year']
-            model_id = model['data']['id']
-            models.append((model_name, model_year, model_id))  # Store (model_name, model_year, model_id)
+        for i, (model_name, model_year, _) in enumerate(models, 1):
             print(f"{i}. {model_name} ({model_year})")
 
         # Step 6: Prompt the user to select a vehicle model by number
@@ -318,19 +338,26 @@ class DataAnalysisInterface:
             self.remove_emission_data()
         elif choice == "5":
             self.show_leaderboard()
+        elif choice == "6":
+            self.show_emission_trend(user_id)
 
     def show_emission_data(self, user_id):
         total_emissions = self.data_analysis.get_total_emissions(user_id)
         print(f"\033[1mTotal Emissions: {total_emissions:.2f} kg CO2\033[0m")
+        print(f"Last 30 Days: {self.data_analysis.get_emissions_in_window(30, user_id):.2f} kg CO2")
         self.data_analysis.display_emission_data(user_id)
 
     def sort_emission_data(self):
-        if self.data_analysis.emissions_df.empty:
+        if not self.data_analysis.has_data():
             print("No data available to sort.")
             return
         order = input("Sort in ascending order? (y/n): ").strip().lower()
         ascending = order == "y"
-        self.data_analysis.sorting_emission_data(ascending=ascending)
+        limit = input("How many records to show? (leave blank for all): ").strip()
+        if limit and not limit.isdigit():
+            print("Invalid number. Please enter a whole number.")
+            return
+        self.data_analysis.sorting_emission_data(ascending=ascending, limit=int(limit) if limit else None)
 
     def visualize_emissions(self, user_id=None):
         """Visualizes emissions, filtered by User ID if specified."""
@@ -344,7 +371,7 @@ class DataAnalysisInterface:
         elif choice == "2":
             self.data_analysis.visualize_emissions(user_id)
         elif choice == "3":
-            self.data_analysis.compare_users_emissions()
+            self.data_analysis.compare_users_emissions(prompt_user_ids(self.data_analysis.has_user))
 
 
     def remove_emission_data(self):
@@ -355,3 +382,15 @@ class DataAnalysisInterface:
     def show_leaderboard(self):
         self.data_analysis.leaderboard()
 
+    def show_emission_trend(self, user_id):
+        period = input("Group by day, week or month? (d/w/m): ").strip().lower()
+        periods = {"d": "daily", "w": "weekly", "m": "monthly"}
+        if period not in periods:
+            print("Invalid choice, please enter d, w or m.")
+            return
+        trend = self.data_analysis.emission_trend(periods[period], user_id)
+        if trend.empty:
+            print("No dated emission data available for this User ID.")
+        else:
+            print(f"\033[1m{periods[period].capitalize()} Emissions for User ID: {user_id}\033[0m")
+            print(trend)
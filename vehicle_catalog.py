@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class VehicleCatalog:
+    """Local copy of the Carbon Interface vehicle makes/models catalog.
+
+    The catalog is persisted to a JSON file and refreshed from the API once it is older
+    than max_age seconds. Stale data is still served while a refresh runs in the background.
+    Makes are stored as (name, id) and models as (name, year, id) tuples.
+    """
+
+    def __init__(self, api, path="vehicle_catalog.json", max_age=30 * 24 * 3600, max_workers=8):
+        self.api = api
+        self.path = path
+        self.max_age = max_age
+        self.max_workers = max_workers
+        self.fetched_at = None
+        self.makes = []
+        self.models = {}  # make_id -> [(name, year, id)]
+        self._makes_by_name = {}
+        self._models_by_name = {}  # make_id -> {lowercased name: [(name, year, id)]}
+        self._lock = threading.Lock()
+        self._warm_thread = None
+        self.load()
+
+    def load(self):
+        """Loads the catalog file, if there is one."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            print("Vehicle catalog file is unreadable. It will be fetched again.")
+            return
+        with self._lock:
+            self.fetched_at = stored["fetched_at"]
+            self._set_makes([tuple(make) for make in stored["makes"]])
+            for make_id, models in stored["models"].items():
+                self._set_models(make_id, [tuple(model) for model in models])
+
+    def save(self):
+        """Writes the catalog file atomically."""
+        with self._lock:
+            stored = {
+                "fetched_at": self.fetched_at,
+                "makes": self.makes,
+                "models": self.models,
+            }
+            data = json.dumps(stored)
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+    def is_stale(self):
+        return self.fetched_at is None or time.time() - self.fetched_at > self.max_age
+
+    def refresh(self):
+        """Fetches all makes, then every make's models concurrently. Returns an error dict on failure."""
+        response = self.api.get_vehicle_makes()
+        if not isinstance(response, list):
+            return response if isinstance(response, dict) else {"error": "Unknown error"}
+        makes = [(make['data']['attributes']['name'], make['data']['id']) for make in response]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(lambda make: self.api.get_vehicle_models(make[1]), makes))
+
+        with self._lock:
+            self._set_makes(makes)
+            for (_, make_id), models in zip(makes, results):
+                # Keep what we had for a make whose models failed to download
+                if isinstance(models, list):
+                    self._set_models(make_id, self._parse_models(models))
+            self.fetched_at = time.time()
+        self.save()
+        return None
+
+    def warm(self, background=True):
+        """Refreshes the catalog if it is stale, by default on a background thread."""
+        if not self.is_stale() or (self._warm_thread is not None and self._warm_thread.is_alive()):
+            return self._warm_thread
+        if not background:
+            self.refresh()
+            return None
+        self._warm_thread = threading.Thread(target=self.refresh, daemon=True)
+        self._warm_thread.start()
+        return self._warm_thread
+
+    def get_makes(self):
+        """Returns the makes, fetching them first if the catalog is empty."""
+        if not self.makes:
+            response = self.api.get_vehicle_makes()
+            if not isinstance(response, list):
+                return response if isinstance(response, dict) else {"error": "Unknown error"}
+            with self._lock:
+                self._set_makes([(make['data']['attributes']['name'], make['data']['id']) for make in response])
+        elif self.is_stale():
+            self.warm()
+        return list(self.makes)
+
+    def get_models(self, make_id):
+        """Returns a make's models, fetching just that make if it has not been cached yet."""
+        with self._lock:
+            models = self.models.get(make_id)
+        if models is None:
+            response = self.api.get_vehicle_models(make_id)
+            if not isinstance(response, list):
+                return response if isinstance(response, dict) else {"error": "Unknown error"}
+            models = self._parse_models(response)
+            with self._lock:
+                self._set_models(make_id, models)
+            self.save()
+        return list(models)
+
+    def find_make(self, name):
+        """Looks up a make by name, ignoring case. Returns (name, id) or None."""
+        if not self.makes:
+            self.get_makes()
+        return self._makes_by_name.get(name.strip().lower())
+
+    def find_models(self, make_id, name=None, year=None):
+        """Returns the make's models matching a name (ignoring case) and/or year."""
+        if name is not None:
+            if make_id not in self.models:
+                self.get_models(make_id)
+            models = self._models_by_name.get(make_id, {}).get(name.strip().lower(), [])
+        else:
+            models = self.get_models(make_id)
+            if isinstance(models, dict):
+                return []
+        if year is not None:
+            models = [model for model in models if int(model[1]) == int(year)]
+        return list(models)
+
+    @staticmethod
+    def _parse_models(response):
+        return [(model['data']['attributes']['name'], model['data']['attributes']['year'], model['data']['id'])
+                for model in response]
+
+    def _set_makes(self, makes):
+        self.makes = makes
+        self._makes_by_name = {name.lower(): (name, make_id) for name, make_id in makes}
+
+    def _set_models(self, make_id, models):
+        self.models[make_id] = models
+        by_name = {}
+        for model in models:
+            by_name.setdefault(model[0].lower(), []).append(model)
+        self._models_by_name[make_id] = by_name